@@ -0,0 +1,286 @@
+"""
+无界面批处理：对多个数据目录执行同一份指令脚本
+
+每个数据目录是一个作业，在独立的AgentSession中按顺序以自主模式执行全部指令。
+- process模式：作业在常驻工作进程中执行，每个进程有自己的dataframe存储，
+  超时的作业所在进程被强制终止并重启，适合工具计算占主导的负载（随CPU核数扩展）
+- thread模式：作业在线程中执行，共享进程内的dataframe存储（ID为UUID，互不冲突），
+  各作业登记的dataframe在作业结束时释放；
+  超时只能通过自主模式的时间预算协作式结束，适合LLM延迟占主导的负载（随并发数扩展）
+"""
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from multiprocessing.connection import wait
+from typing import Callable, Dict, List, Optional
+
+# 自主模式的时间预算取作业超时的该比例，使作业在被强制终止前能正常返回部分结果
+_BUDGET_FRACTION = 0.9
+
+
+def load_instructions(path: str) -> List[str]:
+    """读取指令文件：每行一条指令，忽略空行与#开头的注释"""
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def _step_record(step: Dict) -> Dict:
+    """将run_task的单步结果压缩为可JSON序列化的记录"""
+    return {
+        "step": step.get("step"),
+        "seconds": step.get("seconds"),
+        "llm_output": step.get("llm_output"),
+        "error": step.get("error"),
+        "actions": [
+            {k: a.get(k) for k in ("action", "tool_result", "error")}
+            for a in step.get("actions") or []
+        ],
+        "timing": step.get("timing"),
+    }
+
+
+def run_job(job: Dict) -> Dict:
+    """
+    执行单个作业（在工作进程或线程中调用），结束时释放本作业登记的dataframe
+
+    Args:
+        job: {"job_id", "data_root", "instructions", "llm_type", "llm_config",
+              "max_steps", "timeout", "context_k", "compact"}
+
+    Returns:
+        {"job_id", "data_root", "status": 'ok'|'error'|'timeout', "seconds",
+         "instructions": [...], "error"}
+    """
+    from .chat import AgentSession
+    from .llm import create_llm
+    from .preprocessing import summarize_directory
+    from .retrieval import get_index
+    from .tools import io_tools
+
+    start = time.perf_counter()
+    record = {
+        "job_id": job["job_id"],
+        "data_root": job["data_root"],
+        "status": "ok",
+        "seconds": None,
+        "pid": os.getpid(),
+        "instructions": [],
+        "error": None,
+    }
+    timeout = job.get("timeout")
+    budget = timeout * _BUDGET_FRACTION if timeout else None
+    owned, token = io_tools.track_registrations()
+    # 只覆盖本作业上下文中的压缩设置：thread模式的并发作业与调用方的设置都不受影响
+    compact_token = io_tools.override_compaction(job.get("compact", False))
+    try:
+        context_k = job.get("context_k", 0)
+        data_index = get_index(job["data_root"]) if context_k > 0 else None
+        summary = data_index.overview() if data_index else summarize_directory(job["data_root"], max_files_per_folder=1)
+        llm = create_llm(llm_type=job.get("llm_type", "simulated"), **(job.get("llm_config") or {}))
+        session = AgentSession(llm, summary, data_index=data_index, context_k=context_k)
+        for instruction in job["instructions"]:
+            remaining = None
+            if budget is not None:
+                remaining = budget - (time.perf_counter() - start)
+                if remaining <= 0:
+                    record["status"] = "timeout"
+                    break
+            task = session.run_task(instruction, max_steps=job.get("max_steps", 10), max_seconds=remaining)
+            record["instructions"].append({
+                "instruction": instruction,
+                "final_answer": task["final_answer"],
+                "stop_reason": task["stop_reason"],
+                "seconds": task["total_seconds"],
+                "tokens": task["total_tokens"],
+                "wasted_generations": task["wasted_generations"],
+                "steps": [_step_record(s) for s in task["steps"]],
+            })
+            if task["stop_reason"] == "max_seconds":
+                record["status"] = "timeout"
+                break
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        io_tools.reset_compaction(compact_token)
+        io_tools.untrack_registrations(token)
+        # thread模式下各作业共享dataframe存储，不释放则所有作业的数据都保留到批处理结束
+        for df_id in owned:
+            if io_tools.has_dataframe(df_id):
+                io_tools.release_dataframe(df_id, cascade=True)
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def _worker_main(conn):
+    """常驻工作进程：循环接收作业，执行后清空本进程的dataframe存储"""
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        result = run_job(job)
+        from .tools import io_tools
+        io_tools._clear()
+        conn.send(result)
+
+
+def _failed_record(job: Dict, status: str, error: str, seconds: float) -> Dict:
+    return {
+        "job_id": job["job_id"],
+        "data_root": job["data_root"],
+        "status": status,
+        "seconds": seconds,
+        "pid": None,
+        "instructions": [],
+        "error": error,
+    }
+
+
+def _run_in_processes(jobs: List[Dict], workers: int, on_result: Callable[[Dict], None]):
+    ctx = multiprocessing.get_context()
+    queue = deque(jobs)
+
+    def spawn():
+        parent, child = ctx.Pipe()
+        proc = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        proc.start()
+        child.close()
+        return proc, parent
+
+    idle = [spawn() for _ in range(min(workers, len(jobs)))]
+    busy: Dict = {}  # conn -> (proc, job, start, deadline)
+    try:
+        while queue or busy:
+            while queue and idle:
+                proc, conn = idle.pop()
+                job = queue.popleft()
+                conn.send(job)
+                now = time.perf_counter()
+                deadline = now + job["timeout"] if job.get("timeout") else None
+                busy[conn] = (proc, job, now, deadline)
+
+            deadlines = [d for (_, _, _, d) in busy.values() if d is not None]
+            wait_for = max(0.0, min(deadlines) - time.perf_counter()) if deadlines else None
+            for conn in wait(list(busy), timeout=wait_for):
+                proc, job, started, _ = busy.pop(conn)
+                try:
+                    on_result(conn.recv())
+                    idle.append((proc, conn))
+                except EOFError:
+                    # 工作进程异常退出（如被OOM终止），记录并重启
+                    on_result(_failed_record(job, "error", f"worker exited with code {proc.exitcode}",
+                                             time.perf_counter() - started))
+                    proc.join()
+                    idle.append(spawn())
+
+            now = time.perf_counter()
+            for conn, (proc, job, started, deadline) in list(busy.items()):
+                if deadline is not None and now >= deadline:
+                    proc.terminate()
+                    proc.join()
+                    conn.close()
+                    del busy[conn]
+                    on_result(_failed_record(job, "timeout", f"job exceeded {job['timeout']}s",
+                                             now - started))
+                    idle.append(spawn())
+    finally:
+        for proc, conn in idle:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for proc, _ in idle:
+            proc.join(timeout=5)
+        for proc, _, _, _ in busy.values():
+            proc.terminate()
+
+
+def _run_in_threads(jobs: List[Dict], workers: int, on_result: Callable[[Dict], None]):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_job, job): job for job in jobs}
+        for fut in as_completed(futures):
+            on_result(fut.result())
+
+
+def run_batch(instructions: List[str], data_roots: List[str], output_path: str,
+              llm_type: str = "simulated", llm_config: Optional[Dict] = None,
+              workers: Optional[int] = None, executor: str = "process",
+              timeout: Optional[float] = None, max_steps: int = 10, context_k: int = 8,
+              compact: bool = False) -> Dict:
+    """
+    并行执行批处理作业，结果按完成顺序以JSONL写入output_path
+
+    Args:
+        instructions: 指令列表（每个作业按顺序执行全部指令）
+        data_roots: 数据目录列表（每个目录一个作业）
+        output_path: 结果JSONL文件路径
+        llm_type/llm_config: 传递给create_llm
+        workers: 并发数，默认CPU核数
+        executor: 'process' 或 'thread'
+        timeout: 单个作业超时（秒），None表示不限
+        max_steps: 每条指令的自主模式最大步数
+        context_k: 每条指令检索注入的文件摘要数；0时把整个目录摘要放入系统消息
+        compact: 登记dataframe时压缩内存表示（float32、分类、可推导的索引列）
+
+    Returns:
+        {"jobs", "ok", "error", "timeout", "seconds", "jobs_per_second",
+         "tasks_completed", "wasted_generations", "wasted_per_task"}
+        tasks_completed为以Final Answer结束的指令数；wasted_per_task为平均每个完成的指令浪费的LLM生成次数
+    """
+    if executor not in {"process", "thread"}:
+        raise ValueError(f"Unknown executor: {executor}")
+    if workers is not None and workers < 1:
+        raise ValueError(f"workers must be >= 1, got {workers}")
+    workers = workers or os.cpu_count() or 1
+    jobs = [
+        {
+            "job_id": i,
+            "data_root": root,
+            "instructions": list(instructions),
+            "llm_type": llm_type,
+            "llm_config": llm_config or {},
+            "max_steps": max_steps,
+            "timeout": timeout,
+            "context_k": context_k,
+            "compact": compact,
+        }
+        for i, root in enumerate(data_roots)
+    ]
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    counts = {"ok": 0, "error": 0, "timeout": 0}
+    generations = {"tasks_completed": 0, "wasted_generations": 0}
+    start = time.perf_counter()
+    with open(output_path, "w", encoding="utf-8") as out:
+        def on_result(record: Dict):
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+            for task in record.get("instructions") or []:
+                generations["wasted_generations"] += task.get("wasted_generations") or 0
+                generations["tasks_completed"] += task.get("stop_reason") == "final_answer"
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+
+        if executor == "process":
+            _run_in_processes(jobs, workers, on_result)
+        else:
+            _run_in_threads(jobs, workers, on_result)
+
+    seconds = time.perf_counter() - start
+    return {
+        "jobs": len(jobs),
+        **counts,
+        "seconds": seconds,
+        "jobs_per_second": len(jobs) / seconds if seconds else 0.0,
+        **generations,
+        "wasted_per_task": (generations["wasted_generations"] / generations["tasks_completed"]
+                            if generations["tasks_completed"] else 0.0),
+    }
@@ -1,33 +1,82 @@
 """
 对话式Agent入口，集成真实LLM交互循环
 """
-import re
-from typing import List, Dict, Optional
+import cProfile
+import os
+import time
+from typing import List, Dict, Optional, Set
 
-from .llm import LLMInterface, create_llm
-from .preprocessing import summarize_directory
+from .llm import LLMInterface, create_llm, estimate_tokens
 from .prompt import build_full_prompt
-from .executor import execute_action, parse_action
+from .retrieval import DataIndex, format_entries, get_index, reset_active_index, set_active_index
+from .executor import execute_actions, extract_actions, primary_value
+from .tracing import JSONLTraceWriter, Tracer, span
 
 
 class AgentSession:
     """Agent会话管理"""
     
-    def __init__(self, llm: LLMInterface, data_summary: str):
+    def __init__(self, llm: LLMInterface, data_summary: str, max_workers: int = 4,
+                 trace_path: Optional[str] = None, data_index: Optional[DataIndex] = None,
+                 context_k: int = 8):
+        """
+        Args:
+            llm: LLM实例
+            data_summary: 数据目录摘要（注入系统Prompt）；使用data_index时为目录概览
+            max_workers: 同一轮中并发执行Action的最大线程数
+            trace_path: 若提供，每轮的追踪结果以JSONL追加写入该文件
+            data_index: 数据文件索引（见agentkit.retrieval）；提供时每条指令附上检索到的top-k文件摘要，
+                并可通过search_data_files工具检索
+            context_k: 每条指令检索注入的文件摘要数
+        """
         self.llm = llm
         self.data_summary = data_summary
+        self.max_workers = max_workers
+        self.data_index = data_index
+        self.context_k = context_k
+        self._shown_files: Set[str] = set()
         self.conversation_history: List[Dict] = []
         self._last_dataframe_id: Optional[str] = None
+        self._trace_writer = JSONLTraceWriter(trace_path) if trace_path else None
+        self._turn_count = 0
+    
+    def _usage(self, llm_response, messages: List[Dict]) -> Dict:
+        """取LLM返回的token用量；后端未提供时按字符数估计"""
+        usage = dict(llm_response.metadata.get("usage") or {})
+        if "total_tokens" not in usage:
+            prompt_tokens = usage.get("prompt_tokens")
+            if prompt_tokens is None:
+                prompt_tokens = sum(estimate_tokens(m.get("content", "")) for m in messages)
+            completion_tokens = usage.get("completion_tokens")
+            if completion_tokens is None:
+                completion_tokens = estimate_tokens(llm_response.text)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+        return usage
+    
+    def _extract_actions(self, llm_output: str) -> List[str]:
+        """从LLM输出中按顺序提取全部Action（参数中的括号与字符串不会截断调用，见extract_actions）"""
+        return extract_actions(llm_output)[0]
     
     def _extract_action(self, llm_output: str) -> Optional[str]:
-        """从LLM输出中提取Action"""
-        # 查找 Action: tool_name(...) 格式
-        pattern = r"Action:\s*([a-zA-Z_][a-zA-Z0-9_]*\([^)]*\))"
-        matches = re.findall(pattern, llm_output)
+        """从LLM输出中提取最后一个Action"""
+        matches = self._extract_actions(llm_output)
         if matches:
             return matches[-1]
         return None
     
+    def _retrieve(self, query: str) -> str:
+        """检索与指令相关的文件摘要，只返回本会话尚未注入过的条目；首条指令没有命中时给出各目录的示例文件"""
+        hits = [entry for _score, entry in self.data_index.search(query, self.context_k)]
+        if not hits and not self._shown_files:
+            hits = self.data_index.representatives(self.context_k)
+        new = [entry for entry in hits if entry["file"] not in self._shown_files]
+        self._shown_files.update(entry["file"] for entry in new)
+        return format_entries(new)
+    
     def _update_dataframe_id(self, action: str, result: str):
         """更新最近使用的dataframe_id（用于后续工具调用）"""
         # 简单启发：load_dataframe的结果通常是新的dataframe_id
@@ -36,74 +85,206 @@ class AgentSession:
         # describe/plot等返回的可能是dataframe_id作为前缀
         if result.startswith("dataframe_") or result.startswith("uuid"):
             self._last_dataframe_id = result
+        # detect_anomalies_iqr等返回 (dataframe_id, ...) 元组
+        from .tools.io_tools import has_dataframe
+        if has_dataframe(result):
+            self._last_dataframe_id = result
     
-    def _replace_placeholder(self, action: str) -> str:
-        """替换action中的占位符"""
-        if "<last_df_id>" in action or "dataframe_id=" not in action:
-            # 如果有占位符但action没给dataframe_id，尝试推断
-            if self._last_dataframe_id:
-                action = action.replace("<last_df_id>", self._last_dataframe_id)
-        return action
+    def _format_tool_results(self, records: List[Dict]) -> str:
+        """将本轮所有Action的结果格式化为对话历史中的反馈文本"""
+        if len(records) == 1:
+            rec = records[0]
+            if rec["error"]:
+                return f"Error: {rec['error']}"
+            return f"Tool Result: {rec['tool_result']}"
+        lines = ["Tool Results:"]
+        for rec in records:
+            if rec["error"]:
+                lines.append(f"[result_{rec['index']}] {rec['action']} -> Error: {rec['error']}")
+            else:
+                lines.append(f"[result_{rec['index']}] {rec['action']} -> {rec['tool_result']}")
+        return "\n".join(lines)
+    
+    def _timing(self, tracer: Tracer, result: Dict) -> Dict:
+        """由本轮的span汇总耗时分解"""
+        def total(name: str) -> float:
+            return sum(s["seconds"] for s in tracer.find(name))
+        
+        turn = tracer.find("turn")[0]
+        usage = result.get("usage") or {}
+        timing = {
+            "total_s": turn["seconds"],
+            "llm_s": total("llm_call"),
+            # 流式API回复的首个token延迟（非流式后端为None）
+            "first_token_s": next((s["first_token_s"] for s in tracer.find("llm") if "first_token_s" in s), None),
+            "parse_s": total("parse"),
+            "tools_s": total("tools"),
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+            "rss_delta_bytes": turn.get("rss_delta_bytes"),
+            "tools": [
+                {k: s[k] for k in ("tool", "seconds", "bytes_read", "rss_delta_bytes", "error") if k in s}
+                for s in tracer.find("tool")
+            ],
+        }
+        timing["other_s"] = max(0.0, timing["total_s"] - timing["llm_s"] - timing["parse_s"] - timing["tools_s"])
+        return timing
     
-    def chat_turn(self, user_input: str) -> Dict:
+    def chat_turn(self, user_input: str, profile_path: Optional[str] = None, retrieve: bool = True) -> Dict:
         """
         执行一轮对话（用户输入 -> LLM输出 -> 工具调用 -> 结果反馈）
+
+        LLM可在一次回复中给出多个Action，按<result_N>引用构建依赖图，
+        互不依赖的Action并发执行。
+
+        Args:
+            user_input: 用户输入
+            profile_path: 若提供，用cProfile剖析本轮并将统计写入该文件
+                （剖析时Action在调用线程中顺序执行，以便cProfile覆盖工具代码）
+            retrieve: 有数据索引时为本轮输入检索相关文件摘要（自主模式的后续步骤不检索）
         
         Returns:
             {
                 "llm_output": str,
-                "action": str or None,
-                "tool_result": str or None,
-                "error": str or None
+                "action": str or None,       # 最后一个Action
+                "tool_result": str or None,  # 最后一个Action的结果
+                "error": str or None,        # 第一个错误
+                "actions": [{"index", "action", "deps", "tool_result", "error", "invalid"}, ...],
+                "malformed": [str, ...],     # "Action:"之后无法截取出完整调用的片段
+                "wasted": bool,              # 本次生成给出了Action但没有一个可执行（格式错误或与工具签名不符）
+                "usage": {"prompt_tokens", "completion_tokens", "total_tokens"},
+                "timing": {"total_s", "llm_s", "first_token_s", "parse_s", "tools_s", "other_s",
+                           "prompt_tokens", "completion_tokens", "rss_delta_bytes", "tools": [...]}
             }
         """
+        self._turn_count += 1
+        tracer = Tracer()
+        profiler = cProfile.Profile() if profile_path else None
+        max_workers = 1 if profiler else self.max_workers
+        
+        # search_data_files工具通过上下文变量取得本会话的索引
+        index_token = set_active_index(self.data_index)
+        with tracer.activate():
+            if profiler:
+                profiler.enable()
+            try:
+                with span("turn"):
+                    result = self._chat_turn(user_input, max_workers, retrieve)
+            finally:
+                if profiler:
+                    profiler.disable()
+                reset_active_index(index_token)
+        
+        result["timing"] = self._timing(tracer, result)
+        if profiler:
+            directory = os.path.dirname(profile_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(profile_path)
+            result["profile_path"] = profile_path
+        if self._trace_writer:
+            self._trace_writer.write({
+                "turn": self._turn_count,
+                "timestamp": time.time(),
+                "user_input": user_input,
+                "action_count": len(result.get("actions") or []),
+                "error": result.get("error"),
+                "wasted": result.get("wasted"),
+                "timing": result["timing"],
+                "spans": tracer.spans,
+            })
+        return result
+    
+    def _chat_turn(self, user_input: str, max_workers: int, retrieve: bool = True) -> Dict:
         # 1. 构建完整prompt（首次）
         if not self.conversation_history:
             full_prompt = build_full_prompt(user_input, self.data_summary)
             self.conversation_history.append({"role": "system", "content": full_prompt})
         
-        # 添加用户输入
-        self.conversation_history.append({"role": "user", "content": user_input})
+        # 添加用户输入（附上检索到的相关文件摘要）
+        content = user_input
+        if retrieve and self.data_index is not None:
+            with span("retrieve"):
+                context = self._retrieve(user_input)
+            if context:
+                content = f"{user_input}\n\n--- 相关数据文件 ---\n{context}"
+        self.conversation_history.append({"role": "user", "content": content})
         
         # 2. 调用LLM
+        messages = self.conversation_history.copy()
         try:
-            llm_response = self.llm.chat(self.conversation_history.copy())
+            with span("llm_call"):
+                llm_response = self.llm.chat(messages)
             llm_output = llm_response.text
         except Exception as e:
             return {"error": f"LLM调用失败: {e}"}
         
-        # 3. 提取Action
-        action = self._extract_action(llm_output)
+        # 3. 提取全部Action
+        with span("parse"):
+            actions, malformed = extract_actions(llm_output)
         
         result = {
             "llm_output": llm_output,
-            "action": action,
+            "action": actions[-1] if actions else None,
             "tool_result": None,
-            "error": None
+            "error": None,
+            "actions": [],
+            "malformed": malformed,
+            "wasted": False,
+            "usage": self._usage(llm_response, messages),
         }
+        # 截取不出完整调用的Action反馈给LLM，提示按格式重新给出
+        malformed_note = "".join(
+            f"\nError: 无法解析的Action: {frag}（应为 tool_name(arg=value, ...)，字符串参数加引号）"
+            for frag in malformed
+        )
         
-        # 4. 如果提取到action，执行工具
-        if action:
-            action = self._replace_placeholder(action)
+        # 4. 如果提取到action，按依赖图执行工具
+        if actions:
             try:
-                tool_result = execute_action(action)
-                result["tool_result"] = str(tool_result)
-                
-                # 记录本次对话与结果（供下一轮参考）
-                self.conversation_history.append({
-                    "role": "assistant",
-                    "content": f"{llm_output}\n\nTool Result: {tool_result}"
-                })
-                
-                # 更新dataframe_id
-                self._update_dataframe_id(action, str(tool_result))
-                
+                with span("tools", count=len(actions)):
+                    records = execute_actions(
+                        actions,
+                        max_workers=max_workers,
+                        last_df_id=self._last_dataframe_id,
+                    )
             except Exception as e:
+                # 如<result_N>引用无效：整组Action都未执行
                 result["error"] = f"工具执行失败: {e}"
+                result["wasted"] = True
                 self.conversation_history.append({
                     "role": "assistant",
-                    "content": f"{llm_output}\n\nError: {e}"
+                    "content": f"{llm_output}\n\nError: {e}{malformed_note}"
                 })
+                return result
+            
+            for rec in records:
+                if rec["error"] is None:
+                    self._update_dataframe_id(rec["action"], str(primary_value(rec["result"])))
+                elif result["error"] is None:
+                    result["error"] = rec["error"]
+            
+            result["actions"] = [
+                {k: rec[k] for k in ("index", "action", "deps", "tool_result", "error", "invalid")}
+                for rec in records
+            ]
+            result["action"] = records[-1]["action"]
+            result["tool_result"] = records[-1]["tool_result"]
+            result["wasted"] = (all(rec["error"] for rec in records)
+                                and any(rec["invalid"] for rec in records))
+            
+            # 记录本次对话与结果（供下一轮参考）
+            self.conversation_history.append({
+                "role": "assistant",
+                "content": f"{llm_output}\n\n{self._format_tool_results(records)}{malformed_note}"
+            })
+        elif malformed:
+            result["error"] = f"无法解析的Action: {malformed[0]}"
+            result["wasted"] = True
+            self.conversation_history.append({
+                "role": "assistant",
+                "content": f"{llm_output}\n{malformed_note}"
+            })
         else:
             # 没有提取到action，可能是最终回复或中间思考
             self.conversation_history.append({
@@ -113,28 +294,92 @@ class AgentSession:
         
         return result
     
-    def chat_loop(self):
-        """主对话循环"""
-        print("=== Agent 对话模式（输入 'exit' 退出）===\n")
-        print(f"数据目录摘要已加载（包含 {len(self.data_summary.split('目录:'))-1} 个子目录）\n")
+    def run_task(self, user_input: str, max_steps: int = 10,
+                 max_seconds: Optional[float] = None,
+                 max_tokens: Optional[int] = None) -> Dict:
+        """
+        自主执行多步任务（ReAct循环）：工具结果自动反馈给LLM，直到给出最终回答或预算耗尽
+
+        预算在每一步开始前检查，单次LLM调用或工具执行不会被中断。
+
+        Args:
+            user_input: 用户指令
+            max_steps: 最大LLM调用次数
+            max_seconds: 墙钟时间预算（秒），None表示不限
+            max_tokens: 累计token预算，None表示不限
+
+        Returns:
+            {
+                "final_answer": str or None,
+                "stop_reason": 'final_answer' | 'max_steps' | 'max_seconds' | 'max_tokens' | 'error',
+                "steps": [chat_turn结果 + {"step": int, "seconds": float}, ...],
+                "total_seconds": float,
+                "total_tokens": int,
+                "wasted_generations": int   # 未产生可执行Action的LLM调用次数（见chat_turn的wasted）
+            }
+        """
+        start = time.perf_counter()
+        steps: List[Dict] = []
+        total_tokens = 0
+        final_answer = None
+        stop_reason = "max_steps"
+        message = user_input
         
-        while True:
-            user = input("你: ").strip()
-            if user.lower() in {"exit", "quit", "退出"}:
-                print("再见！")
+        for step in range(1, max_steps + 1):
+            if max_seconds is not None and time.perf_counter() - start >= max_seconds:
+                stop_reason = "max_seconds"
+                break
+            if max_tokens is not None and total_tokens >= max_tokens:
+                stop_reason = "max_tokens"
                 break
             
-            # 执行对话回合
-            result = self.chat_turn(user)
+            step_start = time.perf_counter()
+            result = self.chat_turn(message, retrieve=step == 1)
+            result["step"] = step
+            result["seconds"] = time.perf_counter() - step_start
+            steps.append(result)
+            total_tokens += result.get("usage", {}).get("total_tokens", 0)
             
-            # 显示LLM输出
-            print("\n[Agent思考]")
-            try:
-                print(result["llm_output"])
-            except KeyError:
-                print("未能获取Agent输出")
+            if "llm_output" not in result:
+                stop_reason = "error"
+                break
+            
+            llm_output = result["llm_output"]
+            if "Final Answer:" in llm_output or not (result["actions"] or result["malformed"]):
+                final_answer = llm_output.split("Final Answer:", 1)[-1].strip()
+                stop_reason = "final_answer"
+                break
+            
+            # 工具结果已写入对话历史，提示LLM继续下一步
+            message = "Observation: 以上为工具执行结果。请继续下一步；若任务已完成，请以\"Final Answer:\"给出结论。"
+        
+        return {
+            "final_answer": final_answer,
+            "stop_reason": stop_reason,
+            "steps": steps,
+            "total_seconds": time.perf_counter() - start,
+            "total_tokens": total_tokens,
+            "wasted_generations": sum(1 for s in steps if s.get("wasted")),
+        }
+    
+    def _print_turn(self, result: Dict):
+        """显示一轮的LLM输出与工具调用结果"""
+        print("\n[Agent思考]")
+        try:
+            print(result["llm_output"])
+        except KeyError:
+            print("未能获取Agent输出")
 
-            # 显示工具调用结果
+        # 显示工具调用结果
+        actions = result.get("actions") or []
+        if len(actions) > 1:
+            for rec in actions:
+                print(f"\n[调用工具 {rec['index']}] {rec['action']}")
+                if rec["tool_result"]:
+                    print(f"[工具结果 {rec['index']}] {rec['tool_result']}")
+                if rec["error"]:
+                    print(f"[错误 {rec['index']}] {rec['error']}")
+        else:
             if result.get("action"):
                 print(f"\n[调用工具] {result['action']}")
             
@@ -143,11 +388,59 @@ class AgentSession:
             
             if result.get("error"):
                 print(f"\n[错误] {result['error']}")
+        
+        timing = result.get("timing")
+        if timing:
+            print(f"\n[耗时] 总计 {timing['total_s']:.3f}s | LLM {timing['llm_s']:.3f}s | "
+                  f"工具 {timing['tools_s']:.3f}s | 其他 {timing['other_s']:.3f}s")
+        if result.get("profile_path"):
+            print(f"[剖析] cProfile统计已写入 {result['profile_path']}")
+    
+    def chat_loop(self, auto: bool = False, **budget):
+        """
+        主对话循环
+
+        Args:
+            auto: 是否启用自主模式（每条指令自动多步执行，见run_task）
+            **budget: 传递给run_task的预算参数（max_steps/max_seconds/max_tokens）
+        """
+        print("=== Agent 对话模式（输入 'exit' 退出，'/profile <指令>' 剖析该轮）===\n")
+        if self.data_index is not None:
+            print(f"数据索引已建立（{len(self.data_index.entries)} 个文件，每条指令检索 top-{self.context_k}）\n")
+        else:
+            print(f"数据目录摘要已加载（包含 {len(self.data_summary.split('目录:'))-1} 个子目录）\n")
+        
+        while True:
+            user = input("你: ").strip()
+            if user.lower() in {"exit", "quit", "退出"}:
+                print("再见！")
+                break
             
+            if auto:
+                task = self.run_task(user, **budget)
+                for result in task["steps"]:
+                    print(f"\n--- 第{result['step']}步（{result['seconds']:.2f}s）---")
+                    self._print_turn(result)
+                print(f"\n[结束] 原因: {task['stop_reason']}，"
+                      f"共{len(task['steps'])}步（{task['wasted_generations']}步Action无效），"
+                      f"{task['total_seconds']:.2f}s，{task['total_tokens']} tokens")
+                print()
+                continue
+            
+            # 执行对话回合（/profile前缀时用cProfile剖析该轮）
+            profile_path = None
+            if user.startswith("/profile"):
+                user = user[len("/profile"):].strip()
+                profile_path = os.path.join("outputs", f"profile_{time.strftime('%Y%m%d_%H%M%S')}.prof")
+            result = self.chat_turn(user, profile_path=profile_path)
+            self._print_turn(result)
             print()
 
 
-def run_chat(data_root: str, llm_type: str = "simulated", llm_config: dict = None):
+def run_chat(data_root: str, llm_type: str = "simulated", llm_config: dict = None,
+             auto: bool = False, trace_path: Optional[str] = None,
+             tool_workers: int = 0, tool_timeout: Optional[float] = 60.0, context_k: int = 8,
+             compact: bool = False, **budget):
     """
     启动对话式Agent
     
@@ -155,16 +448,47 @@ def run_chat(data_root: str, llm_type: str = "simulated", llm_config: dict = Non
         data_root: 数据根目录
         llm_type: 'simulated', 'local', 'api'
         llm_config: LLM配置字典（传递给create_llm）
+        auto: 是否启用自主多步模式
+        trace_path: 追踪结果JSONL文件路径（可选）
+        tool_workers: 工具工作进程数，>0时重量级工具派发到预热的工作进程执行
+        tool_timeout: 工作进程中单次工具调用的超时（秒）
+        context_k: 每条指令检索注入的文件摘要数；0时把整个目录摘要放入系统消息
+        compact: 登记dataframe时压缩内存表示（float32、分类、可推导的索引列）
+        **budget: 自主模式预算（max_steps/max_seconds/max_tokens）
     """
-    # 生成数据摘要
+    from .preprocessing import summarize_directory
+    
+    # 生成数据摘要：建立文件索引（系统消息只放目录概览），或整个目录的摘要
     print(f"正在扫描数据目录: {data_root}...")
-    data_summary = summarize_directory(data_root, max_files_per_folder=1)
+    data_index = None
+    if context_k > 0:
+        data_index = get_index(data_root)
+        data_summary = data_index.overview()
+    else:
+        data_summary = summarize_directory(data_root, max_files_per_folder=1)
     
     # 创建LLM实例
     llm = create_llm(llm_type=llm_type, **(llm_config or {}))
     
     # 创建会话
-    session = AgentSession(llm, data_summary)
+    session = AgentSession(llm, data_summary, trace_path=trace_path, data_index=data_index, context_k=context_k)
+    
+    if compact:
+        from .tools import io_tools
+        io_tools.set_compaction(True)
+    
+    # 重量级工具派发到预热的工作进程池（工作进程沿用上面的压缩设置）
+    pool = None
+    if tool_workers > 0:
+        from .executor import set_worker_pool
+        from .workers import ToolWorkerPool
+        pool = ToolWorkerPool(workers=tool_workers, timeout=tool_timeout)
+        set_worker_pool(pool)
     
     # 启动对话循环
-    session.chat_loop()
+    try:
+        session.chat_loop(auto=auto, **budget)
+    finally:
+        if pool:
+            set_worker_pool(None)
+            pool.close()
@@ -16,15 +16,33 @@ class AgentConfig(BaseModel):
     llm_type: str = "simulated"  # 'simulated', 'local', 'api'
     llm_model_path: str = "microsoft/Phi-3-mini-4k-instruct"  # 本地模型路径或HF模型名
     llm_device: str = "auto"  # 'cpu', 'cuda', 'auto'
+    llm_constrained: bool = True  # 本地模型对Action做语法约束解码
     
     # API配置
     api_base_url: str = "https://api.openai.com/v1"
     api_key: Optional[str] = None
     api_model_name: str = "gpt-3.5-turbo"
+    api_tool_calling: bool = True  # 使用API原生的tool calling
+    api_stream: bool = False  # 以SSE流式接收回复
     
     # 生成参数
     max_tokens: int = 1024
     temperature: float = 0.7
+    
+    # 自主多步模式预算
+    max_steps: int = 10
+    max_seconds: Optional[float] = None
+    max_task_tokens: Optional[int] = None
+    
+    # 每条指令检索注入的数据文件摘要数（0表示把整个目录摘要放入系统消息）
+    context_k: int = 8
+    
+    # 登记dataframe时压缩内存表示（float32、分类、可推导的索引列）
+    compact_dataframes: bool = False
+    
+    # 工具工作进程池（0表示在对话进程内执行）
+    tool_workers: int = 0
+    tool_timeout: float = 60.0
 
 
 def load_config_from_env() -> AgentConfig:
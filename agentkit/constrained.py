@@ -0,0 +1,422 @@
+"""
+本地模型的Action语法约束解码
+
+"Action:"之后的生成被限制为符合_TOOL_REGISTRY签名的调用：已注册的工具名、该工具未出现过的参数名、
+与参数类型相符的Python字面量，必需参数齐全后才允许")"。约束下生成的Action总能通过parse_action与
+validate_call，不会因括号不配对、参数夹杂说明文字等格式错误浪费一次生成。"Action:"之外的文本不受约束。
+
+实现为字符级确定性自动机（ActionGrammar）；每个自动机状态允许的token集合（ActionConstraint）
+在首次遇到时计算并缓存，以logits processor的形式接入transformers的generate。
+补全"Action:"的token（如":\n"、":**"）其余部分同样要被自动机接受；每行的状态随新token增量推进，
+字符串参数中出现的"Action:"不会让自动机重新开始。
+"""
+import string
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .executor import VALUE_KINDS, _TOOL_REGISTRY, tool_parameters
+
+ACTION_MARKER = "Action:"
+
+_IDENT_CHARS = frozenset(string.ascii_letters + string.digits + "_")
+_SPACES = frozenset(" \t")
+_DIGITS = frozenset(string.digits)
+_QUOTES = frozenset("'\"")
+# 字符串中允许的转义（\u、\x等需要后续字符的转义不允许，避免生成不合法的字面量）
+_ESCAPES = frozenset("\\'\"ntr")
+_ALL_KINDS = frozenset(VALUE_KINDS)
+_KEY_KINDS = frozenset(("str",))
+# 字面量允许的最大嵌套层数（如filters={'load': [0, 1]}为2层）
+_MAX_DEPTH = 4
+# 容器状态：[ 等待元素或] / [v 逗号后等待元素 / [, 等待逗号或]；{ 等待键或} / {: 等待冒号 / {v 等待值 / {, 等待逗号或}
+_CLOSE = {"[,": "]", "{,": "}"}
+_AFTER_VALUE = {"[": "[,", "[v": "[,", "{": "{:", "{v": "{,"}
+_WORDS = {"T": ("True", "bool"), "F": ("False", "bool"), "N": ("None", "none")}
+# 数字的中间状态（不能在此结束）与结束状态
+_NUMBER_FINAL = frozenset(("zero", "int", "frac", "exp"))
+
+
+class GrammarState(NamedTuple):
+    """
+    自动机状态（不可变、可哈希，用作允许token集合的缓存键）
+
+    phase: lead（"Action:"之后的空格与可选的反引号）/ name（工具名）/ args（等待参数名或")"）/
+           param（参数名）/ eq（等待"="）/ value（参数值）/ after（等待","或")"）/ done（调用结束）
+    """
+    phase: str
+    tool: str = ""
+    buf: str = ""
+    used: FrozenSet[str] = frozenset()
+    kinds: FrozenSet[str] = _ALL_KINDS
+    stack: Tuple[str, ...] = ()
+    token: Optional[Tuple] = None
+
+
+DONE = GrammarState("done")
+
+
+class ActionGrammar:
+    """工具调用 tool(param=literal, ...) 的字符级自动机，参数集合与类别取自工具签名"""
+
+    def __init__(self, signatures: Dict[str, Dict[str, Tuple[FrozenSet[str], bool]]]):
+        """
+        Args:
+            signatures: {工具名: {参数名: (可接受的字面量类别, 是否必需)}}
+        """
+        self.signatures = signatures
+        self._tool_prefixes = {name[:i] for name in signatures for i in range(len(name) + 1)}
+
+    @classmethod
+    def from_registry(cls) -> "ActionGrammar":
+        return cls({
+            name: {p["name"]: (p["kinds"], p["required"]) for p in tool_parameters(name)}
+            for name in _TOOL_REGISTRY
+        })
+
+    def start(self) -> GrammarState:
+        return GrammarState("lead")
+
+    def feed(self, state: Optional[GrammarState], text: str) -> Optional[GrammarState]:
+        """逐字符推进；任一字符不合法时返回None，调用结束后的字符不再检查"""
+        for ch in text:
+            if state is None or state is DONE:
+                break
+            state = self.step(state, ch)
+        return state
+
+    def step(self, s: GrammarState, ch: str) -> Optional[GrammarState]:
+        phase = s.phase
+        if phase == "value":
+            return self._value_step(s, ch)
+        if phase == "lead":
+            # 与extract_actions的"Action:[ \t]*`?"一致：空格之后可有一个反引号，之后紧跟工具名
+            if ch in _SPACES:
+                return s
+            if ch == "`":
+                return GrammarState("name")
+            return self.step(GrammarState("name"), ch)
+        if phase == "name":
+            if ch in _IDENT_CHARS:
+                return s._replace(buf=s.buf + ch) if s.buf + ch in self._tool_prefixes else None
+            if ch == "(" and s.buf in self.signatures:
+                return s._replace(phase="args", tool=s.buf, buf="")
+            return None
+        if phase == "args":
+            if ch in _SPACES:
+                return s
+            if ch == ")":
+                return self._close(s)
+            if ch in _IDENT_CHARS and self._param_prefix(s, ch):
+                return s._replace(phase="param", buf=ch)
+            return None
+        if phase == "param":
+            if ch in _IDENT_CHARS:
+                return s._replace(buf=s.buf + ch) if self._param_prefix(s, s.buf + ch) else None
+            if s.buf not in self.signatures[s.tool] or s.buf in s.used:
+                return None
+            if ch in _SPACES:
+                return s._replace(phase="eq")
+            return self._start_value(s) if ch == "=" else None
+        if phase == "eq":
+            if ch in _SPACES:
+                return s
+            return self._start_value(s) if ch == "=" else None
+        if phase == "after":
+            if ch in _SPACES:
+                return s
+            if ch == ",":
+                return s._replace(phase="args")
+            return self._close(s) if ch == ")" else None
+        return None
+
+    def _param_prefix(self, s: GrammarState, prefix: str) -> bool:
+        return any(p.startswith(prefix) and p not in s.used for p in self.signatures[s.tool])
+
+    def _close(self, s: GrammarState) -> Optional[GrammarState]:
+        """")"只在必需参数齐全时允许"""
+        required = (p for p, (_, req) in self.signatures[s.tool].items() if req)
+        return DONE if all(p in s.used for p in required) else None
+
+    def _start_value(self, s: GrammarState) -> GrammarState:
+        kinds, _ = self.signatures[s.tool][s.buf]
+        return s._replace(phase="value", used=s.used | {s.buf}, buf="", kinds=kinds, stack=(), token=None)
+
+    def _value_done(self, s: GrammarState) -> GrammarState:
+        """一个字面量结束：顶层时等待下一个参数，容器内时等待分隔符"""
+        s = s._replace(token=None)
+        if not s.stack:
+            return s._replace(phase="after", kinds=_ALL_KINDS)
+        return s._replace(stack=s.stack[:-1] + (_AFTER_VALUE[s.stack[-1]],))
+
+    def _value_step(self, s: GrammarState, ch: str) -> Optional[GrammarState]:
+        token = s.token
+        if token is not None:
+            kind = token[0]
+            if kind == "str":
+                _, quote, escaped = token
+                if ch == "\n":
+                    return None
+                if escaped:
+                    return s._replace(token=("str", quote, False)) if ch in _ESCAPES else None
+                if ch == "\\":
+                    return s._replace(token=("str", quote, True))
+                return self._value_done(s) if ch == quote else s
+            if kind == "word":
+                _, word, i = token
+                if ch != word[i]:
+                    return None
+                return self._value_done(s) if i + 1 == len(word) else s._replace(token=("word", word, i + 1))
+            # 数字在遇到第一个非数字字符时结束，该字符交给外层处理
+            stage = _number_step(token[1], ch, token[2])
+            if stage:
+                return s._replace(token=("num", stage, token[2]))
+            if token[1] not in _NUMBER_FINAL:
+                return None
+            return self.step(self._value_done(s), ch)
+
+        top = s.stack[-1] if s.stack else None
+        if ch in _SPACES:
+            return s
+        if top in _CLOSE:
+            if ch == ",":
+                return s._replace(stack=s.stack[:-1] + ("[v" if top == "[," else "{",))
+            return self._value_done(s._replace(stack=s.stack[:-1])) if ch == _CLOSE[top] else None
+        if top == "{:":
+            return s._replace(stack=s.stack[:-1] + ("{v",)) if ch == ":" else None
+        if (ch == "]" and top in ("[", "[v")) or (ch == "}" and top == "{"):
+            return self._value_done(s._replace(stack=s.stack[:-1]))
+        kinds = s.kinds if top is None else _KEY_KINDS if top == "{" else _ALL_KINDS
+        if ch in _QUOTES and "str" in kinds:
+            return s._replace(token=("str", ch, False))
+        if (ch == "-" or ch in _DIGITS) and ("int" in kinds or "float" in kinds):
+            return s._replace(token=("num", _number_step("", ch, "float" in kinds), "float" in kinds))
+        if ch in _WORDS and _WORDS[ch][1] in kinds:
+            return s._replace(token=("word", _WORDS[ch][0], 1))
+        if len(s.stack) < _MAX_DEPTH:
+            if ch == "[" and "list" in kinds:
+                return s._replace(stack=s.stack + ("[",))
+            if ch == "{" and "dict" in kinds:
+                return s._replace(stack=s.stack + ("{",))
+        return None
+
+
+def _number_step(stage: str, ch: str, allow_float: bool) -> Optional[str]:
+    """数字字面量 -?(0|[1-9]\\d*)(\\.\\d+)?([eE][-+]?\\d+)? 的状态转移；allow_float为False时只接受整数"""
+    if stage == "":
+        return "sign" if ch == "-" else "zero" if ch == "0" else "int" if ch in _DIGITS else None
+    if stage == "sign":
+        return "zero" if ch == "0" else "int" if ch in _DIGITS else None
+    if ch in _DIGITS:
+        if stage == "zero":
+            return None
+        return {"int": "int", "dot": "frac", "frac": "frac", "e": "exp", "esign": "exp", "exp": "exp"}[stage]
+    if not allow_float:
+        return None
+    if ch == "." and stage in ("zero", "int"):
+        return "dot"
+    if ch in "eE" and stage in ("zero", "int", "frac"):
+        return "e"
+    if ch in "+-" and stage == "e":
+        return "esign"
+    return None
+
+
+class _TokenTable:
+    """词表中每个token解码后的文本，按首字符分组；字符串内的状态另按是否含引号/反斜杠/换行预先划分"""
+
+    def __init__(self, tokenizer):
+        # 单独解码会丢掉SentencePiece词表的前导空格，因此拼在一个固定前缀后解码再去掉前缀
+        prefix = tokenizer.encode("a", add_special_tokens=False)
+        base = tokenizer.decode(prefix)
+        size = len(tokenizer)
+        decoded = tokenizer.batch_decode([prefix + [i] for i in range(size)], skip_special_tokens=True)
+        self.strings: List[str] = [text[len(base):] if text.startswith(base) else "" for text in decoded]
+        by_first: Dict[str, List[int]] = {}
+        for i, text in enumerate(self.strings):
+            if text:
+                by_first.setdefault(text[0], []).append(i)
+        self.by_first = {ch: np.asarray(ids) for ch, ids in by_first.items()}
+        self.plain: Dict[str, np.ndarray] = {}
+        self.special: Dict[str, List[int]] = {}
+        for quote in _QUOTES:
+            stops = {quote, "\\", "\n"}
+            plain = [i for i, text in enumerate(self.strings) if text and not stops.intersection(text)]
+            self.plain[quote] = np.asarray(plain)
+            flags = np.zeros(size, dtype=bool)
+            flags[plain] = True
+            self.special[quote] = [i for i, text in enumerate(self.strings) if text and not flags[i]]
+
+
+# 每行的解码位置：("out", 已匹配的"Action:"前缀长度) 或 ("in", 自动机状态)
+RowState = Tuple[str, object]
+_OUTSIDE: RowState = ("out", 0)
+
+
+def _marker_suffix(text: str) -> int:
+    """text末尾与"Action:"前缀重合的最大长度（标记中没有自重叠，末尾匹配即为当前的匹配进度）"""
+    for k in range(len(ACTION_MARKER) - 1, 0, -1):
+        if text.endswith(ACTION_MARKER[:k]):
+            return k
+    return 0
+
+
+class ActionConstraint:
+    """
+    "Action:"之后只保留语法上可行的token（transformers logits processor）
+
+    每行的状态随新生成的token增量推进（advance）：Action内把不可行token的logit置为-inf；
+    Action外屏蔽会补全"Action:"但其余部分不被自动机接受的token（如":\n"、":**"）。
+    """
+
+    # 状态缓存条目上限，超过时清空
+    _CACHE_SIZE = 4096
+
+    def __init__(self, tokenizer, grammar: Optional[ActionGrammar] = None):
+        self.tokenizer = tokenizer
+        self.grammar = grammar or ActionGrammar.from_registry()
+        self.table = _TokenTable(tokenizer)
+        self._allowed: Dict[GrammarState, np.ndarray] = {}
+        self._banned: Dict[int, np.ndarray] = {}
+
+    def processor(self, prompt_length: int) -> "_BoundConstraint":
+        """绑定本次生成的prompt长度，返回可放入LogitsProcessorList的processor"""
+        return _BoundConstraint(self, prompt_length)
+
+    def advance(self, row: RowState, text: str) -> RowState:
+        """
+        按新生成的文本推进一行的状态
+
+        Action外查找"Action:"（可跨token），找到后之后的字符交给自动机；调用结束或出现不合法字符时回到Action外，
+        继续在其后查找下一个"Action:"。Action内（包括字符串参数中）不查找标记。
+        """
+        mode, value = row
+        i = 0
+        while i < len(text):
+            if mode == "in":
+                state = value
+                while i < len(text) and state is not None and state is not DONE:
+                    state = self.grammar.step(state, text[i])
+                    i += 1
+                if state is None or state is DONE:
+                    mode, value = _OUTSIDE
+                else:
+                    value = state
+            else:
+                combined = ACTION_MARKER[:value] + text[i:]
+                pos = combined.find(ACTION_MARKER)
+                if pos < 0:
+                    return ("out", _marker_suffix(combined))
+                i += pos + len(ACTION_MARKER) - value
+                mode, value = "in", self.grammar.start()
+        return (mode, value)
+
+    def state(self, generated: str) -> Optional[GrammarState]:
+        """已生成文本对应的自动机状态；不在未结束的Action中时返回None"""
+        mode, value = self.advance(_OUTSIDE, generated)
+        return value if mode == "in" else None
+
+    def banned(self, matched: int) -> np.ndarray:
+        """Action外已匹配"Action:"前matched个字符时，会补全标记但其余部分不被自动机接受的token id"""
+        ids = self._banned.get(matched)
+        if ids is not None:
+            return ids
+        head, rest = ACTION_MARKER[:matched], ACTION_MARKER[matched:]
+        banned = []
+        for i, text in enumerate(self.table.strings):
+            if not text.startswith(rest) and ACTION_MARKER not in text:
+                continue
+            combined = head + text
+            tail = combined[combined.find(ACTION_MARKER) + len(ACTION_MARKER):]
+            if self.grammar.feed(self.grammar.start(), tail) is None:
+                banned.append(i)
+        ids = np.asarray(banned, dtype=np.int64)
+        self._banned[matched] = ids
+        return ids
+
+    def _accepts(self, state: Optional[GrammarState], text: str) -> bool:
+        return self.grammar.feed(state, text) is not None
+
+    def allowed(self, state: GrammarState) -> np.ndarray:
+        """state下可行的token id（整段token文本都能被自动机接受，或在其中结束调用）"""
+        ids = self._allowed.get(state)
+        if ids is not None:
+            return ids
+        table = self.table
+        token = state.token
+        if token is not None and token[0] == "str" and not token[2]:
+            # 字符串内部：不含引号/反斜杠/换行的token状态不变，只需逐个检查其余token
+            quote = token[1]
+            extra = [i for i in table.special[quote] if self._accepts(state, table.strings[i])]
+            ids = np.concatenate([table.plain[quote], np.asarray(extra, dtype=table.plain[quote].dtype)])
+        else:
+            parts = []
+            for ch, group in table.by_first.items():
+                nxt = self.grammar.step(state, ch)
+                if nxt is None:
+                    continue
+                if nxt is DONE:
+                    parts.append(group)
+                else:
+                    parts.append(np.asarray([i for i in group if self._accepts(nxt, table.strings[i][1:])],
+                                            dtype=group.dtype))
+            ids = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        if len(self._allowed) >= self._CACHE_SIZE:
+            self._allowed.clear()
+        self._allowed[state] = ids
+        return ids
+
+    def row_state(self, ids: Tuple[int, ...], known: Dict[Tuple[int, ...], RowState]) -> RowState:
+        """已生成token序列的状态：由上一步的状态（known）按最后一个token推进，找不到时从头推进"""
+        parent = known.get(ids[:-1]) if ids else _OUTSIDE
+        if parent is not None:
+            return self.advance(parent, self.table.strings[ids[-1]]) if ids else parent
+        row = _OUTSIDE
+        for token_id in ids:
+            row = self.advance(row, self.table.strings[token_id])
+        return row
+
+    def apply(self, row: RowState, scores_row):
+        """按行状态修改一行logits（原地）"""
+        import torch
+
+        mode, value = row
+        size = scores_row.shape[-1]
+        if mode == "out":
+            ids = self.banned(value)
+            ids = ids[ids < size]
+            if len(ids):
+                scores_row[torch.as_tensor(ids, device=scores_row.device)] = float("-inf")
+            return
+        ids = self.allowed(value)
+        ids = ids[ids < size]
+        if not len(ids):
+            return
+        keep = torch.as_tensor(ids, device=scores_row.device)
+        constrained = torch.full_like(scores_row, float("-inf"))
+        constrained[keep] = scores_row[keep]
+        scores_row.copy_(constrained)
+
+
+class _BoundConstraint:
+    """
+    logits processor接口 (input_ids, scores) -> scores
+
+    以已生成的token序列为键保存上一步各行的状态，每步只按新token推进；按序列查找也适用于beam search的行重排。
+    """
+
+    def __init__(self, constraint: ActionConstraint, prompt_length: int):
+        self.constraint = constraint
+        self.prompt_length = prompt_length
+        self._states: Dict[Tuple[int, ...], RowState] = {}
+
+    def __call__(self, input_ids, scores):
+        states = {}
+        for row in range(input_ids.shape[0]):
+            ids = tuple(input_ids[row, self.prompt_length:].tolist())
+            state = states.get(ids)
+            if state is None:
+                state = states[ids] = self.constraint.row_state(ids, self._states)
+            self.constraint.apply(state, scores[row])
+        self._states = states
+        return scores
@@ -0,0 +1,180 @@
+"""
+.mat数据树一次性转换为分区的Parquet/Arrow IPC数据集
+
+loadmat每次都要解析整个文件且无法部分读取；转换后按 fault/load/sensor 的hive分区目录存放，
+load_dataframe(file_type="dataset")读取时可按分区裁剪、只读所需列，Arrow IPC格式可内存映射。
+
+输出布局:
+    <output>/fault=IR/load=0/sensor=DE/part-<记录>.parquet
+    <output>/fault=Normal/load=0/sensor=FE/part-<记录>.parquet
+每个分区文件的列: file, record, fault_size, index, value, sampling_rate, rpm
+"""
+import hashlib
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .tools.io_tools import DATASET_PARTITIONS, _infer_sampling_rate
+
+_FAULT_NAMES = {"IR": "IR", "OR": "OR", "B": "B", "BALL": "B", "INNERRACE": "IR", "OUTERRACE": "OR"}
+_SENSOR_KEY = re.compile(r"^(X?\d+)_?(DE|FE|BA)_time$")
+_RPM_KEY = re.compile(r"RPM$")
+
+# 每个分区文件内取值恒定的列以字典编码存储（行上只占1字节索引）
+_CONSTANT_COLUMNS = ("file", "record", "fault_size")
+# parquet列编码：index递增用增量编码，浮点值按字节拆分后压缩率更高
+_PARQUET_ENCODING = {"index": "DELTA_BINARY_PACKED", "value": "BYTE_STREAM_SPLIT"}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("请安装pyarrow: pip install agentkit[dataset]")
+
+
+def parse_cwru_path(rel_path: str) -> Dict[str, str]:
+    """
+    从相对路径推断分区与属性
+
+    例: "12k Drive End Bearing Fault Data/IR/007/IR007_1.mat"
+        -> {"fault": "IR", "load": "1", "fault_size": "007"}
+    """
+    parts = rel_path.replace("\\", "/").split("/")
+    stem = os.path.splitext(parts[-1])[0]
+    fault = "unknown"
+    if "normal" in rel_path.lower():
+        fault = "Normal"
+    else:
+        for part in parts[:-1] + [re.sub(r"[\d_@]+.*$", "", stem)]:
+            key = part.upper().replace(" ", "")
+            if key in _FAULT_NAMES:
+                fault = _FAULT_NAMES[key]
+                break
+    load = re.search(r"_(\d)$", stem)
+    size = re.search(r"(?<!\d)(0\d\d)(?!\d)", rel_path)
+    return {
+        "fault": fault,
+        "load": load.group(1) if load else "unknown",
+        "fault_size": size.group(1) if size and fault != "Normal" else "",
+    }
+
+
+def _part_name(rel_path: str, record: str, ext: str) -> str:
+    stem = re.sub(r"[^0-9A-Za-z]+", "_", os.path.splitext(os.path.basename(rel_path))[0])
+    digest = hashlib.sha1(rel_path.encode("utf-8")).hexdigest()[:8]
+    return f"part-{stem}-{record}-{digest}.{ext}"
+
+
+def convert_file(path: str, data_root: str, output_dir: str, file_format: str = "parquet",
+                 compression: Optional[str] = "zstd", compression_level: Optional[int] = None) -> Dict:
+    """转换单个.mat文件：每个传感器通道写一个分区文件，返回写入的文件与行数"""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    from scipy.io import loadmat
+
+    rel_path = os.path.relpath(path, data_root)
+    info = parse_cwru_path(rel_path)
+    mat = loadmat(path)
+    rpm = next((float(np.ravel(v)[0]) for k, v in mat.items() if _RPM_KEY.search(k) and np.size(v)), np.nan)
+    sampling_rate = _infer_sampling_rate(rel_path) or np.nan
+
+    written = []
+    for key, arr in mat.items():
+        match = _SENSOR_KEY.match(key)
+        if not match or not isinstance(arr, np.ndarray):
+            continue
+        record, sensor = match.groups()
+        values = np.ravel(arr).astype(np.float64, copy=False)
+        n = len(values)
+        constants = {"file": rel_path.replace("\\", "/"), "record": record, "fault_size": info["fault_size"]}
+        codes = np.zeros(n, dtype=np.int8)
+        table = pa.table({
+            **{name: pa.DictionaryArray.from_arrays(codes, [constants[name]]) for name in _CONSTANT_COLUMNS},
+            "index": pa.array(np.arange(n, dtype=np.int32)),
+            "value": pa.array(values),
+            "sampling_rate": pa.array(np.full(n, sampling_rate, dtype=np.float32)),
+            "rpm": pa.array(np.full(n, rpm, dtype=np.float32)),
+        })
+        partition = {"fault": info["fault"], "load": info["load"], "sensor": sensor}
+        part_dir = os.path.join(output_dir, *(f"{name}={partition[name]}" for name in DATASET_PARTITIONS))
+        os.makedirs(part_dir, exist_ok=True)
+        ext = "parquet" if file_format == "parquet" else "arrow"
+        part_path = os.path.join(part_dir, _part_name(rel_path, record, ext))
+        if file_format == "parquet":
+            pq.write_table(table, part_path, compression=compression or "none",
+                           compression_level=compression_level,
+                           use_dictionary=list(_CONSTANT_COLUMNS) + ["sampling_rate", "rpm"],
+                           column_encoding=_PARQUET_ENCODING)
+        else:
+            # 不压缩的IPC文件可直接内存映射，读取时零拷贝
+            feather.write_feather(table, part_path, compression=compression or "uncompressed",
+                                  compression_level=compression_level)
+        written.append({"path": part_path, "rows": n, "bytes": os.path.getsize(part_path)})
+    return {"file": path, "parts": written}
+
+
+def _convert_one(args) -> Dict:
+    try:
+        return convert_file(*args)
+    except Exception as e:
+        return {"file": args[0], "parts": [], "error": f"{type(e).__name__}: {e}"}
+
+
+def convert_mat_tree(data_root: str, output_dir: str, file_format: str = "parquet",
+                     compression: Optional[str] = "zstd", compression_level: Optional[int] = None,
+                     workers: Optional[int] = None, overwrite: bool = False) -> Dict:
+    """
+    把data_root下全部.mat文件并行转换为分区数据集
+
+    Args:
+        data_root: .mat数据根目录
+        output_dir: 数据集输出目录
+        file_format: parquet 或 arrow（Arrow IPC，可内存映射）
+        compression: 压缩编码（parquet: zstd/snappy/gzip/brotli/lz4/none；arrow: zstd/lz4/None）
+        compression_level: 压缩级别，None为编码默认值
+        workers: 并行进程数，默认CPU核数
+        overwrite: 输出目录已存在时先删除
+
+    Returns:
+        {"files", "parts", "rows", "input_bytes", "output_bytes", "seconds", "errors"}
+    """
+    _require_pyarrow()
+    if file_format not in ("parquet", "arrow"):
+        raise ValueError(f"Unsupported format: {file_format}")
+    if os.path.isdir(output_dir) and os.listdir(output_dir):
+        if not overwrite:
+            raise FileExistsError(f"{output_dir} 已存在且非空，使用overwrite=True覆盖")
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    paths = sorted(
+        os.path.join(root, f)
+        for root, _dirs, files in os.walk(data_root)
+        for f in files if f.lower().endswith(".mat")
+    )
+    start = time.perf_counter()
+    jobs = [(p, data_root, output_dir, file_format, compression, compression_level) for p in paths]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(jobs) <= 1:
+        results = [_convert_one(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(_convert_one, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+    parts: List[Dict] = [part for r in results for part in r["parts"]]
+    return {
+        "files": len(paths),
+        "parts": len(parts),
+        "rows": sum(p["rows"] for p in parts),
+        "input_bytes": sum(os.path.getsize(p) for p in paths),
+        "output_bytes": sum(p["bytes"] for p in parts),
+        "seconds": time.perf_counter() - start,
+        "errors": [{"file": r["file"], "error": r["error"]} for r in results if "error" in r],
+    }
@@ -1,49 +1,439 @@
 import ast
+import contextvars
+import difflib
+import inspect
+import os
 import re
-from typing import Any, Dict, Tuple
+import types
+import typing
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple, Union
 
-from .tools import (
-    load_dataframe,
-    save_dataframe,
-    describe_dataframe,
-    plot_time_series,
-    detect_anomalies_iqr,
-)
+from . import tools
+from .tracing import span
 
 
-_TOOL_REGISTRY = {
-    "load_dataframe": load_dataframe,
-    "save_dataframe": save_dataframe,
-    "describe_dataframe": describe_dataframe,
-    "plot_time_series": plot_time_series,
-    "detect_anomalies_iqr": detect_anomalies_iqr,
-}
+class _LazyToolRegistry(Mapping):
+    """工具名 -> 工具函数；工具模块在首次查找时才导入（见agentkit.tools）"""
+
+    def __init__(self, names):
+        self._names = list(names)
+        self._funcs: Dict[str, Callable] = {}
+
+    def register(self, name: str, func: Callable):
+        if name not in self._names:
+            self._names.append(name)
+        self._funcs[name] = func
+
+    def __getitem__(self, name: str) -> Callable:
+        if name not in self._funcs:
+            if name not in self._names:
+                raise KeyError(name)
+            self._funcs[name] = getattr(tools, name)
+        return self._funcs[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+_TOOL_REGISTRY = _LazyToolRegistry(tools.__all__)
+
+# 可选的工具工作进程池（见agentkit.workers.ToolWorkerPool）；设置后池内工具派发到工作进程执行
+_WORKER_POOL = None
+
+
+def set_worker_pool(pool):
+    """设置（或传入None取消）工具工作进程池"""
+    global _WORKER_POOL
+    _WORKER_POOL = pool
+
+# <result_N> 引用同一轮中第N个Action（从1开始）的结果
+_RESULT_REF = re.compile(r"<result_(\d+)>")
+_LAST_DF_REF = "<last_df_id>"
+
+# 不产生dataframe的工具；<last_df_id>只依赖此前最近一个可能产生dataframe的Action，
+# 不在此列的工具（含自定义工具）都视为可能产生
+_NO_DATAFRAME_TOOLS = frozenset({
+    "save_dataframe", "release_dataframe", "save_status", "memory_usage", "describe_dataframe",
+    "plot_time_series", "stream_status", "stop_stream", "search_data_files",
+})
+
+
+class ActionSyntaxError(ValueError):
+    """Action无法解析或与工具签名不符：工具未执行，LLM需要重新生成（一次浪费的生成）"""
+
+
+# "Action:"之后允许一个反引号（部分模型把调用包在`...`中）
+_ACTION_MARKER = re.compile(r"Action:[ \t]*`?")
+_IDENTIFIER = re.compile(r"[a-zA-Z_][a-zA-Z0-9_]*")
+_CLOSING = {")": "(", "]": "[", "}": "{"}
+
+
+def _scan_call(text: str, pos: int) -> Optional[int]:
+    """
+    从pos处的"name("开始截取一个完整调用，返回结束位置；括号不配对或字符串未闭合时返回None
+
+    跳过字符串字面量，参数中的括号（如title='振动(mm/s)'）不影响配对。
+    """
+    m = _IDENTIFIER.match(text, pos)
+    if not m or not text.startswith("(", m.end()):
+        return None
+    stack = []
+    quote = None
+    i = m.end()
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if ch == "\\":
+                i += 1
+            elif ch == quote:
+                quote = None
+            elif ch == "\n":
+                return None
+        elif ch in "'\"":
+            quote = ch
+        elif ch in "([{":
+            stack.append(ch)
+        elif ch in _CLOSING:
+            if not stack or stack.pop() != _CLOSING[ch]:
+                return None
+            if not stack:
+                return i + 1
+        i += 1
+    return None
+
+
+def extract_actions(text: str) -> Tuple[List[str], List[str]]:
+    """
+    按顺序提取LLM输出中的全部"Action: tool(...)"调用
+
+    Returns:
+        (actions, malformed)：完整的调用文本；"Action:"之后截取不出完整调用的片段（取首行）
+    """
+    actions, malformed = [], []
+    pos = 0
+    while True:
+        m = _ACTION_MARKER.search(text, pos)
+        if not m:
+            break
+        end = _scan_call(text, m.end())
+        if end is None:
+            malformed.append(text[m.end():].split("\n", 1)[0].strip())
+            pos = m.end()
+        else:
+            actions.append(text[m.end():end])
+            pos = end
+    return actions, malformed
+
+
+# 参数值的字面量类别（约束解码与JSON Schema共用）
+VALUE_KINDS = ("str", "int", "float", "bool", "none", "list", "dict")
+_KIND_OF_TYPE = {str: "str", int: "int", float: "float", bool: "bool", type(None): "none",
+                 list: "list", tuple: "list", dict: "dict"}
+_JSON_CONSTANTS = {"true": True, "false": False, "null": None}
+
+# 工具名 -> (工具函数, 参数规格)
+_SIGNATURES: Dict[str, Tuple[Callable, List[Dict]]] = {}
+
+
+def _annotation_kinds(annotation) -> FrozenSet[str]:
+    """类型注解 -> 可接受的字面量类别；无注解或Any时接受全部"""
+    origin = typing.get_origin(annotation)
+    if origin is Union or origin is types.UnionType:
+        return frozenset().union(*(_annotation_kinds(a) for a in typing.get_args(annotation)))
+    kind = _KIND_OF_TYPE.get(origin or annotation)
+    if kind is None:
+        return frozenset(VALUE_KINDS)
+    # 浮点参数也接受整数写法
+    return frozenset(("float", "int")) if kind == "float" else frozenset((kind,))
+
+
+def _value_kind(value: Any) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    return _KIND_OF_TYPE.get(type(value), "str" if isinstance(value, str) else "")
+
+
+def _unknown_tool(name: str) -> ActionSyntaxError:
+    close = difflib.get_close_matches(name, list(_TOOL_REGISTRY), n=1)
+    hint = f"，是否为 {close[0]}？" if close else ""
+    return ActionSyntaxError(f"未知工具: {name}{hint}")
+
+
+def tool_parameters(name: str) -> List[Dict]:
+    """
+    工具的参数规格（按签名顺序）：[{"name", "required", "kinds", "default"}]
+
+    kinds为可接受的字面量类别（见VALUE_KINDS），由类型注解推出。
+    """
+    if name not in _TOOL_REGISTRY:
+        raise _unknown_tool(name)
+    func = _TOOL_REGISTRY[name]
+    cached = _SIGNATURES.get(name)
+    if cached and cached[0] is func:
+        return cached[1]
+    hints = typing.get_type_hints(func)
+    params = [
+        {
+            "name": p.name,
+            "required": p.default is p.empty,
+            "kinds": _annotation_kinds(hints.get(p.name, Any)),
+            "default": None if p.default is p.empty else p.default,
+        }
+        for p in inspect.signature(func).parameters.values()
+        if p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD)
+    ]
+    _SIGNATURES[name] = (func, params)
+    return params
+
+
+def validate_call(name: str, kwargs: Dict[str, Any]):
+    """按工具签名检查参数名、必需参数与字面量类别，不符时抛出ActionSyntaxError"""
+    params = {p["name"]: p for p in tool_parameters(name)}
+    unknown = [k for k in kwargs if k not in params]
+    if unknown:
+        raise ActionSyntaxError(f"{name}没有参数 {', '.join(unknown)}，可用参数: {', '.join(params)}")
+    missing = [k for k, p in params.items() if p["required"] and k not in kwargs]
+    if missing:
+        raise ActionSyntaxError(f"{name}缺少必需参数 {', '.join(missing)}")
+    for k, value in kwargs.items():
+        kinds = params[k]["kinds"]
+        if _value_kind(value) not in kinds:
+            expected = "/".join(kind for kind in VALUE_KINDS if kind in kinds)
+            raise ActionSyntaxError(f"{name}的参数{k}应为{expected}，实际为{value!r}")
+
+
+class _JsonConstants(ast.NodeTransformer):
+    """容忍JSON风格的true/false/null"""
+
+    def visit_Name(self, node):
+        if node.id in _JSON_CONSTANTS:
+            return ast.copy_location(ast.Constant(_JSON_CONSTANTS[node.id]), node)
+        return node
+
+
+def _literal(arg: str, node: ast.AST) -> Any:
+    try:
+        return ast.literal_eval(_JsonConstants().visit(node))
+    except ValueError:
+        raise ActionSyntaxError(f"参数{arg}的值必须是字面量（字符串需加引号）: {ast.unparse(node)}") from None
 
 
 def parse_action(text: str) -> Tuple[str, Dict[str, Any]]:
-    # Expected format: tool_name(arg1=value1, arg2=value2)
-    m = re.match(r"\s*([a-zA-Z_][a-zA-Z0-9_]*)\((.*)\)\s*\Z", text, re.S)
-    if not m:
-        raise ValueError("Invalid action format")
-    name, args_src = m.group(1), m.group(2).strip()
-    if not args_src:
-        return name, {}
-    # Build a dict literal from kw args by wrapping into dict(...)
-    # Safer: parse as AST call and extract keywords
-    node = ast.parse(f"f({args_src})", mode="eval")
-    if not isinstance(node.body, ast.Call):
-        raise ValueError("Invalid action args")
+    """
+    解析 tool_name(arg1=value1, arg2=value2)；位置参数按工具签名顺序对应到参数名
+
+    Raises:
+        ActionSyntaxError: 不是合法的调用表达式，或参数值不是字面量
+    """
+    try:
+        node = ast.parse(text.strip(), mode="eval").body
+    except SyntaxError as e:
+        raise ActionSyntaxError(f"Action语法错误: {e.msg}") from None
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name):
+        raise ActionSyntaxError("Action格式应为 tool_name(arg=value, ...)")
+    name = node.func.id
     kwargs = {}
-    for kw in node.body.keywords:
-        kwargs[kw.arg] = ast.literal_eval(kw.value)
+    if node.args:
+        if any(isinstance(a, ast.Starred) for a in node.args):
+            raise ActionSyntaxError("Action不支持*参数")
+        names = [p["name"] for p in tool_parameters(name)]
+        if len(node.args) > len(names):
+            raise ActionSyntaxError(f"{name}最多接受{len(names)}个参数")
+        kwargs.update((arg, _literal(arg, value)) for arg, value in zip(names, node.args))
+    for kw in node.keywords:
+        if kw.arg is None:
+            raise ActionSyntaxError("Action不支持**参数")
+        if kw.arg in kwargs:
+            raise ActionSyntaxError(f"参数{kw.arg}重复")
+        kwargs[kw.arg] = _literal(kw.arg, kw.value)
     return name, kwargs
 
 
+_JSON_TYPES = {"str": "string", "int": "integer", "float": "number", "bool": "boolean",
+               "none": "null", "list": "array", "dict": "object"}
+
+
+def tool_schemas() -> List[Dict]:
+    """
+    OpenAI兼容的tools定义（function calling），参数JSON Schema由工具签名生成，
+    工具与参数说明取自prompt中的工具描述
+    """
+    from .prompt import tool_descriptions
+
+    docs = tool_descriptions()
+    schemas = []
+    for name in _TOOL_REGISTRY:
+        doc = docs.get(name, {})
+        properties = {}
+        for p in tool_parameters(name):
+            kinds = p["kinds"] - {"int"} if "float" in p["kinds"] else p["kinds"]
+            json_types = [_JSON_TYPES[k] for k in VALUE_KINDS if k in kinds]
+            prop = {"type": json_types[0] if len(json_types) == 1 else json_types}
+            note = doc.get("parameters", {}).get(p["name"]) or {}
+            if note.get("description"):
+                prop["description"] = note["description"]
+            if note.get("enum"):
+                prop["enum"] = note["enum"]
+            properties[p["name"]] = prop
+        schemas.append({
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": doc.get("description", name),
+                "parameters": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": [p["name"] for p in tool_parameters(name) if p["required"]],
+                    "additionalProperties": False,
+                },
+            },
+        })
+    return schemas
+
+
 def execute_action(action: str):
     name, kwargs = parse_action(action)
-    if name not in _TOOL_REGISTRY:
-        raise KeyError(f"Unknown tool: {name}")
+    validate_call(name, kwargs)
     func = _TOOL_REGISTRY[name]
-    return func(**kwargs)
+    with span("tool", tool=name, action=action) as record:
+        file_path = kwargs.get("file_path")
+        if name.startswith("load") and isinstance(file_path, str) and os.path.isfile(file_path):
+            record["bytes_read"] = os.path.getsize(file_path)
+        pool = _WORKER_POOL
+        if pool is not None and pool.handles(name):
+            record["worker"] = True
+            return pool.call(name, kwargs)
+        return func(**kwargs)
+
+
+class _InlineExecutor:
+    """与ThreadPoolExecutor接口一致的同步执行器（单线程/单Action时避免线程开销，便于cProfile）"""
+
+    def submit(self, fn, *args) -> Future:
+        fut = Future()
+        try:
+            fut.set_result(fn(*args))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+
+def primary_value(result: Any) -> Any:
+    """工具结果的主值：元组/列表取第一个元素（如detect_anomalies_iqr的dataframe_id）"""
+    if isinstance(result, (tuple, list)) and result:
+        return result[0]
+    return result
+
+
+def _may_produce_dataframe(action: str) -> bool:
+    m = _IDENTIFIER.match(action.strip())
+    return m is None or m.group(0) not in _NO_DATAFRAME_TOOLS
+
+
+def build_action_graph(actions: List[str]) -> List[Dict]:
+    """
+    根据结果引用构建Action依赖图
+
+    - <result_N> 依赖第N个Action（只能引用前面的Action，因此图必然无环）
+    - <last_df_id> 依赖此前最近一个可能产生dataframe的Action；没有时使用本轮之前的dataframe_id，
+      与describe/plot等Action互不依赖，可并发执行，它们失败也不影响
+
+    Returns:
+        [{"index": int, "action": str, "deps": List[int]}, ...]，index从1开始
+    """
+    nodes = []
+    for i, action in enumerate(actions, start=1):
+        deps = set()
+        for ref in _RESULT_REF.findall(action):
+            ref = int(ref)
+            if not 1 <= ref < i:
+                raise ValueError(f"Action {i} 引用了无效的结果 <result_{ref}>")
+            deps.add(ref)
+        if _LAST_DF_REF in action:
+            producer = next((j for j in range(i - 1, 0, -1) if _may_produce_dataframe(actions[j - 1])), None)
+            if producer is not None:
+                deps.add(producer)
+        nodes.append({"index": i, "action": action, "deps": sorted(deps)})
+    return nodes
+
+
+def _resolve_refs(action: str, deps: List[int], results: Dict[int, Any],
+                  last_df_id: Optional[str]) -> str:
+    action = _RESULT_REF.sub(lambda m: str(primary_value(results[int(m.group(1))])), action)
+    if _LAST_DF_REF in action:
+        from .tools.io_tools import has_dataframe
+        for dep in reversed(deps):
+            value = primary_value(results[dep])
+            if isinstance(value, str) and has_dataframe(value):
+                last_df_id = value
+                break
+        if last_df_id:
+            action = action.replace(_LAST_DF_REF, last_df_id)
+    return action
+
+
+def execute_actions(actions: List[str], max_workers: int = 4,
+                    last_df_id: Optional[str] = None) -> List[Dict]:
+    """
+    按依赖图执行多个Action，互不依赖的Action在线程池中并发执行
+
+    Args:
+        actions: Action字符串列表（按LLM输出顺序）
+        max_workers: 最大并发数；<=1或只有一个Action时在调用线程中顺序执行
+        last_df_id: 本轮之前最近的dataframe_id，用于解析<last_df_id>
+
+    Returns:
+        与actions顺序一致的结果列表：
+        [{"index", "action", "deps", "result", "tool_result", "error", "invalid"}, ...]
+        invalid为True表示Action无法解析或与工具签名不符（ActionSyntaxError），工具未执行
+    """
+    nodes = build_action_graph(actions)
+    records = {
+        n["index"]: {**n, "result": None, "tool_result": None, "error": None, "invalid": False}
+        for n in nodes
+    }
+    results: Dict[int, Any] = {}
+    pending = {n["index"] for n in nodes}
+    running = {}
 
+    inline = max_workers <= 1 or len(nodes) == 1
+    with nullcontext(_InlineExecutor()) if inline else ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for idx in sorted(pending):
+                rec = records[idx]
+                failed = [d for d in rec["deps"] if records[d]["error"]]
+                if failed:
+                    rec["error"] = f"依赖的Action {failed[0]} 执行失败"
+                    pending.discard(idx)
+                    continue
+                if all(d in results for d in rec["deps"]):
+                    rec["action"] = _resolve_refs(rec["action"], rec["deps"], results, last_df_id)
+                    # 复制上下文，使工具线程中的span记录到当前回合的Tracer
+                    ctx = contextvars.copy_context()
+                    running[pool.submit(ctx.run, execute_action, rec["action"])] = idx
+                    pending.discard(idx)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                idx = running.pop(fut)
+                try:
+                    results[idx] = fut.result()
+                    records[idx]["result"] = results[idx]
+                    records[idx]["tool_result"] = str(results[idx])
+                except ActionSyntaxError as e:
+                    records[idx]["error"] = f"Action无效: {e}"
+                    records[idx]["invalid"] = True
+                except Exception as e:
+                    records[idx]["error"] = f"工具执行失败: {e}"
 
+    return [records[n["index"]] for n in nodes]
@@ -3,11 +3,14 @@ LLM接口抽象层，支持本地推理和API调用两种模式。
 """
 import json
 import os
+import time
 from abc import ABC, abstractmethod
 from typing import List, Dict, Optional
 
 from pydantic import BaseModel
 
+from .tracing import span
+
 
 class LLMResponse(BaseModel):
     """LLM响应封装"""
@@ -16,6 +19,12 @@ class LLMResponse(BaseModel):
     metadata: Dict = {}
 
 
+def estimate_tokens(text: str) -> int:
+    """粗略估计token数（无tokenizer时使用）：CJK字符按1个token，其余按4个字符1个token"""
+    cjk = sum(1 for ch in text if "\u4e00" <= ch <= "\u9fff")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
 class LLMInterface(ABC):
     """LLM抽象接口"""
     
@@ -33,16 +42,20 @@ class LLMInterface(ABC):
 class TransformersLLM(LLMInterface):
     """基于transformers库的本地推理"""
     
-    def __init__(self, model_path: str = "microsoft/Phi-3-mini-4k-instruct", device: str = "auto"):
+    def __init__(self, model_path: str = "microsoft/Phi-3-mini-4k-instruct", device: str = "auto",
+                 constrained: bool = True):
         """
         Args:
             model_path: HuggingFace模型名或本地路径
             device: 'cpu', 'cuda', 'auto'
+            constrained: "Action:"之后按工具签名做语法约束解码（见agentkit.constrained）
         """
         self.model_path = model_path
         self.device = device
+        self.constrained = constrained
         self._model = None
         self._tokenizer = None
+        self._constraint = None
     
     def _lazy_load(self):
         """延迟加载模型"""
@@ -75,22 +88,39 @@ class TransformersLLM(LLMInterface):
     def generate(self, prompt: str, max_tokens: int = 1024, temperature: float = 0.7) -> LLMResponse:
         self._lazy_load()
         
-        import torch
-        inputs = self._tokenizer(prompt, return_tensors="pt").to(self._model.device)
-        with torch.no_grad():
-            outputs = self._model.generate(
-                **inputs,
-                max_new_tokens=max_tokens,
-                temperature=temperature,
-                do_sample=temperature > 0,
-                pad_token_id=self._tokenizer.eos_token_id
-            )
+        with span("llm", backend="local", model=self.model_path, constrained=self.constrained) as record:
+            import torch
+            from transformers import LogitsProcessorList
+            inputs = self._tokenizer(prompt, return_tensors="pt").to(self._model.device)
+            processors = LogitsProcessorList()
+            if self.constrained:
+                if self._constraint is None:
+                    from .constrained import ActionConstraint
+                    self._constraint = ActionConstraint(self._tokenizer)
+                processors.append(self._constraint.processor(int(inputs["input_ids"].shape[1])))
+            with torch.no_grad():
+                outputs = self._model.generate(
+                    **inputs,
+                    max_new_tokens=max_tokens,
+                    temperature=temperature,
+                    do_sample=temperature > 0,
+                    pad_token_id=self._tokenizer.eos_token_id,
+                    logits_processor=processors
+                )
         
-        text = self._tokenizer.decode(outputs[0], skip_special_tokens=True)
-        # 移除原始prompt部分
-        text = text[len(prompt):].strip()
+            text = self._tokenizer.decode(outputs[0], skip_special_tokens=True)
+            # 移除原始prompt部分
+            text = text[len(prompt):].strip()
         
-        return LLMResponse(text=text, finish_reason="stop")
+            prompt_tokens = int(inputs["input_ids"].shape[1])
+            completion_tokens = int(outputs.shape[1]) - prompt_tokens
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+            record.update(usage)
+            return LLMResponse(text=text, finish_reason="stop", metadata={"usage": usage})
     
     def chat(self, messages: List[Dict], max_tokens: int = 1024, temperature: float = 0.7) -> LLMResponse:
         """将messages格式化为单一prompt后调用generate"""
@@ -112,26 +142,49 @@ class TransformersLLM(LLMInterface):
         return "\n\n".join(parts)
 
 
+def _tool_call_action(call: Dict) -> str:
+    """把OpenAI格式的tool_call转换为 tool(arg=value, ...) 文本；参数不是JSON对象时原样保留（由解析器报错）"""
+    function = call.get("function") or {}
+    arguments = function.get("arguments") or "{}"
+    try:
+        kwargs = json.loads(arguments) if isinstance(arguments, str) else arguments
+    except ValueError:
+        kwargs = None
+    if not isinstance(kwargs, dict):
+        return f"{function.get('name')}({arguments})"
+    return f"{function.get('name')}({', '.join(f'{k}={v!r}' for k, v in kwargs.items())})"
+
+
 class APILLM(LLMInterface):
     """通用API调用接口（兼容OpenAI格式）"""
     
-    def __init__(self, base_url: str, api_key: str = "", model_name: str = "gpt-3.5-turbo"):
+    def __init__(self, base_url: str, api_key: str = "", model_name: str = "gpt-3.5-turbo",
+                 tool_calling: bool = True, stream: bool = False):
         """
         Args:
             base_url: API基础URL（如 https://api.openai.com/v1）
             api_key: API密钥
             model_name: 模型名称
+            tool_calling: 随请求发送由工具签名生成的tools定义，使用原生function calling；
+                服务端不支持（返回400/422）时自动退回到从文本中解析Action
+            stream: 以SSE流式接收回复，llm span中记录首个token的延迟（first_token_s）
         """
         self.base_url = base_url
         self.api_key = api_key or os.getenv("OPENAI_API_KEY", "")
         self.model_name = model_name
+        self.tool_calling = tool_calling
+        self.stream = stream
+        self._tools = None
+        self._session = None
     
-    def _make_request(self, endpoint: str, payload: Dict) -> Dict:
-        """发起HTTP请求"""
-        try:
-            import requests
-        except ImportError:
-            raise ImportError("请安装requests: pip install requests")
+    def _post(self, endpoint: str, payload: Dict, stream: bool = False):
+        """发起HTTP请求；同一实例复用连接（keep-alive）"""
+        if self._session is None:
+            try:
+                import requests
+            except ImportError:
+                raise ImportError("请安装requests: pip install requests")
+            self._session = requests.Session()
         
         headers = {
             "Content-Type": "application/json",
@@ -139,26 +192,91 @@ class APILLM(LLMInterface):
         }
         
         url = f"{self.base_url}/{endpoint}"
-        resp = requests.post(url, json=payload, headers=headers, timeout=60)
+        resp = self._session.post(url, json=payload, headers=headers, timeout=60, stream=stream)
         resp.raise_for_status()
-        return resp.json()
+        return resp
+    
+    def _make_request(self, endpoint: str, payload: Dict) -> Dict:
+        """发起HTTP请求"""
+        return self._post(endpoint, payload).json()
+    
+    def _stream_request(self, endpoint: str, payload: Dict, record: Dict) -> Dict:
+        """
+        SSE流式请求：累积content与tool_calls的增量，返回与非流式相同结构的响应
+
+        首个内容增量到达的时间记入record["first_token_s"]。
+        """
+        start = time.perf_counter()
+        payload = dict(payload, stream=True, stream_options={"include_usage": True})
+        content, calls, finish_reason, usage = [], {}, "stop", {}
+        with self._post(endpoint, payload, stream=True) as resp:
+            # SSE按UTF-8编码，不使用响应头推断的编码
+            for line in resp.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].decode("utf-8").strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get("usage") or usage
+                for choice in chunk.get("choices") or []:
+                    delta = choice.get("delta") or {}
+                    if "first_token_s" not in record and (delta.get("content") or delta.get("tool_calls")):
+                        record["first_token_s"] = time.perf_counter() - start
+                    content.append(delta.get("content") or "")
+                    for call in delta.get("tool_calls") or []:
+                        slot = calls.setdefault(call.get("index", 0), {"function": {"name": "", "arguments": ""}})
+                        function = call.get("function") or {}
+                        slot["function"]["name"] += function.get("name") or ""
+                        slot["function"]["arguments"] += function.get("arguments") or ""
+                    finish_reason = choice.get("finish_reason") or finish_reason
+        message = {"content": "".join(content), "tool_calls": [calls[i] for i in sorted(calls)]}
+        return {"choices": [{"message": message, "finish_reason": finish_reason}], "usage": usage}
     
     def chat(self, messages: List[Dict], max_tokens: int = 1024, temperature: float = 0.7) -> LLMResponse:
-        payload = {
-            "model": self.model_name,
-            "messages": messages,
-            "max_tokens": max_tokens,
-            "temperature": temperature
-        }
+        with span("llm", backend="api", model=self.model_name) as record:
+            payload = {
+                "model": self.model_name,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature
+            }
+            if self.tool_calling:
+                if self._tools is None:
+                    from .executor import tool_schemas
+                    self._tools = tool_schemas()
+                payload["tools"] = self._tools
         
-        data = self._make_request("chat/completions", payload)
-        choice = data["choices"][0]
+            def request():
+                if self.stream:
+                    return self._stream_request("chat/completions", payload, record)
+                return self._make_request("chat/completions", payload)
+            
+            try:
+                data = request()
+            except Exception as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if "tools" not in payload or status not in (400, 422):
+                    raise
+                self.tool_calling = False
+                payload.pop("tools")
+                data = request()
+            choice = data["choices"][0]
+            record.update(data.get("usage", {}))
+            
+            # 原生tool_calls转换为"Action:"行，与文本协议走同一条解析/执行路径
+            message = choice["message"]
+            text = message.get("content") or ""
+            calls = [f"Action: {_tool_call_action(c)}" for c in message.get("tool_calls") or []]
+            if calls:
+                record["tool_calls"] = len(calls)
+                text = "\n".join([text.rstrip()] + calls).strip()
         
-        return LLMResponse(
-            text=choice["message"]["content"],
-            finish_reason=choice.get("finish_reason", "stop"),
-            metadata={"usage": data.get("usage", {})}
-        )
+            return LLMResponse(
+                text=text,
+                finish_reason=choice.get("finish_reason", "stop"),
+                metadata={"usage": data.get("usage", {})}
+            )
     
     def generate(self, prompt: str, max_tokens: int = 1024, temperature: float = 0.7) -> LLMResponse:
         """将单一prompt包装为messages格式调用chat"""
@@ -183,8 +301,12 @@ class SimulatedLLM(LLMInterface):
             return LLMResponse(text="Thought: 我理解了你的需求，让我开始处理\nAction: load_dataframe(file_path='data/CWRU/Normal Baseline/normal_0.mat', file_type='mat')")
 
     def chat(self, messages: List[Dict], max_tokens: int = 1024, temperature: float = 0.7) -> LLMResponse:
-        last_msg = messages[-1].get("content", "") if messages else ""
-        return self.generate(last_msg, max_tokens, temperature)
+        with span("llm", backend="simulated"):
+            last_msg = messages[-1].get("content", "") if messages else ""
+            if last_msg.startswith("Observation:"):
+                # 自主模式下收到工具结果反馈，直接给出最终回答
+                return LLMResponse(text="Thought: 工具已执行完毕\nFinal Answer: 任务已完成，请查看上述工具结果。")
+            return self.generate(last_msg, max_tokens, temperature)
 
 
 def create_llm(llm_type: str = "simulated", **kwargs) -> LLMInterface:
@@ -3,7 +3,6 @@ import json
 from typing import List, Tuple
 
 import numpy as np
-import pandas as pd
 from scipy.io import loadmat
 
 from .config import AgentConfig
@@ -1,14 +1,36 @@
+import re
+from functools import lru_cache
 from typing import Dict
 
 
 TOOLS_DESCRIPTION = """
 Tool: load_dataframe
-Description: 加载CSV/Parquet/HDF5/MAT文件到内存并返回DataFrame ID。
+Description: 加载CSV/Parquet/HDF5/MAT文件或分区数据集（cli.py convert生成的目录）到内存并返回DataFrame ID。
 Parameters:
   file_path (str)
-  file_type (str, one of: csv, parquet, hdf5, mat)
+  file_type (str, one of: csv, parquet, hdf5, mat, dataset)
+  sampling_rate (float, optional, 缺省时从路径推断，如"12k"目录为12000Hz)
+  columns (list, optional, 只读取这些列，如['index', 'value'])
+  filters (dict, optional, 仅dataset：按分区筛选，如{'fault': 'IR', 'load': 0, 'sensor': 'DE'}，值可为列表)
 Returns: dataframe_id (str)
 
+Tool: search_data_files
+Description: 在数据文件索引中检索（BM25），返回最相关文件的路径、变量名/列名与形状；指令附带的文件摘要中没有所需文件时使用。
+Parameters:
+  query (str, 检索词，如"内圈 007 负载1 驱动端")
+  top_k (int, optional, 默认5)
+Returns: matched_files (str)
+
+Tool: compare_files
+Description: 批量比较多个文件（并行、逐文件只读一个通道）：每个文件的统计量（rms、峭度、峰值因子等）及相对基线组的分布距离（KS、Wasserstein），结果为一个每文件一行的DataFrame；比较几十上百个文件时用它代替逐个load_dataframe。
+Parameters:
+  files (list, optional, 文件路径或glob模式，如['data/CWRU/**/IR*.mat']；缺省为数据目录下全部文件)
+  filters (dict, optional, 按路径推断的属性筛选，如{'fault': ['IR', 'OR'], 'load': 1}，键为fault/load/fault_size)
+  baseline (dict, optional, 基线组，属性筛选或路径/glob列表，默认{'fault': 'Normal'})
+  channel (str, optional, DE/FE/BA或列名，默认DE)
+  workers (int, optional, 并行进程数，默认CPU核数)
+Returns: comparison_dataframe_id (str), summary_text (str)
+
 Tool: describe_dataframe
 Description: 输出DataFrame的维度、dtypes、head与统计摘要。
 Parameters:
@@ -30,20 +52,154 @@ Tool: detect_anomalies_iqr
 Description: 使用IQR法检测异常，返回新DataFrame ID与异常数。
 Parameters:
   dataframe_id (str)
-  value_column (str)
+  value_column (str, 或多个通道的list)
   iqr_multiplier (float, optional)
 Returns: modified_dataframe_id (str), anomaly_count (int)
 
+Tool: detect_anomalies_zscore
+Description: 滚动z-score异常检测（以前window个样本的均值/标准差标准化），适合检测突发尖峰。
+Parameters:
+  dataframe_id (str)
+  value_column (str, 或多个通道的list)
+  window (int, optional, 默认1024)
+  threshold (float, optional, 默认3.0)
+Returns: modified_dataframe_id (str), anomaly_count (int)
+
+Tool: detect_anomalies_mad
+Description: 中位数/MAD（修正z-score）异常检测，对离群值稳健；window缺省时用全局统计，否则按窗口计算。
+Parameters:
+  dataframe_id (str)
+  value_column (str, 或多个通道的list)
+  window (int, optional)
+  threshold (float, optional, 默认3.5)
+Returns: modified_dataframe_id (str), anomaly_count (int)
+
+Tool: detect_anomalies_spectral_kurtosis
+Description: 按窗口计算谱峭度，检测轴承故障等周期性冲击，异常窗口内的样本均被标记。
+Parameters:
+  dataframe_id (str)
+  value_column (str, 或多个通道的list)
+  window (int, optional, 默认4096)
+  nperseg (int, optional, 默认32)
+  threshold (float, optional, 默认0.5)
+Returns: modified_dataframe_id (str), anomaly_count (int)
+
+Tool: detect_anomalies_isolation_forest
+Description: 孤立森林异常检测：按窗口提取均值/RMS/峰峰值/峭度/峰值因子特征，孤立得分高的窗口为异常。
+Parameters:
+  dataframe_id (str)
+  value_column (str, 或多个通道的list)
+  window (int, optional, 默认1024)
+  threshold (float, optional, 默认0.6)
+Returns: modified_dataframe_id (str), anomaly_count (int)
+
+Tool: resample_dataframe
+Description: 抗混叠重采样/降采样（先低通滤波再变换采样率），返回新DataFrame ID与新采样率。
+Parameters:
+  dataframe_id (str)
+  target_rate (float, 目标采样率Hz)
+  source_rate (float, optional, 缺省时使用DataFrame记录的采样率)
+  columns (list, optional)
+  method (str, optional, one of: polyphase, decimate)
+Returns: resampled_dataframe_id (str), sampling_rate (float), sample_count (int)
+
+Tool: start_stream
+Description: 开始接入实时数据流（持续读取增长中的CSV/二进制文件或tcp://、unix://本地socket），最近window_seconds的数据保存在固定容量的环形缓冲区中，返回实时DataFrame ID（可交给其他工具查询，含增量阈值判定的is_anomaly列）。
+Parameters:
+  source (str)
+  file_type (str, optional, one of: csv, binary)
+  sampling_rate (float, optional)
+  window_seconds (float, optional, 默认10)
+  capacity (int, optional, 缓冲样本数)
+  columns (list, optional)
+  channels (int, optional, binary格式的通道数)
+  dtype (str, optional, binary格式的样本类型)
+  threshold (float, optional, 默认4.0)
+  from_start (bool, optional)
+Returns: stream_dataframe_id (str)
+
+Tool: stream_status
+Description: 查看数据流状态：接收/缓冲样本数、异常数、增量统计的均值与标准差。
+Parameters:
+  stream_id (str)
+Returns: status_text (str)
+
+Tool: stop_stream
+Description: 停止接入数据流，缓冲区保留可继续查询。
+Parameters:
+  stream_id (str)
+Returns: success_message (str)
+
 Tool: save_dataframe
-Description: 保存DataFrame到指定路径。
+Description: 保存DataFrame到指定路径，返回行数、写入字节数与吞吐；大数据可background=True在后台写入并立即返回job_id。
 Parameters:
   dataframe_id (str)
   file_path (str)
-  file_type (str, optional)
-Returns: success_message (str)
+  file_type (str, optional, one of: csv, parquet, hdf5)
+  compression (str, optional, csv: gzip/zstd; parquet: snappy/zstd/gzip; hdf5: zlib/blosc:zstd)
+  compression_level (int, optional)
+  append (bool, optional, 追加到已有的csv/hdf5文件)
+  chunk_rows (int, optional, 分块写入的行数)
+  background (bool, optional)
+Returns: success_message (str) 或 job_id (str)
+
+Tool: save_status
+Description: 查询后台保存任务的状态（进行中/完成/失败）与写入吞吐；job_id缺省时列出全部任务。
+Parameters:
+  job_id (str, optional)
+  wait (bool, optional, 等待任务完成)
+Returns: status_text (str)
+
+Tool: memory_usage
+Description: 查看DataFrame的内存占用；dataframe_id缺省时列出每个DataFrame与总计，指定时列出各列的dtype、占用以及压缩后的大小。
+Parameters:
+  dataframe_id (str, optional)
+Returns: memory_report (str)
+
+Tool: release_dataframe
+Description: 释放不再需要的DataFrame以回收内存；仍被派生结果（如异常检测结果）引用时需cascade=True一并释放。
+Parameters:
+  dataframe_id (str)
+  cascade (bool, optional)
+Returns: released_ids (str)
 """.strip()
 
 
+_TOOL_PARAMETER = re.compile(r"^\s+(\w+) \((.*)\)$")
+_ONE_OF = re.compile(r"one of: ([\w, ]+)$")
+# 参数说明开头的类型与optional标记（已由工具签名表达）
+_TYPE_PREFIX = re.compile(r"^\w+(, optional)?(, |$)")
+
+
+@lru_cache(maxsize=None)
+def tool_descriptions() -> Dict[str, Dict]:
+    """
+    解析TOOLS_DESCRIPTION
+
+    Returns:
+        {工具名: {"description": str, "parameters": {参数名: {"description": str, "enum": list或None}}}}
+    """
+    docs = {}
+    for block in TOOLS_DESCRIPTION.split("\n\n"):
+        lines = block.splitlines()
+        if not lines or not lines[0].startswith("Tool: "):
+            continue
+        doc = {"description": "", "parameters": {}}
+        for line in lines[1:]:
+            if line.startswith("Description: "):
+                doc["description"] = line[len("Description: "):]
+                continue
+            m = _TOOL_PARAMETER.match(line)
+            if m:
+                one_of = _ONE_OF.search(m.group(2))
+                doc["parameters"][m.group(1)] = {
+                    "description": _TYPE_PREFIX.sub("", m.group(2)),
+                    "enum": one_of.group(1).split(", ") if one_of else None,
+                }
+        docs[lines[0][len("Tool: "):].strip()] = doc
+    return docs
+
+
 def build_full_prompt(user_instruction: str, data_summary: str) -> str:
     system = (
         "你是一个基于AI-Agent的工程时序数据分析专家。你的任务是根据用户提供的自然语言指令和时序数据，通过调用合适的工具来执行数据分析、可视化、异常检测、预测等任务。\n\n"
@@ -58,6 +214,7 @@ def build_full_prompt(user_instruction: str, data_summary: str) -> str:
         "- 每次行动前，请先进行\"Thought\"（思考），说明你的决策逻辑。\n"
         "- 优先使用提供的工具，而不是直接生成代码或数据。\n"
         "- 如果工具调用失败，请分析原因并尝试修正。\n"
+        "- 一次回复可以给出多个Action（每行一个\"Action: tool(...)\"），用'<result_N>'引用本轮第N个Action的结果；互不依赖的Action会并行执行。\n"
         "- 任务完成后，总结并提供最终答案或建议。\n"
     )
     template = (
@@ -0,0 +1,196 @@
+"""
+数据文件的本地检索索引
+
+summarize_directory的全部输出拼在系统消息中，数据目录较大时每次LLM调用都要预填充数千token。
+DataIndex为每个数据文件建立一条紧凑摘要（路径、变量名/列名与形状；只读文件头，不加载数据），
+用BM25按指令检索：系统消息只放目录概览，每条指令只注入最相关的top-k条摘要，
+模型还可以通过search_data_files工具按需检索。
+"""
+import contextvars
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+_DATA_EXTENSIONS = (".mat", ".csv", ".parquet")
+
+# 指令中的中文术语 -> 路径与变量名中的写法（CWRU数据目录）
+_SYNONYMS = {
+    "正常": ["normal", "baseline"],
+    "基线": ["baseline"],
+    "内圈": ["ir", "inner"],
+    "外圈": ["or", "outer"],
+    "滚动体": ["b", "ball"],
+    "滚珠": ["b", "ball"],
+    "驱动端": ["de", "drive"],
+    "风扇端": ["fe", "fan"],
+    "基座": ["ba", "base"],
+    "转速": ["rpm"],
+    "负载": ["load"],
+    "故障": ["fault"],
+    "采样": ["k"],
+}
+_ASCII_TOKEN = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff]+")
+
+# BM25参数
+_K1 = 1.5
+_B = 0.75
+# 目录概览中最多列出的目录数
+_MAX_OVERVIEW_DIRS = 40
+
+# 当前会话的索引（AgentSession在每轮设置，search_data_files工具读取）；
+# 工具线程通过contextvars.copy_context继承，批处理中各会话互不干扰
+_ACTIVE_INDEX: contextvars.ContextVar = contextvars.ContextVar("agentkit_data_index", default=None)
+
+# 数据根目录 -> (文件签名, DataIndex)
+_INDEXES: Dict[str, Tuple[Tuple, "DataIndex"]] = {}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    检索用分词：英文按字母/数字切分（IR007_1 -> ir, 007, 1），0.007这类小数另加小数部分（007）；
+    中文取字符二元组，并展开_SYNONYMS中的术语
+    """
+    text = text.lower()
+    tokens = []
+    for tok in _ASCII_TOKEN.findall(text):
+        tokens.append(tok)
+        if tok.startswith("0."):
+            tokens.append(tok[2:])
+    for run in _CJK_RUN.findall(text):
+        tokens.extend(run[i:i + 2] for i in range(max(len(run) - 1, 1)))
+        for term, expansions in _SYNONYMS.items():
+            if term in run:
+                tokens.extend(expansions)
+    return tokens
+
+
+def _summarize_file(path: str) -> Dict:
+    """单个文件的紧凑摘要：只读取文件头中的变量名/列名与形状"""
+    ext = os.path.splitext(path)[1].lower()
+    entry = {"file": path, "type": ext[1:]}
+    try:
+        if ext == ".mat":
+            from scipy.io import whosmat
+            entry["keys"] = {name: list(shape) for name, shape, _cls in whosmat(path)}
+        elif ext == ".csv":
+            with open(path, encoding="utf-8", errors="replace") as f:
+                entry["columns"] = f.readline().strip().split(",")
+        else:
+            import pyarrow.parquet as pq
+            meta = pq.read_metadata(path)
+            entry["columns"] = meta.schema.names
+            entry["rows"] = meta.num_rows
+    except Exception as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+    return entry
+
+
+def _scan(data_root: str) -> List[str]:
+    paths = []
+    for root, _dirs, files in os.walk(data_root):
+        paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(_DATA_EXTENSIONS))
+    return sorted(paths)
+
+
+class DataIndex:
+    """数据文件摘要的BM25索引"""
+
+    def __init__(self, data_root: str, entries: List[Dict]):
+        self.data_root = data_root
+        self.entries = entries
+        self._docs: List[Counter] = []
+        df: Counter = Counter()
+        for entry in entries:
+            rel = os.path.relpath(entry["file"], data_root)
+            names = list(entry.get("keys") or entry.get("columns") or [])
+            terms = Counter(tokenize(" ".join([rel, entry["type"]] + names)))
+            self._docs.append(terms)
+            df.update(terms.keys())
+        n = len(entries)
+        self._idf = {t: math.log(1 + (n - c + 0.5) / (c + 0.5)) for t, c in df.items()}
+        self._lengths = [sum(d.values()) for d in self._docs]
+        self._avg_length = sum(self._lengths) / n if n else 0.0
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[float, Dict]]:
+        """按BM25得分返回最相关的k条 [(得分, 摘要)]，没有任何词命中时返回空列表"""
+        terms = [t for t in set(tokenize(query)) if t in self._idf]
+        if not terms:
+            return []
+        scores = []
+        for i, doc in enumerate(self._docs):
+            norm = _K1 * (1 - _B + _B * self._lengths[i] / self._avg_length)
+            score = sum(self._idf[t] * doc[t] * (_K1 + 1) / (doc[t] + norm) for t in terms if t in doc)
+            if score > 0:
+                scores.append((score, i))
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return [(score, self.entries[i]) for score, i in scores[:k]]
+
+    def representatives(self, k: int) -> List[Dict]:
+        """每个目录的第一个文件（最多k个），指令未命中任何文件时作为示例"""
+        seen: Set[str] = set()
+        picked = []
+        for entry in self.entries:
+            folder = os.path.dirname(entry["file"])
+            if folder not in seen:
+                seen.add(folder)
+                picked.append(entry)
+                if len(picked) >= k:
+                    break
+        return picked
+
+    def overview(self) -> str:
+        """目录概览：文件总数、各类型数量与各目录的文件数（放在系统消息中）"""
+        types = Counter(e["type"] for e in self.entries)
+        folders = Counter(os.path.relpath(os.path.dirname(e["file"]), self.data_root) for e in self.entries)
+        listed = [f"{folder} ({count})" for folder, count in sorted(folders.items())[:_MAX_OVERVIEW_DIRS]]
+        if len(folders) > _MAX_OVERVIEW_DIRS:
+            listed.append(f"...等共{len(folders)}个目录")
+        type_counts = ", ".join(f"{t} {c}" for t, c in sorted(types.items()))
+        return (
+            f"数据根目录: {self.data_root}（共{len(self.entries)}个文件: {type_counts}）\n"
+            f"目录（文件数）: {'; '.join(listed)}\n"
+            "每条指令会附上检索到的相关文件摘要；需要其他文件时调用search_data_files检索。"
+        )
+
+
+def format_entries(entries: List[Dict]) -> str:
+    """每个文件一行JSON摘要"""
+    return "\n".join(json.dumps(e, ensure_ascii=False) for e in entries)
+
+
+def _signature(paths: List[str]) -> Tuple:
+    stats = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            stats.append((p, st.st_mtime_ns, st.st_size))
+        except OSError:
+            pass
+    return tuple(stats)
+
+
+def get_index(data_root: str) -> DataIndex:
+    """数据根目录的索引；文件增删或修改后重建，否则复用进程内缓存"""
+    signature = _signature(_scan(data_root))
+    cached = _INDEXES.get(data_root)
+    if cached and cached[0] == signature:
+        return cached[1]
+    index = DataIndex(data_root, [_summarize_file(p) for p, _mtime, _size in signature])
+    _INDEXES[data_root] = (signature, index)
+    return index
+
+
+def set_active_index(index: Optional[DataIndex]) -> contextvars.Token:
+    return _ACTIVE_INDEX.set(index)
+
+
+def reset_active_index(token: contextvars.Token):
+    _ACTIVE_INDEX.reset(token)
+
+
+def active_index() -> Optional[DataIndex]:
+    return _ACTIVE_INDEX.get()
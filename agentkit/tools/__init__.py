@@ -1,14 +1,43 @@
-from .io_tools import load_dataframe, save_dataframe
-from .stats_tools import describe_dataframe
-from .viz_tools import plot_time_series
-from .anomaly_tools import detect_anomalies_iqr
+"""
+工具库：按需加载
 
-__all__ = [
-    "load_dataframe",
-    "save_dataframe",
-    "describe_dataframe",
-    "plot_time_series",
-    "detect_anomalies_iqr",
-]
+各工具模块依赖pandas/matplotlib等重量级库，因此在首次访问工具时才导入对应模块
+（PEP 562 模块级 __getattr__），`import agentkit.tools` 本身不产生这些开销。
+"""
+import importlib
 
+_TOOL_MODULES = {
+    "load_dataframe": ".io_tools",
+    "save_dataframe": ".io_tools",
+    "release_dataframe": ".io_tools",
+    "save_status": ".io_tools",
+    "memory_usage": ".io_tools",
+    "describe_dataframe": ".stats_tools",
+    "plot_time_series": ".viz_tools",
+    "detect_anomalies_iqr": ".anomaly_tools",
+    "detect_anomalies_zscore": ".anomaly_tools",
+    "detect_anomalies_mad": ".anomaly_tools",
+    "detect_anomalies_spectral_kurtosis": ".anomaly_tools",
+    "detect_anomalies_isolation_forest": ".anomaly_tools",
+    "resample_dataframe": ".signal_tools",
+    "start_stream": ".stream_tools",
+    "stream_status": ".stream_tools",
+    "stop_stream": ".stream_tools",
+    "search_data_files": ".search_tools",
+    "compare_files": ".compare_tools",
+}
 
+__all__ = list(_TOOL_MODULES)
+
+
+def __getattr__(name):
+    if name in _TOOL_MODULES:
+        module = importlib.import_module(_TOOL_MODULES[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
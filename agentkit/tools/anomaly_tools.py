@@ -1,17 +1,286 @@
-import pandas as pd
+from typing import Callable, List, Optional, Tuple, Union
 
-from .io_tools import get_dataframe, _register_df
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
+from .io_tools import get_dataframe, _register_overlay
 
-def detect_anomalies_iqr(dataframe_id: str, value_column: str, iqr_multiplier: float = 1.5):
-    df = get_dataframe(dataframe_id).copy()
-    q1 = df[value_column].quantile(0.25)
-    q3 = df[value_column].quantile(0.75)
-    iqr = q3 - q1
-    lower = q1 - iqr_multiplier * iqr
-    upper = q3 + iqr_multiplier * iqr
-    df["is_anomaly"] = (df[value_column] < lower) | (df[value_column] > upper)
-    new_id = _register_df(df)
-    return new_id, int(df["is_anomaly"].sum())
 
+# 检测器统一接口：输入(样本, 通道)二维数组，输出同形状的布尔掩码；各通道向量化一次处理
+Detector = Callable[[np.ndarray], np.ndarray]
 
+# 窗口检测器每批处理的窗口数，限制中间数组（如频谱）的内存
+_WINDOW_BATCH = 256
+
+# 逐样本统计量分块计算时每块的行数
+_ROW_BLOCK = 1 << 20
+
+
+def _run_detector(dataframe_id: str, value_column: Union[str, List[str]], detector: Detector):
+    """
+    对一个或多个通道运行检测器并以覆盖层登记掩码
+
+    单通道时新增is_anomaly列；多通道时另有各通道的is_anomaly_<列名>，is_anomaly为任一通道异常。
+    """
+    df = get_dataframe(dataframe_id)
+    columns = [value_column] if isinstance(value_column, str) else list(value_column)
+    values = df[columns].to_numpy()
+    if values.dtype.kind not in "fc":
+        values = values.astype(np.float64)
+    masks = detector(values)
+    is_anomaly = masks.any(axis=1)
+    overlay = {"is_anomaly": is_anomaly}
+    if len(columns) > 1:
+        for i, name in enumerate(columns):
+            overlay[f"is_anomaly_{name}"] = masks[:, i]
+    # 只保存掩码，其余列引用原dataframe
+    new_id = _register_overlay(dataframe_id, overlay)
+    return new_id, int(is_anomaly.sum())
+
+
+def _window_starts(n: int, window: int) -> np.ndarray:
+    """不重叠窗口的起点；末尾不足一个窗口的样本由最后一个（与前一窗口重叠的）窗口覆盖"""
+    starts = np.arange(0, n - window + 1, window)
+    if n % window:
+        starts = np.append(starts, n - window)
+    return starts
+
+
+def _expand_windows(flags: np.ndarray, starts: np.ndarray, window: int, n: int) -> np.ndarray:
+    """把窗口级标记(窗口, 通道)展开为样本级掩码(样本, 通道)"""
+    owner = np.minimum(np.arange(n) // window, len(starts) - 1)
+    return flags[owner]
+
+
+def detect_anomalies_iqr(dataframe_id: str, value_column: Union[str, List[str]], iqr_multiplier: float = 1.5):
+    def detector(values: np.ndarray) -> np.ndarray:
+        q1, q3 = np.nanquantile(values, [0.25, 0.75], axis=0)
+        iqr = q3 - q1
+        lower = q1 - iqr_multiplier * iqr
+        upper = q3 + iqr_multiplier * iqr
+        mask = values < lower
+        mask |= values > upper
+        return mask
+
+    return _run_detector(dataframe_id, value_column, detector)
+
+
+def detect_anomalies_zscore(dataframe_id: str, value_column: Union[str, List[str]],
+                            window: int = 1024, threshold: float = 3.0):
+    """
+    滚动z-score：以每个样本之前window个样本的均值/标准差标准化，|z|超过threshold为异常
+
+    滚动统计量由累积和一次求出，复杂度O(n)，与窗口长度无关。
+    NaN/inf样本不计入窗口统计量，本身不判为异常。
+    """
+    def detector(values: np.ndarray) -> np.ndarray:
+        n = len(values)
+        finite = np.isfinite(values)
+        # 减去全局均值以减小累积平方和的舍入误差；float32通道也以float64累积；
+        # 非有限样本置0，避免污染其后所有窗口的累积和
+        centered = np.where(finite, values - np.nanmean(np.where(finite, values, np.nan), axis=0), 0)
+        zeros = np.zeros((1, values.shape[1]))
+        c0 = np.concatenate([zeros, np.cumsum(finite, axis=0, dtype=np.float64)])
+        c1 = np.concatenate([zeros, np.cumsum(centered, axis=0, dtype=np.float64)])
+        c2 = np.concatenate([zeros, np.cumsum(np.square(centered), axis=0, dtype=np.float64)])
+        mask = np.empty(values.shape, dtype=bool)
+        # 分块求z值，中间数组的内存与信号长度无关
+        for start in range(0, n, _ROW_BLOCK):
+            hi = np.arange(start, min(start + _ROW_BLOCK, n))
+            lo = np.maximum(hi - window, 0)
+            count = c0[hi] - c0[lo]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = (c1[hi] - c1[lo]) / count
+                var = (c2[hi] - c2[lo]) / count - mean * mean
+                z = np.abs(centered[hi] - mean) / np.sqrt(np.maximum(var, 0))
+            # 窗口内少于两个有限样本时没有可用的方差估计
+            mask[hi] = (count >= 2) & (z > threshold) & finite[hi]
+        return mask
+
+    return _run_detector(dataframe_id, value_column, detector)
+
+
+def detect_anomalies_mad(dataframe_id: str, value_column: Union[str, List[str]],
+                         window: Optional[int] = None, threshold: float = 3.5):
+    """
+    中位数/MAD（修正z-score）：|0.6745 * (x - median) / MAD| 超过threshold为异常
+
+    window为None时使用全局中位数；否则在不重叠的窗口内分别计算。
+    NaN/inf样本不参与中位数与MAD，本身不判为异常。
+    """
+    def detector(values: np.ndarray) -> np.ndarray:
+        n = len(values)
+        finite = np.isfinite(values)
+        median_fn = np.median
+        if not finite.all():
+            # nanmedian远慢于median，只在存在非有限样本时使用
+            values = np.where(finite, values, np.nan)
+            median_fn = np.nanmedian
+        if window is None or window >= n:
+            median = median_fn(values, axis=0)
+            mad = median_fn(np.abs(values - median), axis=0)
+        else:
+            starts = _window_starts(n, window)
+            frames = sliding_window_view(values, window, axis=0)[starts]  # (窗口, 通道, window)
+            median_w = median_fn(frames, axis=2)
+            mad_w = median_fn(np.abs(frames - median_w[:, :, None]), axis=2)
+            median = _expand_windows(median_w, starts, window, n)
+            mad = _expand_windows(mad_w, starts, window, n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            score = 0.6745 * np.abs(values - median) / mad
+        return score > threshold
+
+    return _run_detector(dataframe_id, value_column, detector)
+
+
+def detect_anomalies_spectral_kurtosis(dataframe_id: str, value_column: Union[str, List[str]],
+                                       window: int = 4096, nperseg: int = 32, threshold: float = 0.5):
+    """
+    谱峭度：窗口内做短时傅里叶变换，SK(f) = E|X|^4 / (E|X|^2)^2 - 2，各频率（不含直流）的均值为窗口得分；
+    高斯噪声与平稳谐波的SK约为0，冲击型故障使SK升高，得分超过threshold的窗口内样本为异常。
+    nperseg应短于冲击间隔（CWRU 12kHz数据约70~110个样本）。
+    含NaN/inf的段不计入窗口的谱矩，非有限样本本身不判为异常。
+    """
+    def detector(values: np.ndarray) -> np.ndarray:
+        n, channels = values.shape
+        finite = np.isfinite(values)
+        clean = finite.all()
+        win = min(window, n)
+        seg = min(nperseg, win)
+        starts = _window_starts(n, win)
+        taper = np.hanning(seg)
+        scores = np.empty((len(starts), channels))
+        view = sliding_window_view(values, win, axis=0)
+        for b in range(0, len(starts), _WINDOW_BATCH):
+            frames = view[starts[b:b + _WINDOW_BATCH], :, : win // seg * seg]
+            frames = frames.reshape(frames.shape[0], channels, -1, seg)
+            if clean:
+                power = np.abs(np.fft.rfft(frames * taper, axis=-1)) ** 2  # (窗口, 通道, 段, 频率)
+                m2 = power.mean(axis=2)
+                m4 = (power * power).mean(axis=2)
+            else:
+                # 非有限样本置0后做FFT，再把含非有限样本的段排除在均值之外
+                ok = np.isfinite(frames)
+                power = np.abs(np.fft.rfft(np.where(ok, frames, 0) * taper, axis=-1)) ** 2
+                whole = ok.all(axis=-1)[..., None]
+                count = whole.sum(axis=2)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    m2 = (power * whole).sum(axis=2) / count
+                    m4 = (power * power * whole).sum(axis=2) / count
+            with np.errstate(invalid="ignore", divide="ignore"):
+                sk = m4 / (m2 * m2) - 2
+            # 没有可用段的窗口与功率为0的频率得分为0
+            scores[b:b + _WINDOW_BATCH] = np.where(np.isfinite(sk[:, :, 1:]), sk[:, :, 1:], 0).mean(axis=2)
+        return _expand_windows(scores > threshold, starts, win, n) & finite
+
+    return _run_detector(dataframe_id, value_column, detector)
+
+
+def _window_features(frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    窗口特征：均值、RMS、峰峰值、峭度、峰值因子；frames形状(窗口, window)
+
+    NaN/inf样本不参与统计。Returns: (特征, 有效窗口掩码)，没有有限样本的窗口无效
+    """
+    finite = np.isfinite(frames)
+    if finite.all():
+        count = np.full(len(frames), frames.shape[1])
+        lo, hi = frames.min(axis=1), frames.max(axis=1)
+    else:
+        count = finite.sum(axis=1)
+        lo = np.where(finite, frames, np.inf).min(axis=1)
+        hi = np.where(finite, frames, -np.inf).max(axis=1)
+        frames = np.where(finite, frames, 0)
+    valid = count > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = frames.sum(axis=1) / count
+        centered = frames - mean[:, None]
+        centered[~finite] = 0
+        var = (centered ** 2).sum(axis=1) / count
+        rms = np.sqrt((frames ** 2).sum(axis=1) / count)
+        peak = np.abs(frames).max(axis=1)
+        kurtosis = (centered ** 4).sum(axis=1) / count / (var * var)
+        crest = peak / rms
+        features = np.stack([mean, rms, hi - lo, kurtosis, crest], axis=1)
+    return np.nan_to_num(features), valid
+
+
+def _average_path_length(n: np.ndarray) -> np.ndarray:
+    """n个样本的二叉搜索树不成功查找的平均路径长度c(n)"""
+    n = np.asarray(n, dtype=np.float64)
+    c = 2.0 * (np.log(np.maximum(n - 1, 1)) + np.euler_gamma) - 2.0 * (n - 1) / np.maximum(n, 1)
+    return np.where(n > 2, c, np.where(n == 2, 1.0, 0.0))
+
+
+def _build_tree(x: np.ndarray, max_depth: int, rng: np.random.Generator):
+    """构建一棵孤立树，以数组表示：(feature, threshold, left, right, size, depth)"""
+    feature, threshold, left, right, size, depth = [], [], [], [], [], []
+    stack = [(np.arange(len(x)), 0, -1, False)]
+    while stack:
+        rows, level, parent, is_right = stack.pop()
+        node = len(feature)
+        if parent >= 0:
+            (right if is_right else left)[parent] = node
+        feature.append(-1)
+        threshold.append(0.0)
+        left.append(-1)
+        right.append(-1)
+        size.append(len(rows))
+        depth.append(level)
+        if level >= max_depth or len(rows) <= 1:
+            continue
+        sub = x[rows]
+        lo, hi = sub.min(axis=0), sub.max(axis=0)
+        candidates = np.flatnonzero(hi > lo)
+        if not len(candidates):
+            continue
+        f = rng.choice(candidates)
+        t = rng.uniform(lo[f], hi[f])
+        feature[node], threshold[node] = f, t
+        goes_left = sub[:, f] < t
+        stack.append((rows[~goes_left], level + 1, node, True))
+        stack.append((rows[goes_left], level + 1, node, False))
+    return tuple(np.asarray(a) for a in (feature, threshold, left, right, size, depth))
+
+
+def _isolation_scores(x: np.ndarray, n_trees: int, sample_size: int, seed: int) -> np.ndarray:
+    """孤立森林异常得分 2^(-E[h(x)]/c(ψ))，逐树逐层对全部样本向量化遍历"""
+    rng = np.random.default_rng(seed)
+    psi = min(sample_size, len(x))
+    max_depth = int(np.ceil(np.log2(max(psi, 2))))
+    path = np.zeros(len(x))
+    for _ in range(n_trees):
+        feature, threshold, left, right, size, depth = _build_tree(
+            x[rng.choice(len(x), psi, replace=False)], max_depth, rng)
+        node = np.zeros(len(x), dtype=np.int64)
+        for _ in range(max_depth):
+            internal = feature[node] >= 0
+            if not internal.any():
+                break
+            idx = np.flatnonzero(internal)
+            current = node[idx]
+            goes_left = x[idx, feature[current]] < threshold[current]
+            node[idx] = np.where(goes_left, left[current], right[current])
+        path += depth[node] + _average_path_length(size[node])
+    return 2.0 ** (-(path / n_trees) / _average_path_length(psi))
+
+
+def detect_anomalies_isolation_forest(dataframe_id: str, value_column: Union[str, List[str]],
+                                      window: int = 1024, n_trees: int = 100, sample_size: int = 256,
+                                      threshold: float = 0.6, seed: int = 0):
+    """
+    孤立森林：对每个通道按不重叠窗口提取统计特征，窗口得分超过threshold（0.5附近为正常）时窗口内样本为异常
+    """
+    def detector(values: np.ndarray) -> np.ndarray:
+        n, channels = values.shape
+        win = min(window, n)
+        starts = _window_starts(n, win)
+        view = sliding_window_view(values, win, axis=0)
+        flags = np.zeros((len(starts), channels), dtype=bool)
+        for c in range(channels):
+            features, valid = _window_features(view[starts, c])
+            if valid.any():
+                flags[valid, c] = _isolation_scores(features[valid], n_trees, sample_size, seed + c) > threshold
+        return _expand_windows(flags, starts, win, n) & np.isfinite(values)
+
+    return _run_detector(dataframe_id, value_column, detector)
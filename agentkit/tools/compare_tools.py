@@ -0,0 +1,254 @@
+import glob
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from ..convert import _SENSOR_KEY, parse_cwru_path
+from ..retrieval import active_index
+from .io_tools import _register_df
+
+
+# 统计量分块计算时每块的样本数，限制中间数组的内存
+_CHUNK_SIZE = 1 << 18
+
+# 每个文件的分布摘要：均匀概率水平上的分位数（分位函数的离散近似）
+_LEVELS = np.linspace(0.0, 1.0, 257)
+
+_STAT_COLUMNS = ["n", "mean", "std", "rms", "skewness", "kurtosis", "peak", "crest_factor"]
+
+# 结果摘要中按KS距离列出的文件数
+_TOP_FILES = 5
+
+
+def _pick_column(names: List[str], channel: str) -> str:
+    """
+    按通道名选列：完全匹配，其次CWRU传感器变量（X097_DE_time中的DE）或无记录号前缀的
+    <channel>_time（CSV/Parquet中的DE_time），其次以channel结尾的列
+    """
+    if channel in names:
+        return channel
+    wanted = channel.upper()
+    for name in names:
+        m = _SENSOR_KEY.match(name)
+        if (m and m.group(2) == wanted) or name.upper() == f"{wanted}_TIME":
+            return name
+    for name in names:
+        if name.lower().endswith(channel.lower()):
+            return name
+    raise KeyError(f"channel '{channel}' not found in {names}")
+
+
+def _read_channel(path: str, channel: str, chunk_size: int) -> Tuple[str, np.ndarray]:
+    """只读取一个通道：.mat只解析该变量，csv/parquet按块读取该列"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".mat":
+        from scipy.io import loadmat, whosmat
+
+        column = _pick_column([name for name, _shape, _cls in whosmat(path)], channel)
+        return column, np.ravel(loadmat(path, variable_names=[column])[column]).astype(np.float64, copy=False)
+    if ext == ".csv":
+        with open(path, encoding="utf-8", errors="replace") as f:
+            column = _pick_column(f.readline().strip().split(","), channel)
+        chunks = [c[column].to_numpy(np.float64)
+                  for c in pd.read_csv(path, usecols=[column], chunksize=chunk_size)]
+    elif ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        column = _pick_column(parquet.schema_arrow.names, channel)
+        chunks = [b.column(0).to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+                  for b in parquet.iter_batches(batch_size=chunk_size, columns=[column])]
+    else:
+        raise ValueError(f"Unsupported file type: {ext}")
+    return column, np.concatenate(chunks) if chunks else np.empty(0)
+
+
+def _file_stats(path: str, channel: str, chunk_size: int = _CHUNK_SIZE) -> Dict:
+    """单个文件的统计量与分位数摘要；在工作进程中执行，出错时记录在error中"""
+    record = {"file": path, "column": None, "error": None, "quantiles": None}
+    try:
+        column, x = _read_channel(path, channel, chunk_size)
+        x = x[np.isfinite(x)]
+        n = len(x)
+        if not n:
+            raise ValueError("no finite samples")
+        mean = sum(float(x[i:i + chunk_size].sum()) for i in range(0, n, chunk_size)) / n
+        m2 = m3 = m4 = 0.0
+        peak = 0.0
+        for i in range(0, n, chunk_size):
+            d = x[i:i + chunk_size] - mean
+            d2 = d * d
+            m2 += float(d2.sum())
+            m3 += float((d2 * d).sum())
+            m4 += float((d2 * d2).sum())
+            peak = max(peak, float(np.abs(x[i:i + chunk_size]).max()))
+        var = m2 / n
+        rms = float(np.sqrt(var + mean * mean))
+        record.update({
+            "column": column,
+            "n": n,
+            "mean": mean,
+            "std": float(np.sqrt(var)),
+            "rms": rms,
+            "skewness": (m3 / n) / var ** 1.5 if var > 0 else np.nan,
+            "kurtosis": (m4 / n) / (var * var) if var > 0 else np.nan,
+            "peak": peak,
+            "crest_factor": peak / rms if rms > 0 else np.nan,
+            "quantiles": np.quantile(x, _LEVELS),
+        })
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def _file_stats_job(args) -> Dict:
+    return _file_stats(*args)
+
+
+def _mixture_quantiles(quantiles: List[np.ndarray], weights: List[float]) -> np.ndarray:
+    """多个文件合并后的分位函数：按样本数加权混合各文件的CDF，再取反函数"""
+    grid = np.unique(np.concatenate(quantiles))
+    cdf = sum(w * np.interp(grid, q, _LEVELS) for q, w in zip(quantiles, weights)) / sum(weights)
+    return np.interp(_LEVELS, cdf, grid)
+
+
+def _distances(q: np.ndarray, baseline: np.ndarray) -> Dict[str, float]:
+    """由分位函数计算分布距离：Wasserstein-1（分位函数差的积分）与KS统计量（CDF差的最大值）"""
+    diff = np.abs(q - baseline)
+    wasserstein = float(((diff[1:] + diff[:-1]) / 2).sum() / (len(_LEVELS) - 1))
+    grid = np.unique(np.concatenate([q, baseline]))
+    ks = float(np.max(np.abs(np.interp(grid, q, _LEVELS) - np.interp(grid, baseline, _LEVELS))))
+    return {"wasserstein": wasserstein, "ks": ks}
+
+
+def _expand(patterns: List[str]) -> List[str]:
+    """文件路径或glob模式（支持**）-> 文件列表；不存在的路径保留，在结果的error列中报告"""
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            paths.extend(p for p in sorted(glob.glob(pattern, recursive=True)) if os.path.isfile(p))
+        else:
+            paths.append(pattern)
+    return list(dict.fromkeys(paths))
+
+
+def _catalog(path: str, data_root: Optional[str]) -> Dict[str, str]:
+    """按目录结构推断fault/load/fault_size；只看数据根目录以下（无根目录时只看最后四级）的路径"""
+    if data_root and not os.path.relpath(path, data_root).startswith(".."):
+        rel = os.path.relpath(path, data_root)
+    else:
+        rel = "/".join(path.replace("\\", "/").split("/")[-4:])
+    return parse_cwru_path(rel)
+
+
+def _matches(attributes: Dict[str, str], filters: Dict[str, Any]) -> bool:
+    for key, wanted in filters.items():
+        values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+        if attributes.get(key) not in {str(v) for v in values}:
+            return False
+    return True
+
+
+def _select(selection: Union[str, List[str], Dict[str, Any]], pool: List[str],
+            catalog: Dict[str, Dict[str, str]]) -> List[str]:
+    """文件选择：路径/glob列表，或对pool按目录推断的属性（fault/load/fault_size）筛选"""
+    if isinstance(selection, dict):
+        return [p for p in pool if _matches(catalog[p], selection)]
+    return _expand([selection] if isinstance(selection, str) else list(selection))
+
+
+def compare_files(
+    files: Union[str, List[str], None] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    baseline: Union[str, List[str], Dict[str, Any], None] = None,
+    channel: str = "DE",
+    workers: Optional[int] = None,
+):
+    """
+    批量比较多个文件：逐文件统计量与相对基线组的分布距离，结果为一个dataframe（每个文件一行）
+
+    每个文件只读取一个通道（.mat只解析该变量，csv/parquet按块读取该列），统计量分块累加，
+    分布以257个分位数概括；各文件在进程池中并行处理，内存占用为 进程数 × 单个通道。
+
+    Args:
+        files: 文件路径或glob模式（如'data/CWRU/**/IR*.mat'）；缺省为会话数据索引中的全部文件
+        filters: 按路径推断的属性筛选files，如{'fault': ['IR', 'OR'], 'load': 1}（fault/load/fault_size）
+        baseline: 基线组，属性筛选dict或路径/glob列表；缺省为{'fault': 'Normal'}，
+            属性筛选在会话数据索引（无索引时在filters筛选前的files）中进行
+        channel: 通道，如DE/FE/BA（匹配X097_DE_time等变量）或列名
+        workers: 并行进程数，默认CPU核数；在守护进程中调用时为线程数
+
+    Returns:
+        (比较结果dataframe_id, 文本摘要)
+        结果列: file, is_baseline, fault, load, fault_size, column, n, mean, std, rms, skewness,
+               kurtosis, peak, crest_factor, wasserstein, ks, rms_ratio, error
+    """
+    index = active_index()
+    data_root = index.data_root if index is not None else None
+    indexed = [e["file"] for e in index.entries] if index is not None else []
+    if files is None and not indexed:
+        raise ValueError("files is required when the session has no data index")
+    expanded = list(indexed) if files is None else _expand([files] if isinstance(files, str) else list(files))
+    catalog = {p: _catalog(p, data_root) for p in dict.fromkeys(expanded + indexed)}
+    targets = [p for p in expanded if _matches(catalog[p], filters)] if filters else expanded
+    # 基线在filters筛选之前的文件中选择，否则filters={'fault': 'IR'}会把Normal文件排除在基线之外
+    baseline_files = _select({"fault": "Normal"} if baseline is None else baseline, indexed or expanded, catalog)
+    paths = list(dict.fromkeys(targets + baseline_files))
+    if not paths:
+        raise ValueError("no files matched")
+    for p in paths:
+        catalog.setdefault(p, _catalog(p, data_root))
+
+    jobs = [(p, channel) for p in paths]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        results = [_file_stats_job(job) for job in jobs]
+    elif multiprocessing.current_process().daemon:
+        # batch进程模式与工具工作进程都是守护进程，不能再创建子进程，改用线程池
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_file_stats_job, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_file_stats_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+    in_baseline = set(baseline_files)
+    ok_baseline = [r for r in results if r["file"] in in_baseline and not r["error"]]
+    reference = None
+    if ok_baseline:
+        reference = _mixture_quantiles([r["quantiles"] for r in ok_baseline], [r["n"] for r in ok_baseline])
+        baseline_rms = np.average([r["rms"] for r in ok_baseline], weights=[r["n"] for r in ok_baseline])
+
+    rows = []
+    for r in results:
+        row = {"file": r["file"], "is_baseline": r["file"] in in_baseline, **catalog[r["file"]],
+               "column": r["column"]}
+        row.update({k: r.get(k, np.nan) for k in _STAT_COLUMNS})
+        if reference is not None and not r["error"]:
+            row.update(_distances(r["quantiles"], reference))
+            row["rms_ratio"] = r["rms"] / baseline_rms if baseline_rms else np.nan
+        else:
+            row.update({"wasserstein": np.nan, "ks": np.nan, "rms_ratio": np.nan})
+        row["error"] = r["error"]
+        rows.append(row)
+    df = pd.DataFrame(rows)
+    df["n"] = df["n"].astype("Int64")
+    new_id = _register_df(df, metadata={"source": "compare_files", "channel": channel})
+
+    failed = int(df["error"].notna().sum())
+    lines = [f"比较了{len(df)}个文件（基线{len(ok_baseline)}个，失败{failed}个）"]
+    if reference is None:
+        lines.append("没有可用的基线文件，未计算分布距离")
+    else:
+        tested = df[~df["is_baseline"] & df["error"].isna()]
+        if len(tested):
+            grouped = tested.groupby("fault")[["rms_ratio", "kurtosis", "ks"]].mean()
+            lines.append("按故障类型的均值:\n" + grouped.to_string(float_format=lambda v: f"{v:.3f}"))
+            top = tested.nlargest(_TOP_FILES, "ks")
+            lines.append("KS距离最大的文件:\n" + "\n".join(
+                f"  {os.path.basename(f)}  ks={ks:.3f}  wasserstein={w:.4g}"
+                for f, ks, w in zip(top["file"], top["ks"], top["wasserstein"])))
+    return new_id, "\n".join(lines)
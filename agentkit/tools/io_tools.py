@@ -1,6 +1,11 @@
+import contextvars
 import os
+import re
+import threading
+import time
 import uuid
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 import pandas as pd
 import numpy as np
@@ -9,23 +14,328 @@ from scipy.io import loadmat
 
 _DATAFRAMES: Dict[str, pd.DataFrame] = {}
 
+# 派生结果以覆盖层存储：只保存新增列（如布尔掩码），其余列引用父dataframe，
+# get_dataframe时零拷贝拼接。child_id -> {"parent": parent_id, "columns": {name: ndarray}}
+_OVERLAYS: Dict[str, Dict] = {}
 
-def _register_df(df: pd.DataFrame) -> str:
-    df_id = str(uuid.uuid4())
-    _DATAFRAMES[df_id] = df
+# 血缘：parent_id -> 引用它的覆盖层id集合（实时dataframe还包括其快照），存在子节点时父节点不可释放
+_CHILDREN: Dict[str, Set[str]] = {}
+
+# 元数据（来源文件、采样率等）：df_id -> dict，覆盖层沿血缘继承父节点的元数据
+_METADATA: Dict[str, Dict] = {}
+
+# 实时dataframe（如流式数据的环形缓冲区）：df_id -> 返回当前快照的函数，每次get_dataframe取一次快照
+_LIVE: Dict[str, Callable[[], pd.DataFrame]] = {}
+
+# 各线程最近一次读取的实时快照，派生结果基于工具实际读到的那份快照
+_SNAPSHOTS = threading.local()
+
+# 为派生结果固定下来的实时快照：snapshot_id -> live_id；最后一个派生结果释放时快照一并释放
+_FROZEN: Dict[str, str] = {}
+
+# 当前上下文登记的id集合（track_registrations）；工具线程通过contextvars.copy_context继承，
+# 批处理thread模式中各作业分别记录，作业结束时释放
+_OWNED: contextvars.ContextVar = contextvars.ContextVar("agentkit_owned_ids", default=None)
+
+# 分区数据集（cli.py convert生成）的hive分区列
+DATASET_PARTITIONS = ("fault", "load", "sensor")
+
+# 后台保存任务：job_id -> 状态（state/rows/bytes/seconds/throughput/error）
+_SAVE_JOBS: Dict[str, Dict] = {}
+_SAVE_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_SAVE_LOCK = threading.Lock()
+
+# csv压缩级别在各压缩方法中的参数名，未列出的（gzip/bz2/zip）为compresslevel
+_CSV_LEVEL_KEYS = {"zstd": "level", "xz": "preset"}
+
+# 释放dataframe时的回调（如工作进程池释放对应的共享内存）
+_RELEASE_HOOKS: List[Callable[[str], None]] = []
+
+# 登记时是否自动压缩dataframe的内存表示（set_compaction）
+_COMPACT = False
+# 当前上下文对_COMPACT的覆盖（override_compaction），批处理各作业按自己的设置压缩而不改动进程级设置
+_COMPACT_OVERRIDE: contextvars.ContextVar = contextvars.ContextVar("agentkit_compaction", default=None)
+# float64列降为float32的条件：舍入误差不超过该列标准差的此比例（约为16位ADC的量化步长）
+_FLOAT32_TOLERANCE = 1e-5
+# 不同取值数不超过行数的此比例的字符串列转为分类
+_CATEGORY_RATIO = 0.5
+# 压缩检查时每块的样本数，限制临时数组的内存
+_CHECK_BLOCK = 1 << 20
+
+
+def set_compaction(enabled: bool):
+    """开启/关闭登记时的自动压缩（float32传感器通道、分类标签、可推导的索引列）"""
+    global _COMPACT
+    _COMPACT = bool(enabled)
+
+
+def override_compaction(enabled: bool) -> contextvars.Token:
+    """只在当前上下文（及由其复制上下文的工具线程）中开启/关闭压缩；用reset_compaction恢复"""
+    return _COMPACT_OVERRIDE.set(bool(enabled))
+
+
+def reset_compaction(token: contextvars.Token):
+    _COMPACT_OVERRIDE.reset(token)
+
+
+def compaction_enabled() -> bool:
+    override = _COMPACT_OVERRIDE.get()
+    return _COMPACT if override is None else override
+
+
+def _float32_safe(values: np.ndarray) -> bool:
+    """float32能否表示该列：分块比较舍入误差与标准差，超出float32范围（变为inf）时不可"""
+    scale = np.nanstd(values) if len(values) else 0.0
+    tolerance = _FLOAT32_TOLERANCE * scale if np.isfinite(scale) else 0.0
+    with np.errstate(over="ignore", invalid="ignore"):
+        for start in range(0, len(values), _CHECK_BLOCK):
+            block = values[start:start + _CHECK_BLOCK]
+            error = np.abs(block.astype(np.float32).astype(np.float64) - block)
+            # nan与inf的舍入结果相同，差值为nan，不计入误差
+            if np.nanmax(error, initial=0.0) > tolerance:
+                return False
+    return True
+
+
+def _derivable_range(values: np.ndarray) -> Optional[pd.RangeIndex]:
+    """整数列为等差序列（如0, 1, 2, ...）时返回等价的RangeIndex，否则返回None"""
+    if len(values) < 2:
+        return None
+    start, step = int(values[0]), int(values[1]) - int(values[0])
+    if step == 0:
+        return None
+    for offset in range(0, len(values), _CHECK_BLOCK):
+        block = values[offset:offset + _CHECK_BLOCK]
+        if not np.array_equal(block, start + step * np.arange(offset, offset + len(block), dtype=np.int64)):
+            return None
+    return pd.RangeIndex(start, start + step * len(values), step)
+
+
+def compact_dataframe(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    压缩dataframe的内存表示，返回(新dataframe, 变更说明)
+
+    - float64列在精度允许时（见_float32_safe）降为float32
+    - 可由行号推导的整数列（如index列）移入RangeIndex，不占内存；保存时还原为普通列
+    - 其余整数列降为能容纳取值范围的最小整数类型
+    - 低基数的字符串/object列转为分类
+    未改变的列不复制。
+    """
+    data: Dict[str, Any] = {}
+    changes: List[str] = []
+    index = df.index
+    default_index = isinstance(index, pd.RangeIndex) and index.name is None and index.start == 0 and index.step == 1
+    for name in df.columns:
+        col = df[name]
+        dtype = col.dtype
+        if isinstance(dtype, np.dtype) and dtype == np.float64:
+            values = col.to_numpy()
+            if _float32_safe(values):
+                col = pd.Series(values.astype(np.float32), index=col.index, name=name, copy=False)
+        elif isinstance(dtype, np.dtype) and dtype.kind in "iu":
+            derived = _derivable_range(col.to_numpy()) if default_index and isinstance(name, str) else None
+            if derived is not None:
+                index = derived.rename(name)
+                default_index = False
+                changes.append(f"{name}: {dtype} -> RangeIndex")
+                continue
+            col = pd.to_numeric(col, downcast="integer" if dtype.kind == "i" else "unsigned")
+        elif (pd.api.types.is_string_dtype(dtype) or dtype == object) and len(col) \
+                and col.nunique(dropna=False) <= len(col) * _CATEGORY_RATIO:
+            col = col.astype("category")
+        if col.dtype != dtype:
+            changes.append(f"{name}: {dtype} -> {col.dtype}")
+        data[name] = col
+    if not changes:
+        return df, changes
+    compacted = pd.DataFrame({name: col.to_numpy() if isinstance(col.dtype, np.dtype) else col.array
+                              for name, col in data.items()}, index=index, copy=False)
+    return compacted, changes
+
+
+def track_registrations() -> Tuple[Set[str], contextvars.Token]:
+    """开始记录当前上下文中登记的dataframe/覆盖层id，返回(id集合, token)；用untrack_registrations结束"""
+    owned: Set[str] = set()
+    return owned, _OWNED.set(owned)
+
+
+def untrack_registrations(token: contextvars.Token):
+    _OWNED.reset(token)
+
+
+def _track(df_id: str) -> str:
+    owned = _OWNED.get()
+    if owned is not None:
+        owned.add(df_id)
     return df_id
 
 
-def load_dataframe(file_path: str, file_type: str = "csv") -> str:
+def _register_df(df: pd.DataFrame, df_id: Optional[str] = None, metadata: Optional[Dict] = None,
+                 compact: Optional[bool] = None) -> str:
+    """登记dataframe；compact缺省时按set_compaction的设置压缩内存表示，压缩前后的大小记入元数据"""
+    df_id = df_id or str(uuid.uuid4())
+    if compaction_enabled() if compact is None else compact:
+        before = int(df.memory_usage(deep=True).sum())
+        df, changes = compact_dataframe(df)
+        if changes:
+            metadata = dict(metadata or {}, compaction={
+                "bytes_before": before, "bytes_after": int(df.memory_usage(deep=True).sum()), "changes": changes})
+    _DATAFRAMES[df_id] = df
+    if metadata:
+        _METADATA[df_id] = dict(metadata)
+    return _track(df_id)
+
+
+def _register_overlay(parent_id: str, columns: Dict[str, np.ndarray], df_id: Optional[str] = None) -> str:
+    """登记派生结果：新增列与父dataframe等长，其余列引用父dataframe"""
+    if parent_id in _LIVE:
+        parent_id = _freeze(parent_id)
+    length = len(get_dataframe(parent_id))
+    for name, values in columns.items():
+        if len(values) != length:
+            raise ValueError(f"overlay column {name!r} has length {len(values)}, expected {length}")
+    df_id = df_id or str(uuid.uuid4())
+    _OVERLAYS[df_id] = {"parent": parent_id, "columns": dict(columns)}
+    _CHILDREN.setdefault(parent_id, set()).add(df_id)
+    return _track(df_id)
+
+
+def _register_live(snapshot: Callable[[], pd.DataFrame], df_id: Optional[str] = None,
+                   metadata: Optional[Dict] = None) -> str:
+    df_id = df_id or str(uuid.uuid4())
+    _LIVE[df_id] = snapshot
+    if metadata:
+        _METADATA[df_id] = dict(metadata)
+    return _track(df_id)
+
+
+def _freeze(live_id: str) -> str:
+    """把实时dataframe当前线程最近读取的快照登记为普通dataframe（实时数据持续变化，派生结果需固定的父节点）"""
+    snapshot = getattr(_SNAPSHOTS, "frames", {}).pop(live_id, None)
+    if snapshot is None:
+        snapshot = _LIVE[live_id]()
+    snapshot_id = _register_df(snapshot, metadata=dict(get_metadata(live_id), snapshot_of=live_id))
+    # 挂在实时dataframe之下，cascade释放实时dataframe时一并释放
+    _FROZEN[snapshot_id] = live_id
+    _CHILDREN.setdefault(live_id, set()).add(snapshot_id)
+    return snapshot_id
+
+
+def _all_ids() -> Set[str]:
+    return set(_DATAFRAMES) | set(_OVERLAYS) | set(_LIVE)
+
+
+def _clear():
+    """清空全部dataframe与覆盖层（批处理作业之间、基准测试用例之间使用）"""
+    for df_id in list(_all_ids()):
+        for hook in _RELEASE_HOOKS:
+            hook(df_id)
+    _DATAFRAMES.clear()
+    _OVERLAYS.clear()
+    _CHILDREN.clear()
+    _METADATA.clear()
+    _LIVE.clear()
+    _FROZEN.clear()
+
+
+def get_lineage(df_id: str) -> List[str]:
+    """返回从df_id到根dataframe的id链"""
+    chain = [df_id]
+    while chain[-1] in _OVERLAYS:
+        chain.append(_OVERLAYS[chain[-1]]["parent"])
+    return chain
+
+
+def get_metadata(df_id: str) -> Dict:
+    """返回dataframe的元数据，覆盖层继承其祖先的元数据"""
+    metadata = {}
+    for item_id in reversed(get_lineage(df_id)):
+        metadata.update(_METADATA.get(item_id, {}))
+    return metadata
+
+
+def _infer_sampling_rate(file_path: str) -> Optional[float]:
+    """从路径推断采样率，如CWRU目录名"12k Drive End Bearing Fault Data" -> 12000"""
+    match = re.search(r"(?<![\w.])(\d+(?:\.\d+)?)\s*k(?:hz)?(?![a-z])", file_path, re.IGNORECASE)
+    return float(match.group(1)) * 1000 if match else None
+
+
+def _dataset_filter(filters: Dict[str, Any]):
+    """{"fault": "IR", "load": [0, 1]} -> pyarrow表达式；分区列的值按字符串比较"""
+    import pyarrow.dataset as ds
+
+    expr = None
+    for name, value in filters.items():
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        if name in DATASET_PARTITIONS:
+            values = [str(v) for v in values]
+        term = ds.field(name) == values[0] if len(values) == 1 else ds.field(name).isin(values)
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def _read_dataset(path: str, columns: Optional[List[str]] = None,
+                  filters: Optional[Dict[str, Any]] = None) -> Tuple[pd.DataFrame, Optional[float]]:
+    """
+    读取分区数据集：按filters裁剪分区、只读columns列，本地文件以内存映射方式读取
+
+    Returns:
+        (dataframe, 所选记录的采样率（唯一时）)
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+        from pyarrow import fs
+    except ImportError:
+        raise ImportError("请安装pyarrow: pip install agentkit[dataset]")
+
+    file_format = "parquet"
+    for _root, _dirs, files in os.walk(path):
+        names = [f for f in files if f.endswith((".parquet", ".arrow"))]
+        if names:
+            file_format = "ipc" if names[0].endswith(".arrow") else "parquet"
+            break
+    partitioning = ds.partitioning(pa.schema([(name, pa.string()) for name in DATASET_PARTITIONS]),
+                                   flavor="hive")
+    dataset = ds.dataset(path, format=file_format, partitioning=partitioning,
+                         filesystem=fs.LocalFileSystem(use_mmap=True))
+    # 采样率与数据在同一次扫描中读取
+    has_rate = "sampling_rate" in dataset.schema.names
+    scan_columns = columns
+    if columns is not None and has_rate and "sampling_rate" not in columns:
+        scan_columns = list(columns) + ["sampling_rate"]
+    table = dataset.to_table(columns=scan_columns, filter=_dataset_filter(filters) if filters else None)
+    sampling_rate = None
+    if has_rate:
+        rates = pc.unique(table.column("sampling_rate").drop_null()).to_pylist()
+        rates = [r for r in rates if r == r]
+        sampling_rate = float(rates[0]) if len(rates) == 1 else None
+        if scan_columns is not columns:
+            table = table.drop_columns(["sampling_rate"])
+    return table.to_pandas(split_blocks=True, self_destruct=True), sampling_rate
+
+
+def load_dataframe(file_path: str, file_type: str = "csv", sampling_rate: Optional[float] = None,
+                   columns: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> str:
+    if file_type == "dataset":
+        df, dataset_rate = _read_dataset(file_path, columns, filters)
+        sampling_rate = sampling_rate or dataset_rate
+    sampling_rate = sampling_rate or _infer_sampling_rate(file_path)
+    metadata = {"source": file_path}
+    if sampling_rate:
+        metadata["sampling_rate"] = float(sampling_rate)
     if file_type == "csv":
-        df = pd.read_csv(file_path)
-        return _register_df(df)
+        df = pd.read_csv(file_path, usecols=columns)
+        return _register_df(df, metadata=metadata)
     if file_type == "parquet":
-        df = pd.read_parquet(file_path)
-        return _register_df(df)
+        df = pd.read_parquet(file_path, columns=columns)
+        return _register_df(df, metadata=metadata)
+    if file_type == "dataset":
+        return _register_df(df, metadata=dict(metadata, filters=filters))
     if file_type == "hdf5":
         df = pd.read_hdf(file_path)
-        return _register_df(df)
+        return _register_df(df, metadata=metadata)
     if file_type == "mat":
         mat = loadmat(file_path)
         # Heuristic: pick first ndarray as a series
@@ -41,28 +351,273 @@ def load_dataframe(file_path: str, file_type: str = "csv") -> str:
             raise ValueError("No ndarray in .mat file")
         series = pd.Series(arr.flatten(), name=keys[0])
         df = pd.DataFrame({"index": range(len(series)), "value": series.values})
-        return _register_df(df)
+        return _register_df(df, metadata=metadata)
     raise ValueError(f"Unsupported file_type: {file_type}")
 
 
+def has_dataframe(df_id: str) -> bool:
+    return df_id in _DATAFRAMES or df_id in _OVERLAYS or df_id in _LIVE
+
+
 def get_dataframe(df_id: str) -> pd.DataFrame:
+    if df_id in _OVERLAYS:
+        overlay = _OVERLAYS[df_id]
+        parent = get_dataframe(overlay["parent"])
+        # copy=False时各列保持独立block，父dataframe的数据不被复制
+        data = {name: parent[name] for name in parent.columns}
+        for name, values in overlay["columns"].items():
+            data[name] = pd.Series(values, index=parent.index, name=name, copy=False)
+        return pd.DataFrame(data, copy=False)
+    if df_id in _LIVE:
+        snapshot = _LIVE[df_id]()
+        if not hasattr(_SNAPSHOTS, "frames"):
+            _SNAPSHOTS.frames = {}
+        _SNAPSHOTS.frames[df_id] = snapshot
+        return snapshot
     if df_id not in _DATAFRAMES:
         raise KeyError("dataframe_id not found")
     return _DATAFRAMES[df_id]
 
 
-def save_dataframe(dataframe_id: str, file_path: str, file_type: str = "csv") -> str:
-    df = get_dataframe(dataframe_id)
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+def _write_dataframe(df: pd.DataFrame, file_path: str, file_type: str, compression: Optional[str] = None,
+                     compression_level: Optional[int] = None, append: bool = False,
+                     chunk_rows: Optional[int] = None) -> Dict:
+    """写文件并返回统计：{"path", "rows", "bytes", "seconds", "mb_per_s"}，mb_per_s按内存中的数据量计"""
+    if df.index.name is not None and df.index.name not in df.columns:
+        # 压缩时移入RangeIndex的索引列写回为普通列，文件布局与压缩前一致
+        df = df.reset_index()
+    if os.path.dirname(file_path):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    exists = os.path.exists(file_path)
+    size_before = os.path.getsize(file_path) if append and exists else 0
+    start = time.perf_counter()
     if file_type == "csv":
-        df.to_csv(file_path, index=False)
-        return f"saved: {file_path}"
-    if file_type == "parquet":
-        df.to_parquet(file_path, index=False)
-        return f"saved: {file_path}"
-    if file_type == "hdf5":
-        df.to_hdf(file_path, key="data", mode="w")
-        return f"saved: {file_path}"
-    raise ValueError(f"Unsupported file_type: {file_type}")
+        options = None
+        if compression:
+            level_key = _CSV_LEVEL_KEYS.get(compression, "compresslevel")
+            options = {"method": compression, **({level_key: compression_level} if compression_level else {})}
+        df.to_csv(file_path, index=False, mode="a" if append else "w", header=not (append and exists),
+                  compression=options, chunksize=chunk_rows)
+    elif file_type == "parquet":
+        if append:
+            raise ValueError("parquet does not support append, use file_type='hdf5' or 'csv'")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        options = {"compression": compression or "snappy", "compression_level": compression_level}
+        if not chunk_rows:
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), file_path, **options)
+        else:
+            # 每chunk_rows行转换并写出一个row group，Arrow副本只有一块大小；读取时可按row group部分读取。
+            # schema取自第一块（由整个df推断会把object列整列转换一次）
+            writer = None
+            try:
+                for offset in range(0, max(len(df), 1), chunk_rows):
+                    table = pa.Table.from_pandas(df.iloc[offset:offset + chunk_rows], preserve_index=False,
+                                                 schema=writer.schema if writer else None)
+                    if writer is None:
+                        writer = pq.ParquetWriter(file_path, table.schema, **options)
+                    writer.write_table(table)
+            finally:
+                if writer is not None:
+                    writer.close()
+    elif file_type == "hdf5":
+        # mode="a"只替换/追加"data"键，不重写文件中的其他内容
+        complevel = compression_level if compression_level is not None else (5 if compression else 0)
+        with pd.HDFStore(file_path, mode="a", complib=compression, complevel=complevel) as store:
+            if not append and "data" in store:
+                store.remove("data")
+            if append or chunk_rows:
+                # table格式可追加；分块写入限制单次转换的内存
+                step = chunk_rows or max(len(df), 1)
+                for offset in range(0, max(len(df), 1), step):
+                    store.append("data", df.iloc[offset:offset + step], format="table", index=False)
+            else:
+                store.put("data", df, format="fixed")
+    else:
+        raise ValueError(f"Unsupported file_type: {file_type}")
+    seconds = time.perf_counter() - start
+    data_mb = df.memory_usage(index=False).sum() / 1e6
+    return {
+        "path": file_path,
+        "rows": len(df),
+        "bytes": os.path.getsize(file_path) - size_before,
+        "seconds": seconds,
+        "mb_per_s": data_mb / seconds if seconds > 0 else float("inf"),
+    }
+
+
+def _format_save(stats: Dict) -> str:
+    return (f"saved: {stats['path']} ({stats['rows']} rows, {stats['bytes'] / 1e6:.2f} MB written, "
+            f"{stats['seconds']:.3f}s, {stats['mb_per_s']:.1f} MB/s)")
+
+
+def _run_save_job(job: Dict, df: pd.DataFrame, options: Dict):
+    job["state"] = "running"
+    try:
+        job.update(_write_dataframe(df, **options))
+        job["state"] = "done"
+    except Exception as e:
+        job["state"] = "error"
+        job["error"] = f"{type(e).__name__}: {e}"
+
+
+def _save_executor() -> ThreadPoolExecutor:
+    global _SAVE_EXECUTOR
+    with _SAVE_LOCK:
+        if _SAVE_EXECUTOR is None:
+            _SAVE_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="save")
+        return _SAVE_EXECUTOR
+
+
+def save_dataframe(dataframe_id: str, file_path: str, file_type: str = "csv", compression: Optional[str] = None,
+                   compression_level: Optional[int] = None, append: bool = False,
+                   chunk_rows: Optional[int] = None, background: bool = False) -> str:
+    """
+    保存dataframe
+
+    Args:
+        compression: csv: gzip/bz2/xz/zstd/zip；parquet: snappy(默认)/zstd/gzip/brotli/lz4/none；
+            hdf5: zlib/blosc/blosc:lz4/blosc:zstd/bzip2/lzo
+        compression_level: 压缩级别，None为编码默认值
+        append: 追加到已有文件（csv、hdf5）
+        chunk_rows: 分块写入的行数（csv分块、parquet逐row group转换写出、hdf5 table格式分块追加）
+        background: 在后台线程写入，立即返回job_id，用save_status查询进度
+
+    Returns:
+        写入结果（行数、写入字节数、耗时、吞吐），background时为job_id
+    """
+    df = get_dataframe(dataframe_id)
+    options = {"file_path": file_path, "file_type": file_type, "compression": compression,
+               "compression_level": compression_level, "append": append, "chunk_rows": chunk_rows}
+    if not background:
+        return _format_save(_write_dataframe(df, **options))
+    job_id = f"save-{uuid.uuid4().hex[:8]}"
+    job = {"job_id": job_id, "dataframe_id": dataframe_id, "path": file_path, "state": "pending",
+           "submitted": time.time()}
+    _SAVE_JOBS[job_id] = job
+    # 保存提交时的dataframe对象，之后释放dataframe_id不影响写入
+    job["future"] = _save_executor().submit(_run_save_job, job, df, options)
+    return job_id
+
+
+def save_status(job_id: Optional[str] = None, wait: bool = False) -> str:
+    """查询后台保存任务；job_id缺省时列出全部任务，wait=True时等待任务完成"""
+    if job_id is not None and job_id not in _SAVE_JOBS:
+        raise KeyError("job_id not found")
+    jobs = [_SAVE_JOBS[job_id]] if job_id else list(_SAVE_JOBS.values())
+    lines = []
+    for job in jobs:
+        if wait:
+            job["future"].result()
+        if job["state"] == "done":
+            lines.append(f"{job['job_id']}: done, {_format_save(job)}")
+        elif job["state"] == "error":
+            lines.append(f"{job['job_id']}: error, {job['error']}")
+        else:
+            lines.append(f"{job['job_id']}: {job['state']}, {job['path']} "
+                         f"({time.time() - job['submitted']:.1f}s elapsed)")
+    return "\n".join(lines) if lines else "no save jobs"
+
+
+def _release(df_id: str) -> List[str]:
+    """释放df_id及其全部派生结果，返回被释放的id"""
+    released = []
+    for child in sorted(_CHILDREN.pop(df_id, ())):
+        released.extend(_release(child))
+    overlay = _OVERLAYS.pop(df_id, None)
+    parent = overlay["parent"] if overlay else _FROZEN.pop(df_id, None)
+    # 父节点正在释放时其子节点集合已被取出，此处为None
+    siblings = _CHILDREN.get(parent) if parent else None
+    orphaned = False
+    if siblings is not None:
+        siblings.discard(df_id)
+        if not siblings:
+            _CHILDREN.pop(parent, None)
+            orphaned = True
+    _DATAFRAMES.pop(df_id, None)
+    _LIVE.pop(df_id, None)
+    _METADATA.pop(df_id, None)
+    for hook in _RELEASE_HOOKS:
+        hook(df_id)
+    released.append(df_id)
+    if orphaned and parent in _FROZEN:
+        # 快照只为派生结果而存在，最后一个派生结果释放后不再保留
+        released.extend(_release(parent))
+    return released
+
+
+def release_dataframe(dataframe_id: str, cascade: bool = False) -> str:
+    """释放dataframe；仍被派生结果引用时需cascade=True一并释放子节点"""
+    if not has_dataframe(dataframe_id):
+        raise KeyError("dataframe_id not found")
+    children = sorted(_CHILDREN.get(dataframe_id, ()))
+    if children and not cascade:
+        raise ValueError(f"dataframe is referenced by {len(children)} derived result(s): {children}; "
+                         f"release them first or pass cascade=True")
+    return f"released: {', '.join(_release(dataframe_id))}"
+
+
+def _frame_bytes(df_id: str) -> Tuple[str, int, int, int]:
+    """(类型, 行数, 列数, 字节数)；覆盖层只计新增列，实时dataframe按当前快照计"""
+    if df_id in _OVERLAYS:
+        columns = _OVERLAYS[df_id]["columns"]
+        rows = len(next(iter(columns.values()))) if columns else 0
+        return "overlay", rows, len(columns), sum(np.asarray(v).nbytes for v in columns.values())
+    if df_id in _LIVE:
+        df = _LIVE[df_id]()
+        kind = "live"
+    else:
+        df = _DATAFRAMES[df_id]
+        kind = "frame"
+    return kind, len(df), len(df.columns), int(df.memory_usage(deep=True).sum())
+
+
+def memory_usage(dataframe_id: Optional[str] = None) -> str:
+    """
+    dataframe存储的内存占用（deep：字符串与分类按实际大小计）
 
+    不指定dataframe_id时按占用从大到小列出每个dataframe与总计；
+    指定时列出各列的dtype与占用，以及compact_dataframe压缩后的大小。
+    """
+    if dataframe_id is not None:
+        if not has_dataframe(dataframe_id):
+            raise KeyError("dataframe_id not found")
+        kind, rows, n_columns, total = _frame_bytes(dataframe_id)
+        if kind == "overlay":
+            df = pd.DataFrame(_OVERLAYS[dataframe_id]["columns"], copy=False)
+            lines = [f"{dataframe_id} (overlay of {_OVERLAYS[dataframe_id]['parent']}, new columns only)"]
+        else:
+            df = get_dataframe(dataframe_id)
+            lines = [f"{dataframe_id} ({kind})"]
+        usage = df.memory_usage(deep=True)
+        lines.append(f"  {'<index>':<24} {type(df.index).__name__:<16} {usage['Index'] / 1e6:10.3f} MB")
+        for name in df.columns:
+            lines.append(f"  {str(name):<24} {str(df[name].dtype):<16} {usage[name] / 1e6:10.3f} MB")
+        lines.append(f"  total: {rows} rows x {n_columns} columns, {total / 1e6:.3f} MB")
+        compaction = _METADATA.get(dataframe_id, {}).get("compaction")
+        if compaction:
+            lines.append(f"  compacted on load: {compaction['bytes_before'] / 1e6:.3f} MB -> "
+                         f"{compaction['bytes_after'] / 1e6:.3f} MB ({'; '.join(compaction['changes'])})")
+        elif kind != "overlay":
+            compacted, changes = compact_dataframe(df)
+            if changes:
+                after = int(compacted.memory_usage(deep=True).sum())
+                lines.append(f"  compactable: {after / 1e6:.3f} MB ({1 - after / total:.0%} smaller; "
+                             f"{'; '.join(changes)})")
+        return "\n".join(lines)
 
+    rows = []
+    for df_id in _all_ids():
+        kind, n_rows, n_columns, size = _frame_bytes(df_id)
+        rows.append((size, df_id, kind, n_rows, n_columns))
+    rows.sort(key=lambda r: (-r[0], r[1]))
+    lines = [f"{df_id}  {kind:<7} {n_rows:>10} rows x {n_columns:<3} {size / 1e6:10.3f} MB"
+             for size, df_id, kind, n_rows, n_columns in rows]
+    total = sum(r[0] for r in rows)
+    lines.append(f"total: {len(rows)} dataframes, {total / 1e6:.3f} MB "
+                 f"(compaction on register: {'on' if compaction_enabled() else 'off'})")
+    from ..tracing import rss_bytes
+    rss = rss_bytes()
+    if rss:
+        lines.append(f"process RSS: {rss / 1e6:.1f} MB")
+    return "\n".join(lines)
@@ -0,0 +1,20 @@
+import json
+
+from ..retrieval import active_index
+
+
+def search_data_files(query: str, top_k: int = 5) -> str:
+    """
+    在当前会话的数据文件索引中检索（BM25），返回最相关文件的路径、变量名/列名与形状
+
+    Args:
+        query: 检索词，如"内圈 007 负载1 驱动端"
+        top_k: 返回的文件数
+    """
+    index = active_index()
+    if index is None:
+        raise ValueError("no data index in this session")
+    hits = index.search(query, top_k)
+    if not hits:
+        return f"没有与'{query}'匹配的数据文件"
+    return "\n".join(f"[{score:.2f}] {json.dumps(entry, ensure_ascii=False)}" for score, entry in hits)
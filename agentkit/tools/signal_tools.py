@@ -0,0 +1,106 @@
+from fractions import Fraction
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import signal
+
+from .io_tools import get_dataframe, get_metadata, _register_df
+
+
+# 单块处理的样本数上限，超过时分块重采样以限制中间数组的内存
+_CHUNK_SIZE = 1 << 20
+
+
+def _design_filter(up: int, down: int, method: str) -> Optional[np.ndarray]:
+    """设计抗混叠低通FIR滤波器（与scipy.signal.resample_poly/decimate的默认设计一致），倍率为1时返回None"""
+    if method not in ("polyphase", "decimate"):
+        raise ValueError(f"Unsupported method: {method}")
+    if up == down:
+        return None
+    if method == "polyphase":
+        max_rate = max(up, down)
+        return signal.firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+    if up != 1:
+        raise ValueError(f"decimate requires an integer factor, got {down}/{up}; use method='polyphase'")
+    return signal.firwin(20 * down + 1, 1.0 / down, window="hamming")
+
+
+def _resample_array(x: np.ndarray, up: int, down: int, fir: Optional[np.ndarray],
+                    chunk_size: int = _CHUNK_SIZE) -> np.ndarray:
+    """
+    对二维数组(样本, 列)沿axis=0做有理倍率重采样，各列一次性向量化处理
+
+    长信号分块处理：块边界取down的整数倍，使每块输出恰好对齐到全局输出位置；
+    每块两侧各带滤波器半长的重叠样本，输出时裁掉，结果与整段处理一致。
+    """
+    if fir is None:
+        return x.copy()
+    n = len(x)
+    if n <= chunk_size:
+        return signal.resample_poly(x, up, down, axis=0, window=fir)
+    half = (len(fir) - 1) // 2
+    pad = -(-(half // up + 2) // down) * down
+    step = max(down, chunk_size // down * down)
+    parts: List[np.ndarray] = []
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        lo = max(start - pad, 0)
+        hi = min(stop + pad, n)
+        y = signal.resample_poly(x[lo:hi], up, down, axis=0, window=fir)
+        skip = (start - lo) * up // down
+        parts.append(y[skip:skip + -(-(stop - start) * up // down)])
+    return np.concatenate(parts)
+
+
+def resample_dataframe(
+    dataframe_id: str,
+    target_rate: float,
+    source_rate: Optional[float] = None,
+    columns: Optional[List[str]] = None,
+    method: str = "polyphase",
+):
+    """
+    抗混叠重采样/降采样，返回新的dataframe
+
+    Args:
+        dataframe_id: 输入dataframe
+        target_rate: 目标采样率(Hz)
+        source_rate: 原采样率(Hz)，缺省时取dataframe元数据中的sampling_rate
+        columns: 需要重采样的数值列，缺省为除index外的全部数值列
+        method: polyphase（有理倍率多相滤波）或 decimate（整数倍FIR降采样）
+
+    Returns:
+        (新dataframe_id, 新采样率, 样本数)
+    """
+    df = get_dataframe(dataframe_id)
+    metadata = get_metadata(dataframe_id)
+    source_rate = source_rate or metadata.get("sampling_rate")
+    if not source_rate:
+        raise ValueError("sampling rate of the dataframe is unknown, please pass source_rate")
+    if target_rate <= 0:
+        raise ValueError("target_rate must be positive")
+    ratio = Fraction(float(target_rate) / float(source_rate)).limit_denominator(1000)
+    up, down = ratio.numerator, ratio.denominator
+    fir = _design_filter(up, down, method)
+
+    if columns is None:
+        columns = [c for c in df.columns if c != "index" and pd.api.types.is_numeric_dtype(df[c])
+                   and not pd.api.types.is_bool_dtype(df[c])]
+    if not columns:
+        raise ValueError("no numeric columns to resample")
+    values = df[columns].to_numpy()
+    dtype = values.dtype if values.dtype.kind == "f" else np.float64
+    resampled = _resample_array(values.astype(dtype, copy=False), up, down, fir).astype(dtype, copy=False)
+
+    data = {}
+    if "index" in df.columns:
+        data["index"] = np.arange(len(resampled))
+    for i, name in enumerate(columns):
+        data[name] = resampled[:, i]
+    # 压缩时移入RangeIndex的索引列同样按新的样本数重建
+    index = pd.RangeIndex(len(resampled), name=df.index.name) if df.index.name is not None else None
+    new_rate = float(source_rate) * up / down
+    new_metadata = dict(metadata, sampling_rate=new_rate, resampled_from=dataframe_id)
+    new_id = _register_df(pd.DataFrame(data, index=index, copy=False), metadata=new_metadata)
+    return new_id, new_rate, len(resampled)
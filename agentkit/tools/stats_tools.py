@@ -2,13 +2,18 @@ from typing import Tuple
 
 import pandas as pd
 
-from .io_tools import get_dataframe
+from .io_tools import get_dataframe, get_metadata
 
 
 def describe_dataframe(dataframe_id: str) -> str:
     df = get_dataframe(dataframe_id)
     lines = []
     lines.append(f"shape: {df.shape}")
+    if df.index.name is not None:
+        lines.append(f"index: {df.index.name} ({type(df.index).__name__})")
+    sampling_rate = get_metadata(dataframe_id).get("sampling_rate")
+    if sampling_rate:
+        lines.append(f"sampling_rate: {sampling_rate:g} Hz")
     lines.append("dtypes:")
     lines.append(str(df.dtypes))
     lines.append("head:")
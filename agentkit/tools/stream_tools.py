@@ -0,0 +1,380 @@
+"""
+流式数据接入
+
+持续读取增长中的CSV/二进制文件（tail）或本地socket，最近一段数据保存在固定容量的环形缓冲区中，
+以实时dataframe_id暴露给其他工具（每次读取得到当前快照）。统计量与异常阈值按批增量更新
+（Welford/Chan合并），内存占用与运行时长无关。
+"""
+import io
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .io_tools import _RELEASE_HOOKS, _infer_sampling_rate, _register_live, get_metadata
+
+
+# 每次从数据源读取的最大字节数，也限制了未完成行的缓存大小
+_READ_SIZE = 1 << 20
+
+# 样本数达到该值之前不判定异常（统计量尚不稳定）
+_WARMUP = 100
+
+_STREAMS: Dict[str, "_Stream"] = {}
+
+
+class _FileSource:
+    """持续读取文件的新增内容；文件被截断时从头重新读取"""
+
+    def __init__(self, path: str, read_header: bool = False):
+        self.path = path
+        self.file = open(path, "rb")
+        # 只有CSV需要表头；readline限长，二进制文件中很少出现换行符，不限长会读入大半个文件
+        self.header = self.file.readline(_READ_SIZE) if read_header else b""
+
+    def seek_end(self, align: int = 0):
+        """定位到文件末尾：align>0时对齐到整帧，否则对齐到最后一个完整行之后"""
+        size = os.path.getsize(self.path)
+        if align:
+            self.file.seek(size // align * align)
+            return
+        self.file.seek(max(size - _READ_SIZE, 0))
+        tail = self.file.read()
+        self.file.seek(size - len(tail) + tail.rfind(b"\n") + 1)
+
+    def read(self) -> bytes:
+        if os.path.getsize(self.path) < self.file.tell():
+            self.file.seek(0)
+        return self.file.read(_READ_SIZE)
+
+    def close(self):
+        self.file.close()
+
+
+class _SocketSource:
+    """读取本地socket（tcp://host:port 或 unix:///path）"""
+
+    def __init__(self, url: str, poll_interval: float):
+        if url.startswith("unix://"):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(url[len("unix://"):])
+        else:
+            host, port = url[len("tcp://"):].rsplit(":", 1)
+            self.sock = socket.create_connection((host, int(port)))
+        self.sock.settimeout(poll_interval)
+        self.header = b""
+        self.eof = False
+
+    def read(self) -> bytes:
+        try:
+            data = self.sock.recv(_READ_SIZE)
+        except socket.timeout:
+            return b""
+        if not data:
+            self.eof = True
+        return data
+
+    def close(self):
+        self.sock.close()
+
+
+class _CsvParser:
+    """把字节流解析为(行, 通道)数组；未完成的行留到下一批，首行非数值时视为表头"""
+
+    dtype = np.float32
+
+    def __init__(self, header: bytes, columns: Optional[List[str]]):
+        self.wanted = columns
+        self.names: Optional[List[str]] = None
+        self.usecols: Optional[List[int]] = None
+        self.has_header = False
+        self.pending = b""
+        self.bad_lines = 0
+        if header.strip():
+            self.has_header = self._parse_header(header)
+
+    def _parse_header(self, line: bytes) -> bool:
+        fields = [f.strip() for f in line.decode("utf-8", "replace").strip().split(",")]
+        try:
+            [float(f) for f in fields]
+            is_header = False
+        except ValueError:
+            is_header = True
+        names = fields if is_header else [f"ch{i}" for i in range(len(fields))]
+        wanted = self.wanted or [n for n in names if n not in ("index", "time")]
+        missing = [c for c in wanted if c not in names]
+        if missing:
+            raise ValueError(f"columns not found in stream: {missing}")
+        self.usecols = [names.index(c) for c in wanted]
+        self.names = ["value"] if not is_header and len(wanted) == 1 else wanted
+        return is_header
+
+    def feed(self, data: bytes) -> np.ndarray:
+        data = self.pending + data
+        end = data.rfind(b"\n") + 1
+        self.pending = data[end:][-_READ_SIZE:]
+        lines = data[:end]
+        if self.names is None and lines:
+            first, _, lines = lines.partition(b"\n")
+            if not self._parse_header(first):
+                lines = first + b"\n" + lines
+        if not lines.strip():
+            return np.empty((0, len(self.usecols or ())))
+        try:
+            return np.loadtxt(io.BytesIO(lines), delimiter=",", usecols=self.usecols, ndmin=2)
+        except ValueError:
+            # 含格式错误的行（如文件被截断时的半行）：逐行解析并丢弃坏行
+            rows = []
+            for line in lines.splitlines():
+                try:
+                    fields = line.split(b",")
+                    rows.append([float(fields[i]) for i in self.usecols])
+                except (ValueError, IndexError):
+                    self.bad_lines += bool(line.strip())
+            return np.array(rows, dtype=np.float64).reshape(-1, len(self.usecols))
+
+
+class _BinaryParser:
+    """交错存储的定长样本（channels个dtype值为一帧），不完整的帧留到下一批"""
+
+    def __init__(self, dtype: str, channels: int):
+        self.dtype = np.dtype(dtype)
+        self.channels = channels
+        self.frame = self.dtype.itemsize * channels
+        self.names = ["value"] if channels == 1 else [f"ch{i}" for i in range(channels)]
+        self.pending = b""
+
+    def feed(self, data: bytes) -> np.ndarray:
+        data = self.pending + data
+        end = len(data) // self.frame * self.frame
+        self.pending = data[end:]
+        return np.frombuffer(data[:end], dtype=self.dtype).reshape(-1, self.channels)
+
+
+class _Stream:
+    """一个数据流：读取线程 + 环形缓冲区 + 增量统计"""
+
+    def __init__(self, source, parser, capacity: int, threshold: float, poll_interval: float):
+        self.source = source
+        self.parser = parser
+        self.capacity = capacity
+        self.threshold = threshold
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.buffer: Optional[np.ndarray] = None
+        self.flags: Optional[np.ndarray] = None
+        self.total = 0
+        # Welford统计量（全部已接收样本）
+        self.mean: Optional[np.ndarray] = None
+        self.m2: Optional[np.ndarray] = None
+        self.anomalies = 0
+        self.batches = 0
+        self.error: Optional[str] = None
+        self.started = time.time()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while not self.stopping.is_set():
+                data = self.source.read()
+                if data:
+                    batch = self.parser.feed(data)
+                    if len(batch):
+                        self.append(batch)
+                    continue
+                if getattr(self.source, "eof", False):
+                    break
+                self.stopping.wait(self.poll_interval)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.source.close()
+
+    def append(self, batch: np.ndarray):
+        """写入一批样本：先用已有统计量判定异常，再合并本批统计量，最后写入环形缓冲区"""
+        values = batch.astype(np.float64, copy=False)
+        with self.lock:
+            if self.buffer is None:
+                self.buffer = np.zeros((self.capacity, batch.shape[1]), dtype=self.parser.dtype)
+                self.flags = np.zeros((self.capacity, batch.shape[1]), dtype=bool)
+                self.mean = np.zeros(batch.shape[1])
+                self.m2 = np.zeros(batch.shape[1])
+            seen = self.total
+            warm = seen >= _WARMUP
+            if warm:
+                flags = self._flag(values, seen)
+
+            # Chan等的并行合并公式，等价于逐样本Welford更新
+            n = len(values)
+            batch_mean = values.mean(axis=0)
+            batch_m2 = ((values - batch_mean) ** 2).sum(axis=0)
+            delta = batch_mean - self.mean
+            total = seen + n
+            self.mean += delta * n / total
+            self.m2 += batch_m2 + delta ** 2 * seen * n / total
+
+            if not warm:
+                # 预热阶段的批次用包含本批在内的统计量判定
+                flags = self._flag(values, total) if total >= _WARMUP else np.zeros(values.shape, dtype=bool)
+            self.anomalies += int(flags.any(axis=1).sum())
+
+            # 超过容量的批只保留最后capacity个样本
+            keep = min(n, self.capacity)
+            batch, flags = batch[n - keep:], flags[n - keep:]
+            pos = (total - keep) % self.capacity
+            first = min(keep, self.capacity - pos)
+            self.buffer[pos:pos + first] = batch[:first]
+            self.flags[pos:pos + first] = flags[:first]
+            self.buffer[:keep - first] = batch[first:]
+            self.flags[:keep - first] = flags[first:]
+            self.total = total
+            self.batches += 1
+
+    def _flag(self, values: np.ndarray, count: int) -> np.ndarray:
+        std = np.sqrt(self.m2 / (count - 1))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.abs(values - self.mean) > self.threshold * std
+
+    def snapshot(self) -> pd.DataFrame:
+        """按时间顺序复制缓冲区中的有效样本"""
+        with self.lock:
+            names = self.parser.names or []
+            if self.buffer is None:
+                return pd.DataFrame({"index": np.empty(0, dtype=np.int64),
+                                     **{c: np.empty(0, dtype=self.parser.dtype) for c in names},
+                                     "is_anomaly": np.empty(0, dtype=bool)})
+            size = min(self.total, self.capacity)
+            order = np.arange(self.total - size, self.total) % self.capacity
+            values = self.buffer[order]
+            flags = self.flags[order].any(axis=1)
+            start = self.total - size
+        data = {"index": np.arange(start, start + size)}
+        for i, name in enumerate(names):
+            data[name] = values[:, i]
+        data["is_anomaly"] = flags
+        return pd.DataFrame(data, copy=False)
+
+    def status(self) -> Dict:
+        with self.lock:
+            seen = self.total
+            std = np.sqrt(self.m2 / (seen - 1)) if seen > 1 else None
+            return {
+                "running": self.thread.is_alive(),
+                "error": self.error,
+                "samples_received": seen,
+                "samples_buffered": min(seen, self.capacity),
+                "capacity": self.capacity,
+                "batches": self.batches,
+                "anomalies": self.anomalies,
+                "bad_lines": getattr(self.parser, "bad_lines", 0),
+                "mean": None if self.mean is None else self.mean.tolist(),
+                "std": None if std is None else std.tolist(),
+                "threshold": self.threshold,
+                "elapsed_s": time.time() - self.started,
+            }
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join(timeout=5)
+
+
+def _forget(df_id: str):
+    stream = _STREAMS.pop(df_id, None)
+    if stream:
+        stream.stop()
+
+
+_RELEASE_HOOKS.append(_forget)
+
+
+def start_stream(
+    source: str,
+    file_type: str = "csv",
+    sampling_rate: Optional[float] = None,
+    window_seconds: float = 10.0,
+    capacity: Optional[int] = None,
+    columns: Optional[List[str]] = None,
+    channels: int = 1,
+    dtype: str = "float32",
+    threshold: float = 4.0,
+    from_start: bool = False,
+    poll_interval: float = 0.2,
+) -> str:
+    """
+    开始接入数据流，返回实时dataframe_id
+
+    Args:
+        source: 文件路径，或 tcp://host:port、unix:///path 形式的本地socket
+        file_type: csv（逗号分隔，可带表头）或 binary（交错存储的定长样本）
+        sampling_rate: 采样率(Hz)，缺省时从路径推断
+        window_seconds: 缓冲区保留的时长（秒），需已知采样率
+        capacity: 缓冲区样本数，指定时优先于window_seconds
+        columns: CSV中接入的列，缺省为除index/time外的全部列
+        channels: binary格式每帧的通道数
+        dtype: binary格式的样本类型
+        threshold: 异常阈值，|x - 均值| > threshold * 标准差 的样本为异常
+        from_start: 文件从头读取（默认只读取新增内容）
+        poll_interval: 无新数据时的轮询间隔（秒）
+    """
+    is_socket = source.startswith(("tcp://", "unix://"))
+    sampling_rate = sampling_rate or (None if is_socket else _infer_sampling_rate(source))
+    if capacity is None:
+        if not sampling_rate:
+            raise ValueError("sampling rate is unknown, please pass sampling_rate or capacity")
+        capacity = int(window_seconds * sampling_rate)
+    if capacity <= 0:
+        raise ValueError("buffer capacity must be positive")
+
+    src = _SocketSource(source, poll_interval) if is_socket else _FileSource(source, read_header=file_type == "csv")
+    try:
+        if file_type == "csv":
+            parser = _CsvParser(src.header, columns)
+        elif file_type == "binary":
+            parser = _BinaryParser(dtype, channels)
+        else:
+            raise ValueError(f"Unsupported file_type: {file_type}")
+    except Exception:
+        src.close()
+        raise
+    if isinstance(src, _FileSource):
+        if from_start:
+            src.file.seek(len(src.header) if getattr(parser, "has_header", False) else 0)
+        else:
+            src.seek_end(align=getattr(parser, "frame", 0))
+
+    stream = _Stream(src, parser, capacity, threshold, poll_interval)
+    metadata = {"source": source, "stream": True, "capacity": capacity}
+    if sampling_rate:
+        metadata["sampling_rate"] = float(sampling_rate)
+    stream_id = _register_live(stream.snapshot, metadata=metadata)
+    _STREAMS[stream_id] = stream
+    return stream_id
+
+
+def _get_stream(stream_id: str) -> "_Stream":
+    if stream_id not in _STREAMS:
+        raise KeyError("stream_id not found")
+    return _STREAMS[stream_id]
+
+
+def stream_status(stream_id: str) -> str:
+    """数据流状态：接收/缓冲样本数、异常数与增量统计量"""
+    status = _get_stream(stream_id).status()
+    rate = get_metadata(stream_id).get("sampling_rate")
+    lines = [f"{key}: {value}" for key, value in status.items()]
+    if rate:
+        lines.append(f"buffered_seconds: {status['samples_buffered'] / rate:g}")
+    return "\n".join(lines)
+
+
+def stop_stream(stream_id: str) -> str:
+    """停止接入；缓冲区保留，可继续查询，直到release_dataframe释放"""
+    stream = _get_stream(stream_id)
+    stream.stop()
+    return f"stopped: {stream_id}, samples_received: {stream.total}"
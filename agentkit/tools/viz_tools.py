@@ -4,7 +4,8 @@ from typing import Optional
 
 import matplotlib
 matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 
 from .io_tools import get_dataframe
 
@@ -13,20 +14,24 @@ def plot_time_series(dataframe_id: str, time_column: str, value_column: str,
                      title: str = "", xlabel: str = "", ylabel: str = "",
                      output_dir: str = "outputs") -> str:
     df = get_dataframe(dataframe_id)
-    if time_column not in df.columns:
+    if time_column in df.columns:
+        x = df[time_column]
+    elif time_column == df.index.name:
+        # 压缩时移入RangeIndex的索引列
+        x = df.index
+    else:
         # fallback: create pseudo time index
-        df = df.copy()
-        df[time_column] = range(len(df))
+        x = range(len(df))
     os.makedirs(output_dir, exist_ok=True)
     path = os.path.join(output_dir, f"ts_{uuid.uuid4().hex[:8]}.png")
-    plt.figure(figsize=(10, 4))
-    plt.plot(df[time_column], df[value_column])
-    plt.title(title or f"{value_column} over {time_column}")
-    plt.xlabel(xlabel or time_column)
-    plt.ylabel(ylabel or value_column)
-    plt.tight_layout()
-    plt.savefig(path)
-    plt.close()
+    # 使用面向对象的Figure而非pyplot全局状态，允许多个Action并发绘图
+    fig = Figure(figsize=(10, 4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(x, df[value_column])
+    ax.set_title(title or f"{value_column} over {time_column}")
+    ax.set_xlabel(xlabel or time_column)
+    ax.set_ylabel(ylabel or value_column)
+    fig.tight_layout()
+    fig.savefig(path)
     return path
-
-
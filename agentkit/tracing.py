@@ -0,0 +1,101 @@
+"""
+轻量级追踪：为对话回合、LLM调用与工具执行记录计时span
+
+Tracer通过contextvars在当前上下文中激活；未激活时span只计时、不记录，开销可忽略。
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+
+_CURRENT: contextvars.ContextVar = contextvars.ContextVar("agentkit_tracer", default=None)
+
+
+def rss_bytes() -> Optional[int]:
+    """当前进程常驻内存（字节）；优先使用psutil，Linux下退回/proc，否则返回None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Tracer:
+    """收集一个对话回合内的span"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Dict):
+        with self._lock:
+            self.spans.append(span)
+
+    def find(self, name: str) -> List[Dict]:
+        return [s for s in self.spans if s["name"] == name]
+
+    @contextmanager
+    def activate(self) -> Iterator["Tracer"]:
+        token = _CURRENT.set(self)
+        try:
+            yield self
+        finally:
+            _CURRENT.reset(token)
+
+
+def current_tracer() -> Optional[Tracer]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Dict]:
+    """
+    记录一个计时span；调用方可向返回的dict中补充属性（如token数、读取字节数）
+
+    RSS差值是进程级的，并发执行时只作参考。
+    """
+    tracer = _CURRENT.get()
+    record = {"name": name, **attrs}
+    rss_before = rss_bytes() if tracer is not None else None
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        if tracer is not None:
+            record["offset"] = start - tracer.start
+            record["thread"] = threading.current_thread().name
+            rss_after = rss_bytes()
+            if rss_before is not None and rss_after is not None:
+                record["rss_delta_bytes"] = rss_after - rss_before
+            tracer.add(record)
+
+
+class JSONLTraceWriter:
+    """将每个回合的追踪结果以一行JSON追加到文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
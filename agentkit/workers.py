@@ -0,0 +1,369 @@
+"""
+预热的工具工作进程池
+
+重量级工具（IQR检测、绘图等）可派发到常驻工作进程中执行，避免阻塞对话进程并绕开GIL。
+dataframe通过共享内存在进程间传递：数值列首次派发时复制到SharedMemory一次，
+之后父进程与工作进程都直接映射同一块内存，不再经pickle复制。
+每次调用有超时，超时的工作进程会被终止并重启，失控的工具不会卡住会话。
+"""
+import multiprocessing
+import os
+import queue
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .tools import io_tools
+
+DEFAULT_POOL_TOOLS = (
+    "detect_anomalies_iqr", "detect_anomalies_zscore", "detect_anomalies_mad",
+    "detect_anomalies_spectral_kurtosis", "detect_anomalies_isolation_forest",
+    "plot_time_series", "resample_dataframe",
+)
+
+
+def _attach_shm(name: str, track: bool = False) -> shared_memory.SharedMemory:
+    """附加到已有共享内存块；track=False时附加方不向resource_tracker登记（由所有者负责unlink）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=track)
+    except TypeError:  # Python < 3.13 没有track参数，附加时总会登记
+        return shared_memory.SharedMemory(name=name)
+
+
+def _to_shm(arr: np.ndarray) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+    return shm
+
+
+def export_frame(df: pd.DataFrame) -> Tuple[Dict, List[shared_memory.SharedMemory]]:
+    """
+    将dataframe的列复制到共享内存
+
+    数值/布尔列直接放入共享内存；低基数的其他列（如标签）以分类编码放入共享内存，
+    类别本身与原dtype随descriptor传递；其余列与非RangeIndex索引直接放在descriptor中随消息pickle。
+
+    Returns:
+        (descriptor, shms)：descriptor可pickle，交给attach_frame重建
+    """
+    columns, shms = [], []
+    for name in df.columns:
+        col = df[name]
+        if col.dtype.kind in "biuf" and isinstance(col.dtype, np.dtype):
+            arr = col.to_numpy()
+            shm = _to_shm(arr)
+            shms.append(shm)
+            columns.append({"name": name, "shm": shm.name, "dtype": arr.dtype.str, "length": len(arr)})
+            continue
+        cat = col if isinstance(col.dtype, pd.CategoricalDtype) else None
+        restore = None
+        if cat is None and col.nunique(dropna=False) <= max(1, len(col) // 2):
+            cat = col.astype("category")
+            restore = col.dtype
+        if cat is not None:
+            codes = cat.cat.codes.to_numpy()
+            shm = _to_shm(codes)
+            shms.append(shm)
+            columns.append({"name": name, "shm": shm.name, "dtype": codes.dtype.str, "length": len(codes),
+                            "categories": cat.cat.categories, "ordered": cat.cat.ordered, "restore": restore})
+        else:
+            columns.append({"name": name, "shm": None, "data": col.reset_index(drop=True)})
+    index = df.index
+    if isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1 and index.name is None:
+        index = None
+    return {"columns": columns, "index": index, "length": len(df)}, shms
+
+
+def attach_frame(desc: Dict, readonly: bool = False, track: bool = False,
+                 restore_dtypes: bool = False) -> Tuple[pd.DataFrame, List[shared_memory.SharedMemory]]:
+    """
+    由descriptor重建dataframe，数值列直接映射共享内存（零拷贝）
+
+    Args:
+        desc: export_frame返回的descriptor
+        readonly: 是否将映射的数组设为只读（工作进程中防止修改父进程数据）
+        track: 是否作为所有者登记到resource_tracker（接管其他进程创建的内存块时使用）
+        restore_dtypes: 是否把传输时分类编码的列还原为原dtype（父进程登记时使用，工作进程中保持分类）
+    """
+    data, shms = {}, []
+    for col in desc["columns"]:
+        if col["shm"] is None:
+            data[col["name"]] = col["data"].to_numpy()
+            continue
+        shm = _attach_shm(col["shm"], track=track)
+        arr = np.ndarray((col["length"],), dtype=np.dtype(col["dtype"]), buffer=shm.buf)
+        if readonly:
+            arr.flags.writeable = False
+        shms.append(shm)
+        if "categories" in col:
+            cat = pd.Categorical.from_codes(arr, col["categories"], ordered=col["ordered"])
+            restore = col.get("restore")
+            data[col["name"]] = cat.astype(restore) if restore_dtypes and restore is not None else cat
+        else:
+            data[col["name"]] = arr
+    df = pd.DataFrame(data, index=desc["index"], copy=False)
+    if not data:
+        df = pd.DataFrame(index=desc["index"] if desc["index"] is not None else pd.RangeIndex(desc["length"]))
+    return df, shms
+
+
+def _swap_shared(columns: Dict[str, Any], desc: Dict, shared: pd.DataFrame) -> Dict[str, Any]:
+    """父进程中只把数值列换成共享内存中的数组，其余列保持原对象与原dtype（分类编码只用于传输）"""
+    numeric = {c["name"] for c in desc["columns"] if c["shm"] is not None and "categories" not in c}
+    return {name: shared[name].to_numpy() if name in numeric else col for name, col in columns.items()}
+
+
+def _close_shms(shms: Sequence[shared_memory.SharedMemory], unlink: bool = False):
+    for shm in shms:
+        try:
+            shm.close()
+        except BufferError:
+            # 仍有numpy视图引用该内存，映射在视图释放后由GC回收
+            pass
+        if unlink:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _worker_main(conn, tool_names: Sequence[str], compact: bool = False):
+    """工作进程：预先导入工具模块，然后循环执行调用；compact与父进程的登记时压缩设置一致"""
+    from . import tools
+    io_tools.set_compaction(compact)
+    for name in tool_names:
+        getattr(tools, name)
+    conn.send(("ready", os.getpid()))
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+        name, kwargs, frames = msg
+        attached = []
+        created = set()
+        try:
+            # frames按血缘从根到叶排列，覆盖层登记前其父节点已存在
+            for df_id, item in frames.items():
+                df, shms = attach_frame(item["frame"], readonly=True)
+                attached.extend(shms)
+                if item["parent"]:
+                    io_tools._register_overlay(item["parent"], {c: df[c].to_numpy() for c in df.columns}, df_id)
+                else:
+                    io_tools._DATAFRAMES[df_id] = df
+                if item.get("meta"):
+                    io_tools._METADATA[df_id] = item["meta"]
+            before = io_tools._all_ids()
+            result = getattr(tools, name)(**kwargs)
+            created = io_tools._all_ids() - before
+            # 新登记的dataframe/覆盖层导出到共享内存，所有权移交父进程
+            exported = {}
+            for df_id in created:
+                overlay = io_tools._OVERLAYS.get(df_id)
+                if overlay:
+                    desc, shms = export_frame(pd.DataFrame(overlay["columns"], copy=False))
+                    exported[df_id] = {"parent": overlay["parent"], "frame": desc}
+                else:
+                    desc, shms = export_frame(io_tools._DATAFRAMES[df_id])
+                    exported[df_id] = {"parent": None, "frame": desc}
+                exported[df_id]["meta"] = io_tools._METADATA.get(df_id)
+                _close_shms(shms)
+            conn.send(("ok", result, exported))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}", {}))
+        finally:
+            for df_id in set(frames) | created:
+                io_tools._DATAFRAMES.pop(df_id, None)
+                io_tools._OVERLAYS.pop(df_id, None)
+                io_tools._CHILDREN.pop(df_id, None)
+                io_tools._METADATA.pop(df_id, None)
+            _close_shms(attached)
+
+
+class _Worker:
+    def __init__(self, ctx, tool_names: Sequence[str]):
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child, tuple(tool_names), io_tools.compaction_enabled()),
+                                daemon=True)
+        self.proc.start()
+        child.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: Optional[float]):
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise TimeoutError("工具工作进程启动超时")
+        self.conn.recv()
+        self.ready = True
+
+    def kill(self):
+        self.proc.terminate()
+        self.proc.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.proc.join(timeout=5)
+        if self.proc.is_alive():
+            self.proc.terminate()
+
+
+class ToolWorkerPool:
+    """
+    预热的工具工作进程池
+
+    Examples:
+        pool = ToolWorkerPool(workers=2, timeout=60)
+        set_worker_pool(pool)   # agentkit.executor：之后execute_action将池内工具派发到工作进程
+        ...
+        pool.close()
+    """
+
+    def __init__(self, workers: int = 2, tools: Sequence[str] = DEFAULT_POOL_TOOLS,
+                 timeout: Optional[float] = 60.0):
+        """
+        Args:
+            workers: 工作进程数
+            tools: 派发到工作进程的工具名
+            timeout: 单次调用超时（秒），None表示不限
+        """
+        self.tools = set(tools)
+        self.timeout = timeout
+        self._ctx = multiprocessing.get_context()
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._exports: Dict[str, List[shared_memory.SharedMemory]] = {}
+        self._descs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        # 先启动resource_tracker再创建工作进程，使所有进程共用同一个tracker；
+        # 否则各工作进程会各自启动tracker，并在退出/被终止时unlink父进程的共享内存
+        resource_tracker.ensure_running()
+        for _ in range(max(1, workers)):
+            self._idle.put(_Worker(self._ctx, self.tools))
+        io_tools._RELEASE_HOOKS.append(self._forget)
+
+    def handles(self, name: str) -> bool:
+        return not self._closed and name in self.tools
+
+    def _share(self, df_id: str) -> Dict[str, Dict]:
+        """
+        取dataframe及其血缘上全部祖先的共享内存descriptor（从根到叶）
+
+        首次导出后父进程改用共享内存中的数据，避免双份内存；覆盖层只导出其新增列。
+        """
+        frames = {}
+        with self._lock:
+            for item_id in reversed(io_tools.get_lineage(df_id)):
+                if item_id not in self._descs:
+                    overlay = io_tools._OVERLAYS.get(item_id)
+                    if overlay:
+                        desc, shms = export_frame(pd.DataFrame(overlay["columns"], copy=False))
+                        df, attached = attach_frame(desc)
+                        overlay["columns"] = _swap_shared(overlay["columns"], desc, df)
+                    else:
+                        original = io_tools._DATAFRAMES[item_id]
+                        desc, shms = export_frame(original)
+                        df, attached = attach_frame(desc)
+                        if len(original.columns):
+                            columns = _swap_shared({c: original[c] for c in original.columns}, desc, df)
+                            io_tools._DATAFRAMES[item_id] = pd.DataFrame(columns, index=original.index, copy=False)
+                    self._descs[item_id] = {"parent": overlay["parent"] if overlay else None, "frame": desc,
+                                            "meta": io_tools._METADATA.get(item_id)}
+                    self._exports[item_id] = shms + attached
+                frames[item_id] = self._descs[item_id]
+        return frames
+
+    def _adopt(self, df_id: str, item: Dict):
+        """接收工作进程导出的新dataframe/覆盖层并登记到父进程"""
+        df, shms = attach_frame(item["frame"], track=True, restore_dtypes=True)
+        with self._lock:
+            self._descs[df_id] = item
+            self._exports[df_id] = shms
+        if item["parent"]:
+            io_tools._register_overlay(item["parent"], {c: df[c].to_numpy() for c in df.columns}, df_id)
+        else:
+            # 工作进程登记时已按同一设置压缩过，不再复制出共享内存
+            io_tools._register_df(df, df_id, compact=False)
+        if item.get("meta"):
+            io_tools._METADATA[df_id] = item["meta"]
+
+    def call(self, name: str, kwargs: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        """在工作进程中执行工具；参数中的dataframe_id通过共享内存传递"""
+        if self._closed:
+            raise RuntimeError("ToolWorkerPool已关闭")
+        if any(isinstance(value, str) and value in io_tools._LIVE for value in kwargs.values()):
+            # 实时dataframe（流式缓冲区）持续变化，不导出到共享内存，直接在本进程执行
+            from . import tools
+            return getattr(tools, name)(**kwargs)
+        timeout = self.timeout if timeout is None else timeout
+        frames = {}
+        for value in kwargs.values():
+            if isinstance(value, str) and io_tools.has_dataframe(value):
+                frames.update(self._share(value))
+        worker = self._idle.get()
+        try:
+            worker.wait_ready(timeout)
+            worker.conn.send((name, kwargs, frames))
+            if not worker.conn.poll(timeout):
+                worker.kill()
+                worker = _Worker(self._ctx, self.tools)
+                raise TimeoutError(f"工具 {name} 执行超过 {timeout}s，工作进程已重启")
+            status, payload, exported = worker.conn.recv()
+        except (EOFError, BrokenPipeError):
+            worker.proc.join()
+            worker = _Worker(self._ctx, self.tools)
+            raise RuntimeError(f"工具 {name} 的工作进程异常退出，已重启")
+        finally:
+            self._idle.put(worker)
+
+        for df_id, desc in exported.items():
+            self._adopt(df_id, desc)
+        if status == "error":
+            raise RuntimeError(payload)
+        return payload
+
+    def _forget(self, df_id: str):
+        """dataframe被释放后（io_tools释放回调）unlink其共享内存"""
+        with self._lock:
+            shms = self._exports.pop(df_id, [])
+            self._descs.pop(df_id, None)
+        _close_shms(shms, unlink=True)
+
+    def release(self, df_id: str):
+        """释放dataframe的共享内存（父进程中仍登记的数据先复制回普通内存）"""
+        with self._lock:
+            if df_id not in self._exports:
+                return
+        overlay = io_tools._OVERLAYS.get(df_id)
+        if overlay:
+            overlay["columns"] = {c: np.array(v) for c, v in overlay["columns"].items()}
+        elif df_id in io_tools._DATAFRAMES:
+            io_tools._DATAFRAMES[df_id] = io_tools._DATAFRAMES[df_id].copy(deep=True)
+        self._forget(df_id)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._forget in io_tools._RELEASE_HOOKS:
+            io_tools._RELEASE_HOOKS.remove(self._forget)
+        while not self._idle.empty():
+            self._idle.get().stop()
+        for df_id in list(self._exports):
+            self.release(df_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,208 @@
+"""
+Agent循环的并发负载测试
+
+在模拟LLM服务（mock_llm.py，可注入延迟/生成速率/错误率/并发上限）或外部OpenAI兼容服务上
+并发运行多个AgentSession（自主模式，APILLM后端，真实执行工具），统计任务与LLM调用的
+延迟分位数、吞吐与错误，用于在没有真实模型的情况下做容量规划。
+
+用法:
+    python benchmarks/load_test.py --sessions 32 --tasks 4 --latency 0.5 --token_rate 40
+    python benchmarks/load_test.py --sessions 64 --stream --max_concurrency 16 --error_rate 0.02 --json load.json
+    python benchmarks/load_test.py --api_url http://127.0.0.1:8000/v1 --sessions 16 --data_dir data/CWRU
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm import add_server_args, server_from_args  # noqa: E402
+from synthetic import generate_dataset  # noqa: E402
+
+_PERCENTILES = (50, 90, 99)
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """{"p50", "p90", "p99", "max", "mean"}，没有样本时为None"""
+    if not values:
+        return {**{f"p{p}": None for p in _PERCENTILES}, "max": None, "mean": None}
+    arr = np.asarray(values, dtype=np.float64)
+    return {**{f"p{p}": float(np.percentile(arr, p)) for p in _PERCENTILES},
+            "max": float(arr.max()), "mean": float(arr.mean())}
+
+
+def run_session(session_id: int, url: str, args, data_index, summary: str, start_at: float) -> List[Dict]:
+    """一个会话顺序执行args.tasks条指令，返回每条指令的记录"""
+    from agentkit.chat import AgentSession
+    from agentkit.llm import APILLM
+
+    delay = start_at - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+    llm = APILLM(url, model_name=args.api_model, tool_calling=not args.no_tool_calling, stream=args.stream)
+    session = AgentSession(llm, summary, data_index=data_index, context_k=args.context_k)
+    records = []
+    for task in range(args.tasks):
+        begin = time.perf_counter()
+        try:
+            result = session.run_task(args.instruction, max_steps=args.max_steps)
+        except Exception as e:
+            records.append({"session": session_id, "task": task, "stop_reason": "exception",
+                            "seconds": time.perf_counter() - begin, "steps": [], "error": f"{type(e).__name__}: {e}"})
+            continue
+        steps = [{
+            "seconds": s["seconds"],
+            "llm_s": s["timing"]["llm_s"],
+            "first_token_s": s["timing"]["first_token_s"],
+            "tools_s": s["timing"]["tools_s"],
+            "completion_tokens": (s.get("usage") or {}).get("completion_tokens") or 0,
+            "error": s.get("error"),
+            "llm_error": "llm_output" not in s,
+            "wasted": bool(s.get("wasted")),
+        } for s in result["steps"]]
+        records.append({"session": session_id, "task": task, "stop_reason": result["stop_reason"],
+                        "seconds": result["total_seconds"], "steps": steps, "error": None})
+    return records
+
+
+def summarize(records: List[Dict], wall_seconds: float) -> Dict:
+    steps = [s for r in records for s in r["steps"]]
+    llm_ok = [s for s in steps if not s["llm_error"]]
+    stop_reasons: Dict[str, int] = {}
+    for r in records:
+        stop_reasons[r["stop_reason"]] = stop_reasons.get(r["stop_reason"], 0) + 1
+    completed = stop_reasons.get("final_answer", 0)
+    busy = sum(s["seconds"] for s in steps)
+    return {
+        "tasks": len(records),
+        "completed": completed,
+        "stop_reasons": stop_reasons,
+        "llm_calls": len(steps),
+        "llm_errors": sum(1 for s in steps if s["llm_error"]),
+        "wasted_generations": sum(1 for s in steps if s["wasted"]),
+        "tool_errors": sum(1 for s in llm_ok if s["error"]),
+        "wall_seconds": wall_seconds,
+        "tasks_per_second": completed / wall_seconds if wall_seconds > 0 else 0.0,
+        "llm_calls_per_second": len(steps) / wall_seconds if wall_seconds > 0 else 0.0,
+        "completion_tokens_per_second": sum(s["completion_tokens"] for s in llm_ok) / wall_seconds
+        if wall_seconds > 0 else 0.0,
+        "task_seconds": percentiles([r["seconds"] for r in records if r["stop_reason"] == "final_answer"]),
+        "llm_seconds": percentiles([s["llm_s"] for s in llm_ok]),
+        "first_token_seconds": percentiles([s["first_token_s"] for s in llm_ok if s["first_token_s"] is not None]),
+        "tool_seconds": percentiles([s["tools_s"] for s in llm_ok if s["tools_s"]]),
+        # 各步耗时中LLM与工具所占比例，其余为解析/检索/调度
+        "llm_share": sum(s["llm_s"] for s in steps) / busy if busy else 0.0,
+        "tool_share": sum(s["tools_s"] for s in steps) / busy if busy else 0.0,
+    }
+
+
+def _print_report(summary: Dict, server_stats: Optional[Dict]):
+    print(f"tasks {summary['tasks']}  completed {summary['completed']}  stop reasons {summary['stop_reasons']}")
+    print(f"llm calls {summary['llm_calls']}  llm errors {summary['llm_errors']}  "
+          f"wasted {summary['wasted_generations']}  tool errors {summary['tool_errors']}")
+    print(f"throughput {summary['tasks_per_second']:.2f} tasks/s  {summary['llm_calls_per_second']:.2f} calls/s  "
+          f"{summary['completion_tokens_per_second']:.0f} tokens/s  (wall {summary['wall_seconds']:.2f}s)")
+    print(f"{'latency (s)':<16} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for key, label in [("task_seconds", "task"), ("llm_seconds", "llm call"),
+                       ("first_token_seconds", "first token"), ("tool_seconds", "tools")]:
+        stats = summary[key]
+        if stats["p50"] is None:
+            continue
+        print(f"{label:<16} " + " ".join(f"{stats[k]:9.3f}" for k in ("p50", "p90", "p99", "max")))
+    print(f"time share: llm {summary['llm_share']:.0%}, tools {summary['tool_share']:.0%}")
+    if server_stats:
+        queued = server_stats["queue_seconds"] / max(server_stats["requests"], 1)
+        print(f"server: {server_stats['requests']} requests, max active {server_stats['max_active']}, "
+              f"mean queue wait {queued:.3f}s, 500 {server_stats['errors']}, 429 {server_stats['rate_limited']}")
+
+
+def run_load(args) -> Dict:
+    from agentkit.executor import tool_schemas
+    from agentkit.retrieval import get_index
+    from agentkit.tools import io_tools
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_root = args.data_dir
+        if not data_root:
+            data_root = os.path.join(tmp, "data", "CWRU")
+            generate_dataset(data_root, n_files=args.files, n_samples=args.samples, formats=["mat"], seed=args.seed)
+        data_index = get_index(data_root)
+        summary = data_index.overview()
+        # 预先导入全部工具模块（tool_schemas读取工具签名），首个LLM调用不计入导入耗时
+        tool_schemas()
+
+        server = None
+        url = args.api_url
+        if not url:
+            server = server_from_args(args).start()
+            url = server.url
+        print(f"{args.sessions} sessions x {args.tasks} tasks against {url} "
+              f"({'stream' if args.stream else 'non-stream'}, {'text' if args.no_tool_calling else 'tool calls'})")
+
+        records: List[Dict] = []
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=args.sessions, thread_name_prefix="session") as pool:
+                futures = [pool.submit(run_session, i, url, args, data_index, summary,
+                                       start + args.ramp * i / max(args.sessions, 1))
+                           for i in range(args.sessions)]
+                for future in futures:
+                    records.extend(future.result())
+            wall = time.perf_counter() - start
+        finally:
+            server_stats = server.stats() if server else None
+            if server:
+                server.stop()
+            io_tools._clear()
+
+    report = summarize(records, wall)
+    _print_report(report, server_stats)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k != "json"},
+        },
+        "summary": report,
+        "server": server_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the agent loop against a mock LLM server")
+    parser.add_argument("--sessions", type=int, default=16, help="Concurrent AgentSessions")
+    parser.add_argument("--tasks", type=int, default=2, help="Instructions run by each session")
+    parser.add_argument("--instruction", default="请加载内圈故障数据并检测异常", help="Instruction for every task")
+    parser.add_argument("--max_steps", type=int, default=10, help="Autonomous-mode steps per task")
+    parser.add_argument("--context_k", type=int, default=8, help="Retrieved file summaries per instruction")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds over which session starts are spread")
+    parser.add_argument("--stream", action="store_true", help="Use SSE streaming (records time to first token)")
+    parser.add_argument("--no_tool_calling", action="store_true", help="Parse Actions from text instead of tools")
+    parser.add_argument("--api_url", help="External OpenAI-compatible server (default: start the mock server)")
+    parser.add_argument("--api_model", default="mock", help="Model name sent to the server")
+    parser.add_argument("--data_dir", help="Data root (default: synthetic CWRU-style dataset)")
+    parser.add_argument("--files", type=int, default=40, help="Synthetic .mat files")
+    parser.add_argument("--samples", type=int, default=24000, help="Samples per synthetic file")
+    parser.add_argument("--json", help="Write the report to a JSON file")
+    add_server_args(parser)
+    args = parser.parse_args()
+
+    report = run_load(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""
+模拟的OpenAI兼容chat/completions服务（负载测试用，无需真实模型）
+
+SimulatedLLM即时返回固定回复，无法体现真实的延迟；本服务以APILLM使用的HTTP协议应答，
+可注入首token延迟、prefill/生成速率、错误率与并发上限，并支持SSE流式输出与原生tool_calls。
+
+回复按ReAct流程生成：第一步加载指令附带的第一个数据文件，之后对<last_df_id>执行
+describe_dataframe / detect_anomalies_iqr，共tool_steps步后给出Final Answer，
+因此AgentSession会真实执行工具。
+
+用法:
+    python benchmarks/mock_llm.py --port 8000 --latency 0.3 --token_rate 40 --error_rate 0.01
+    python cli.py chat --data_dir data/CWRU --llm api --api_url http://127.0.0.1:8000/v1 --auto
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from agentkit.llm import estimate_tokens  # noqa: E402
+
+# 流式输出时每个增量的字符数
+_STREAM_CHARS = 16
+_CONTEXT_MARKER = "--- 相关数据文件 ---"
+_FILE_TYPES = {".mat": "mat", ".csv": "csv", ".parquet": "parquet"}
+
+
+class _Server(ThreadingHTTPServer):
+    # 并发会话较多时默认的listen队列（5）会导致连接被拒绝
+    request_queue_size = 512
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端在错误响应后关闭连接属正常情况，不打印堆栈
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def _data_files(messages: List[Dict]) -> List[Dict]:
+    """从用户消息附带的相关文件摘要（每行一个JSON）中取出文件条目"""
+    entries = []
+    for message in messages:
+        content = message.get("content") or ""
+        if message.get("role") != "user" or _CONTEXT_MARKER not in content:
+            continue
+        for line in content.split(_CONTEXT_MARKER, 1)[1].splitlines():
+            line = line.strip()
+            if line.startswith("{"):
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    pass
+    return entries
+
+
+def _step(messages: List[Dict]) -> int:
+    """当前指令已进行的步数：最后一条普通用户消息之后的Observation反馈数"""
+    step = 0
+    for message in reversed(messages):
+        if message.get("role") != "user":
+            continue
+        if not (message.get("content") or "").startswith("Observation:"):
+            break
+        step += 1
+    return step
+
+
+def plan_reply(messages: List[Dict], tool_steps: int) -> Tuple[str, Optional[Tuple[str, Dict]]]:
+    """
+    按对话进度生成回复
+
+    Returns:
+        (Thought或Final Answer文本, (工具名, 参数) 或 None)
+    """
+    step = _step(messages)
+    files = [e for e in _data_files(messages) if os.path.splitext(e["file"])[1].lower() in _FILE_TYPES]
+    if step >= tool_steps or not files:
+        return "Thought: 工具已执行完毕\nFinal Answer: 任务已完成，请查看上述工具结果。", None
+    entry = files[0]
+    if step == 0:
+        file_type = _FILE_TYPES[os.path.splitext(entry["file"])[1].lower()]
+        return "Thought: 需要加载数据文件", ("load_dataframe", {"file_path": entry["file"], "file_type": file_type})
+    if step % 2 == 1:
+        return "Thought: 查看数据基本信息", ("describe_dataframe", {"dataframe_id": "<last_df_id>"})
+    columns = [c for c in entry.get("columns") or [] if c not in ("index", "time")]
+    value_column = "value" if entry.get("type") == "mat" or not columns else columns[0]
+    return "Thought: 检测异常值", ("detect_anomalies_iqr", {"dataframe_id": "<last_df_id>",
+                                                         "value_column": value_column})
+
+
+class MockLLMServer:
+    """
+    可注入延迟与错误的chat/completions服务
+
+    每个请求的耗时 = latency × 对数正态抖动 + prompt_tokens / prefill_rate（首token延迟）
+                   + completion_tokens / token_rate（生成）
+    max_concurrency限制同时处理的请求数，超出的请求排队，模拟服务端容量。
+
+    Examples:
+        with MockLLMServer(latency=0.2, token_rate=50) as server:
+            llm = APILLM(server.url)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.2, jitter: float = 0.0,
+                 token_rate: float = 50.0, prefill_rate: Optional[float] = None, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, malformed_rate: float = 0.0,
+                 max_concurrency: Optional[int] = None, tool_steps: int = 2, seed: int = 0):
+        """
+        Args:
+            host/port: 监听地址，port=0时自动分配
+            latency: 首token的基础延迟（秒）
+            jitter: 延迟的对数正态抖动（sigma），0表示固定延迟
+            token_rate: 生成速率（token/s），0表示不限
+            prefill_rate: prompt处理速率（token/s），None表示不计prompt长度
+            error_rate: 返回500的请求比例
+            rate_limit_rate: 返回429的请求比例
+            malformed_rate: 回复中Action被截断（无法解析）的比例
+            max_concurrency: 同时处理的请求数上限，None表示不限
+            tool_steps: 每条指令给出Final Answer之前的工具步数
+            seed: 随机种子
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.token_rate = token_rate
+        self.prefill_rate = prefill_rate
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.tool_steps = tool_steps
+        self._random = random.Random(seed)
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "malformed": 0, "streamed": 0,
+                       "active": 0, "max_active": 0, "queue_seconds": 0.0,
+                       "prompt_tokens": 0, "completion_tokens": 0}
+        self._httpd = _Server((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+            self._stats["max_active"] = max(self._stats["max_active"], self._stats["active"])
+
+    def _draw(self) -> Tuple[float, float]:
+        with self._lock:
+            return self._random.random(), self._random.lognormvariate(0.0, self.jitter) if self.jitter else 1.0
+
+    def _completion(self, payload: Dict) -> Tuple[Dict, List[Tuple[Dict, int]], float]:
+        """
+        生成一次回复
+
+        Returns:
+            (非流式响应体, 流式增量[(delta, token数)], 首token延迟)
+        """
+        messages = payload.get("messages") or []
+        text, call = plan_reply(messages, self.tool_steps)
+        draw, scale = self._draw()
+        malformed = call is not None and draw < self.malformed_rate
+        use_tools = bool(payload.get("tools")) and call is not None and not malformed
+        tool_calls = []
+        if call is not None and not use_tools:
+            name, kwargs = call
+            action = f"{name}({', '.join(f'{k}={v!r}' for k, v in kwargs.items())})"
+            # 截断的Action：缺少右括号与引号，解析器无法截取出完整调用
+            text += f"\nAction: {action[:-3] if malformed else action}"
+        elif use_tools:
+            name, kwargs = call
+            tool_calls = [{"index": 0, "id": f"call_{uuid.uuid4().hex[:8]}", "type": "function",
+                           "function": {"name": name, "arguments": json.dumps(kwargs, ensure_ascii=False)}}]
+
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        arguments = "".join(c["function"]["arguments"] for c in tool_calls)
+        completion_tokens = estimate_tokens(text) + estimate_tokens(arguments)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        self._count(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, malformed=int(malformed))
+        first_token = self.latency * scale + (prompt_tokens / self.prefill_rate if self.prefill_rate else 0.0)
+
+        message = {"role": "assistant", "content": text}
+        if tool_calls:
+            message["tool_calls"] = [{k: v for k, v in c.items() if k != "index"} for c in tool_calls]
+        body = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": int(time.time()),
+                "model": payload.get("model", "mock"),
+                "choices": [{"index": 0, "message": message,
+                             "finish_reason": "tool_calls" if tool_calls else "stop"}],
+                "usage": usage}
+        deltas = [({"content": text[i:i + _STREAM_CHARS]}, estimate_tokens(text[i:i + _STREAM_CHARS]))
+                  for i in range(0, len(text), _STREAM_CHARS)]
+        for c in tool_calls:
+            deltas.append(({"tool_calls": [{"index": c["index"], "id": c["id"], "type": "function",
+                                            "function": {"name": c["function"]["name"], "arguments": ""}}]}, 1))
+            args = c["function"]["arguments"]
+            deltas += [({"tool_calls": [{"index": c["index"], "function": {"arguments": args[i:i + _STREAM_CHARS]}}]},
+                        estimate_tokens(args[i:i + _STREAM_CHARS])) for i in range(0, len(args), _STREAM_CHARS)]
+        return body, deltas, first_token
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 keep-alive：APILLM复用连接
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: Dict, headers: Optional[Dict] = None):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+                else:
+                    self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json(400, {"error": {"message": "invalid JSON body"}})
+                    return
+                if not self.path.rstrip("/").endswith("chat/completions"):
+                    self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                    return
+                server._count(requests=1)
+                queued = time.perf_counter()
+                if server._slots:
+                    server._slots.acquire()
+                server._count(active=1, queue_seconds=time.perf_counter() - queued)
+                try:
+                    self._complete(payload)
+                finally:
+                    server._count(active=-1)
+                    if server._slots:
+                        server._slots.release()
+
+            def _complete(self, payload: Dict):
+                draw, _scale = server._draw()
+                if draw < server.rate_limit_rate:
+                    server._count(rate_limited=1)
+                    self._send_json(429, {"error": {"message": "rate limit exceeded", "type": "rate_limit"}},
+                                    {"Retry-After": "1"})
+                    return
+                if draw < server.rate_limit_rate + server.error_rate:
+                    time.sleep(server.latency)
+                    server._count(errors=1)
+                    self._send_json(500, {"error": {"message": "injected server error", "type": "server_error"}})
+                    return
+
+                body, deltas, first_token = server._completion(payload)
+                time.sleep(first_token)
+                if not payload.get("stream"):
+                    if server.token_rate:
+                        time.sleep(body["usage"]["completion_tokens"] / server.token_rate)
+                    server._count(ok=1)
+                    self._send_json(200, body)
+                    return
+
+                server._count(streamed=1)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                base = {"id": body["id"], "object": "chat.completion.chunk", "created": body["created"],
+                        "model": body["model"]}
+                for delta, tokens in deltas:
+                    if server.token_rate:
+                        time.sleep(tokens / server.token_rate)
+                    chunk = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+                    self._send_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                final = [{"index": 0, "delta": {}, "finish_reason": body["choices"][0]["finish_reason"]}]
+                self._send_chunk(f"data: {json.dumps(dict(base, choices=final))}\n\n".encode("utf-8"))
+                if (payload.get("stream_options") or {}).get("include_usage"):
+                    usage = dict(base, choices=[], usage=body["usage"])
+                    self._send_chunk(f"data: {json.dumps(usage)}\n\n".encode("utf-8"))
+                self._send_chunk(b"data: [DONE]\n\n")
+                self._send_chunk(b"")
+                server._count(ok=1)
+
+        return Handler
+
+
+def add_server_args(parser: argparse.ArgumentParser):
+    """服务参数（load_test.py内嵌启动服务时共用）"""
+    parser.add_argument("--latency", type=float, default=0.2, help="First-token base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Log-normal sigma of the latency")
+    parser.add_argument("--token_rate", type=float, default=50.0, help="Generated tokens per second (0: unlimited)")
+    parser.add_argument("--prefill_rate", type=float, default=None, help="Prompt tokens per second")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--malformed_rate", type=float, default=0.0, help="Fraction of replies with a truncated Action")
+    parser.add_argument("--max_concurrency", type=int, default=None, help="Requests processed at once (others queue)")
+    parser.add_argument("--tool_steps", type=int, default=2, help="Tool steps before the Final Answer")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def server_from_args(args, host: str = "127.0.0.1", port: int = 0) -> MockLLMServer:
+    return MockLLMServer(host=host, port=port, latency=args.latency, jitter=args.jitter,
+                         token_rate=args.token_rate, prefill_rate=args.prefill_rate, error_rate=args.error_rate,
+                         rate_limit_rate=args.rate_limit_rate, malformed_rate=args.malformed_rate,
+                         max_concurrency=args.max_concurrency, tool_steps=args.tool_steps, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat/completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_server_args(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, args.host, args.port)
+    print(f"mock LLM listening on {server.url}  (Ctrl+C to stop)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+        print(json.dumps(server.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+可复现的性能基准测试
+
+在合成CWRU风格数据集（见synthetic.py）上测量各工具与对话回合的耗时和峰值内存，
+结果可写为JSON并与之前的运行比较。
+
+用法:
+    python benchmarks/run_benchmarks.py --samples 120000 --files 8 --json base.json
+    python benchmarks/run_benchmarks.py --only load,iqr --json new.json
+    python benchmarks/run_benchmarks.py --only detect --long_samples 10000000
+    python benchmarks/run_benchmarks.py --compare base.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import generate_dataset, synth_signal  # noqa: E402
+
+
+@contextmanager
+def _chdir(path: str):
+    prev = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(prev)
+
+
+def _clear_dataframes():
+    from agentkit.tools import io_tools
+    io_tools._clear()
+
+
+def measure(name: str, func: Callable[[], object], repeat: int = 5, inner: int = 1,
+            setup: Optional[Callable[[], None]] = None) -> Dict:
+    """
+    对func计时repeat次（每次内部调用inner次），另跑一次用tracemalloc统计峰值内存
+
+    Returns:
+        {"name", "repeat", "inner", "min_s", "median_s", "mean_s", "peak_mem_mb"}，
+        时间均为单次调用耗时
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for _ in range(inner):
+            func()
+        times.append((time.perf_counter() - start) / inner)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "name": name,
+        "repeat": repeat,
+        "inner": inner,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+        "peak_mem_mb": peak / 1e6,
+    }
+
+
+def build_cases(ctx: Dict) -> List[Dict]:
+    """
+    基准用例列表：[{"name", "func", "setup"(可选), "inner"(可选)}]
+
+    ctx包含数据集路径（data_root, files）、一个已加载的fixture dataframe_id（df_id）与输出目录；
+    long_id为长信号fixture（--long_samples，后10%为故障段），用于比较各异常检测器。
+    """
+    from agentkit.chat import AgentSession
+    from agentkit.executor import extract_actions, parse_action, validate_call
+    from agentkit.llm import create_llm
+    from agentkit.preprocessing import summarize_directory
+    from agentkit.tools import (
+        compare_files, load_dataframe, describe_dataframe, detect_anomalies_iqr, plot_time_series, resample_dataframe,
+        save_dataframe,
+        detect_anomalies_zscore, detect_anomalies_mad, detect_anomalies_spectral_kurtosis,
+        detect_anomalies_isolation_forest,
+    )
+
+    files = ctx["files"]
+    cases = [
+        {"name": "summarize_directory",
+         "func": lambda: summarize_directory(ctx["data_root"], max_files_per_folder=2)},
+    ]
+    for fmt, paths in files.items():
+        if paths:
+            cases.append({"name": f"load_dataframe[{fmt}]",
+                          "func": lambda p=paths[0], f=fmt: load_dataframe(p, f),
+                          "setup": ctx["reset"]})
+    if ctx.get("dataset"):
+        from agentkit.convert import convert_mat_tree
+
+        cases += [
+            {"name": "convert_mat_tree[parquet]",
+             "func": lambda: convert_mat_tree(ctx["data_root"], ctx["dataset"] + "_bench", overwrite=True)},
+            {"name": "load_dataframe[dataset]",
+             "func": lambda: load_dataframe(ctx["dataset"], "dataset", columns=["index", "value"],
+                                            filters={"fault": "Normal", "sensor": "DE"}),
+             "setup": ctx["reset"]},
+        ]
+    for fmt in ("mat", "csv", "parquet"):
+        if files.get(fmt):
+            cases.append({"name": f"compare_files[{len(files[fmt])} {fmt}]",
+                          "func": lambda f=fmt: _compare_all(compare_files, ctx["data_root"], f),
+                          "setup": ctx["reset"]})
+    cases += [
+        {"name": "describe_dataframe", "func": lambda: describe_dataframe(ctx["df_id"])},
+        {"name": "detect_anomalies_iqr",
+         "func": lambda: detect_anomalies_iqr(ctx["df_id"], "value"), "setup": ctx["reset"]},
+        {"name": "resample_dataframe[12k->4k]",
+         "func": lambda: resample_dataframe(ctx["df_id"], 4000, source_rate=12000), "setup": ctx["reset"]},
+        {"name": "save_dataframe[parquet,zstd]",
+         "func": lambda: save_dataframe(ctx["df_id"], os.path.join(ctx["out_dir"], "bench.parquet"),
+                                        "parquet", compression="zstd")},
+        {"name": "save_dataframe[csv]",
+         "func": lambda: save_dataframe(ctx["df_id"], os.path.join(ctx["out_dir"], "bench.csv"))},
+        {"name": "plot_time_series",
+         "func": lambda: plot_time_series(ctx["df_id"], "index", "value", output_dir=ctx["out_dir"])},
+        {"name": "parse_action", "inner": 1000,
+         "func": lambda: parse_action(
+             "detect_anomalies_iqr(dataframe_id='0f8e2c1a-1d2b-4c3d-9e8f-7a6b5c4d3e2f', "
+             "value_column='value', iqr_multiplier=1.5)")},
+        {"name": "extract_actions+validate", "inner": 1000,
+         "func": lambda: [validate_call(*parse_action(a)) for a in extract_actions(
+             "Thought: 加载后绘图\n"
+             "Action: load_dataframe(file_path='data/12k/IR007_1.mat', file_type='mat')\n"
+             "Action: plot_time_series(dataframe_id='<result_1>', time_column='index', "
+             "value_column='value', title='振动 (g)')")[0]]},
+        {"name": "chat_turn[simulated]",
+         "func": lambda: AgentSession(create_llm("simulated"), ctx["summary"]).chat_turn("请加载normal_0.mat文件"),
+         "setup": ctx["reset"]},
+    ]
+    if ctx.get("long_id"):
+        detectors = {
+            "iqr": detect_anomalies_iqr,
+            "zscore": detect_anomalies_zscore,
+            "mad": detect_anomalies_mad,
+            "spectral_kurtosis": detect_anomalies_spectral_kurtosis,
+            "isolation_forest": detect_anomalies_isolation_forest,
+        }
+        n = ctx["long_samples"]
+        size = f"{n / 1_000_000:g}M" if n >= 1_000_000 else f"{n / 1_000:g}k"
+        cases += [{"name": f"detect_{name}[{size}]",
+                   "func": lambda f=func: f(ctx["long_id"], "DE_time"), "setup": ctx["reset"]}
+                  for name, func in detectors.items()]
+    return cases
+
+
+def _compare_all(compare_files, data_root: str, fmt: str):
+    """比较数据集中某种格式的全部文件；有文件读取失败时报错，避免基准只测到出错路径"""
+    from agentkit.tools.io_tools import get_dataframe
+
+    df_id, _summary = compare_files([os.path.join(data_root, "**", f"*.{fmt}")])
+    errors = get_dataframe(df_id)["error"].dropna()
+    if len(errors):
+        raise RuntimeError(f"compare_files failed on {len(errors)} {fmt} files: {errors.iloc[0]}")
+    return df_id
+
+
+def _long_fixture(n_samples: int, seed: int):
+    """长信号fixture：正常信号，末尾10%替换为内圈故障信号"""
+    import numpy as np
+    import pandas as pd
+
+    channels = synth_signal(n_samples, seed=seed)
+    fault = synth_signal(n_samples // 10, fault="IR", seed=seed + 1)
+    de = channels["DE_time"]
+    de[n_samples - len(fault["DE_time"]):] = fault["DE_time"]
+    return pd.DataFrame({"index": np.arange(n_samples), "DE_time": de, "FE_time": channels["FE_time"]})
+
+
+def run_suite(args) -> Dict:
+    from agentkit.preprocessing import summarize_directory
+    from agentkit.tools import load_dataframe, io_tools
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # SimulatedLLM固定加载 data/CWRU/Normal Baseline/normal_0.mat，因此在tmp下生成同名结构
+        data_root = os.path.join(tmp, "data", "CWRU")
+        formats = [f for f in args.formats.split(",") if f]
+        files = generate_dataset(data_root, n_files=args.files, n_samples=args.samples,
+                                 depth=args.depth, formats=formats, seed=args.seed)
+        fixture = os.path.join(data_root, "Normal Baseline", "normal_0.mat")
+        ctx = {"data_root": data_root, "files": files, "out_dir": os.path.join(tmp, "outputs"),
+               "long_samples": args.long_samples}
+        long_df = _long_fixture(args.long_samples, args.seed) if args.long_samples else None
+        if files.get("mat") and _has_module("pyarrow"):
+            from agentkit.convert import convert_mat_tree
+
+            ctx["dataset"] = os.path.join(tmp, "dataset")
+            convert_mat_tree(data_root, ctx["dataset"])
+
+        def reset():
+            _clear_dataframes()
+            ctx["df_id"] = load_dataframe(fixture, "mat")
+            if long_df is not None:
+                ctx["long_id"] = io_tools._register_df(long_df, metadata={"sampling_rate": 12000.0})
+
+        ctx["reset"] = reset
+        reset()
+        ctx["summary"] = summarize_directory(data_root, max_files_per_folder=1)
+
+        results = []
+        with _chdir(tmp):
+            for case in build_cases(ctx):
+                if args.only and not any(key in case["name"] for key in args.only.split(",")):
+                    continue
+                r = measure(case["name"], case["func"], repeat=args.repeat,
+                            inner=case.get("inner", 1), setup=case.get("setup"))
+                results.append(r)
+                print(f"{r['name']:<32} median {r['median_s'] * 1000:10.3f} ms  "
+                      f"min {r['min_s'] * 1000:10.3f} ms  peak {r['peak_mem_mb']:8.1f} MB")
+                reset()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "versions": _versions(),
+            "params": {"samples": args.samples, "files": args.files, "depth": args.depth,
+                       "long_samples": args.long_samples,
+                       "formats": args.formats, "repeat": args.repeat, "seed": args.seed},
+        },
+        "results": results,
+    }
+
+
+def _has_module(name: str) -> bool:
+    import importlib.util
+    return importlib.util.find_spec(name) is not None
+
+
+def _versions() -> Dict[str, str]:
+    versions = {}
+    for mod in ("numpy", "pandas", "scipy", "matplotlib", "pyarrow"):
+        try:
+            versions[mod] = __import__(mod).__version__
+        except ImportError:
+            pass
+    return versions
+
+
+def compare(base_path: str, new_path: str):
+    """按用例名比较两次运行的中位耗时与峰值内存"""
+    with open(base_path, encoding="utf-8") as f:
+        base = {r["name"]: r for r in json.load(f)["results"]}
+    with open(new_path, encoding="utf-8") as f:
+        new = {r["name"]: r for r in json.load(f)["results"]}
+    print(f"{'case':<32} {'base ms':>10} {'new ms':>10} {'speedup':>8} {'base MB':>9} {'new MB':>9}")
+    for name in [n for n in base if n in new] + [n for n in new if n not in base]:
+        b, n = base.get(name), new[name]
+        if b is None:
+            print(f"{name:<32} {'-':>10} {n['median_s'] * 1000:10.3f} {'-':>8} {'-':>9} {n['peak_mem_mb']:9.1f}")
+            continue
+        speedup = b["median_s"] / n["median_s"] if n["median_s"] else float("inf")
+        print(f"{name:<32} {b['median_s'] * 1000:10.3f} {n['median_s'] * 1000:10.3f} {speedup:7.2f}x "
+              f"{b['peak_mem_mb']:9.1f} {n['peak_mem_mb']:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run agentkit performance benchmarks")
+    parser.add_argument("--samples", type=int, default=120000, help="Samples per synthetic file")
+    parser.add_argument("--files", type=int, default=8, help="Files per format")
+    parser.add_argument("--long_samples", type=int, default=10_000_000,
+                        help="Samples of the long signal used by detector cases (0 to skip)")
+    parser.add_argument("--depth", type=int, default=3, help="Fault directory depth (1-3)")
+    parser.add_argument("--formats", default="mat,csv,parquet", help="Comma separated formats")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions per case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="Comma separated substrings of case names to run")
+    parser.add_argument("--json", help="Write results to JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two JSON results")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run_suite(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+CLI启动开销测量：用 python -X importtime 统计每个子命令的导入耗时与重量级依赖
+
+用法:
+    python benchmarks/startup.py                 # 打印各子命令的启动耗时
+    python benchmarks/startup.py --json out.json # 同时写出JSON
+    python benchmarks/startup.py --check         # 回归检查：超出预算或导入了禁用模块时返回非0
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# 各子命令启动阶段不允许导入的重量级模块（首次使用工具时才加载）
+FORBIDDEN_MODULES = {
+    "summarize": ["pandas", "matplotlib", "torch", "transformers"],
+    "chat": ["pandas", "matplotlib", "torch", "transformers"],
+}
+
+# 导入耗时预算（毫秒），用于 --check
+DEFAULT_BUDGET_MS = {
+    "summarize": 500.0,
+    "chat": 500.0,
+}
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _make_data_dir(tmp: str) -> str:
+    """生成一个最小的.mat数据目录供summarize使用"""
+    import numpy as np
+    from scipy.io import savemat
+
+    folder = os.path.join(tmp, "Normal Baseline")
+    os.makedirs(folder, exist_ok=True)
+    savemat(os.path.join(folder, "normal_0.mat"), {"X097_DE_time": np.zeros((16, 1))})
+    return tmp
+
+
+def _commands(data_dir: str) -> Dict[str, Dict]:
+    cli = os.path.join(ROOT, "cli.py")
+    return {
+        "summarize": {"argv": [cli, "summarize", "--data_dir", data_dir, "--max_files", "1"], "stdin": ""},
+        # chat启动后立即退出，只测量启动与数据摘要阶段
+        "chat": {"argv": [cli, "chat", "--data_dir", data_dir], "stdin": "exit\n"},
+    }
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """解析 -X importtime 输出为 [{"module", "self_us", "cumulative_us", "depth"}]"""
+    rows = []
+    for line in stderr.splitlines():
+        m = _IMPORTTIME_LINE.match(line)
+        if m:
+            rows.append({
+                "module": m.group(4),
+                "self_us": int(m.group(1)),
+                "cumulative_us": int(m.group(2)),
+                "depth": len(m.group(3)) // 2,
+            })
+    return rows
+
+
+def measure(name: str, argv: List[str], stdin: str) -> Dict:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime"] + argv,
+        input=stdin, capture_output=True, text=True, cwd=ROOT,
+    )
+    wall = time.perf_counter() - start
+    rows = parse_importtime(proc.stderr)
+    modules = {r["module"] for r in rows}
+    top = sorted((r for r in rows if r["depth"] == 0), key=lambda r: -r["cumulative_us"])[:8]
+    return {
+        "command": name,
+        "returncode": proc.returncode,
+        "wall_ms": wall * 1000,
+        "import_ms": sum(r["self_us"] for r in rows) / 1000,
+        "module_count": len(modules),
+        "forbidden_loaded": [m for m in FORBIDDEN_MODULES.get(name, []) if m in modules],
+        "top_imports": [(r["module"], r["cumulative_us"] / 1000) for r in top],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CLI startup import time")
+    parser.add_argument("--json", help="Write results to JSON file")
+    parser.add_argument("--check", action="store_true", help="Fail if budgets are exceeded")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per command (best is reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = _make_data_dir(tmp)
+        results = []
+        for name, cmd in _commands(data_dir).items():
+            runs = [measure(name, cmd["argv"], cmd["stdin"]) for _ in range(args.repeat)]
+            results.append(min(runs, key=lambda r: r["import_ms"]))
+
+    failed = False
+    for r in results:
+        print(f"{r['command']:<10} import {r['import_ms']:8.1f} ms  wall {r['wall_ms']:8.1f} ms  "
+              f"modules {r['module_count']:4d}  heavy: {', '.join(r['forbidden_loaded']) or '-'}")
+        for mod, ms in r["top_imports"]:
+            print(f"    {mod:<32} {ms:8.1f} ms")
+        if args.check:
+            budget = DEFAULT_BUDGET_MS.get(r["command"])
+            if r["returncode"] != 0:
+                print(f"  FAIL: exit code {r['returncode']}")
+                failed = True
+            if r["forbidden_loaded"]:
+                print(f"  FAIL: heavy modules imported at startup: {r['forbidden_loaded']}")
+                failed = True
+            if budget is not None and r["import_ms"] > budget:
+                print(f"  FAIL: import time {r['import_ms']:.1f} ms > budget {budget:.1f} ms")
+                failed = True
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
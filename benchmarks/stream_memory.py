@@ -0,0 +1,105 @@
+"""
+流式数据的内存回归检查：对实时dataframe反复执行异常检测，dataframe存储的占用不应随次数增长
+
+对实时dataframe_id的每次派生都会把当前缓冲区固定为一份快照；释放派生结果时快照应一并释放，
+cascade释放实时dataframe时其全部快照与派生结果都应释放。
+
+用法:
+    python benchmarks/stream_memory.py                # 打印每轮检测后的占用
+    python benchmarks/stream_memory.py --check        # 占用增长或存储未清空时返回非0
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+_TOTAL_LINE = re.compile(r"total: (\d+) dataframes, ([\d.]+) MB")
+
+
+def store_usage():
+    """memory_usage()汇总行中的(dataframe数, MB)"""
+    from agentkit.tools import memory_usage
+
+    m = _TOTAL_LINE.search(memory_usage())
+    return int(m.group(1)), float(m.group(2))
+
+
+def _append_rows(path: str, stop: threading.Event, rate: float):
+    """按rate（样本/秒）持续向CSV追加数据，模拟增长中的传感器文件"""
+    i = 0
+    batch = max(int(rate / 20), 1)
+    while not stop.is_set():
+        t = np.arange(i, i + batch)
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(f"{k / rate:.6f},{v:.5f}\n" for k, v in zip(t, np.sin(t / 10.0)))
+        i += batch
+        time.sleep(0.05)
+
+
+def run(args) -> bool:
+    from agentkit.tools import detect_anomalies_zscore, release_dataframe, start_stream, stop_stream
+    from agentkit.tools import io_tools
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sensor.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("time,DE\n")
+        stop = threading.Event()
+        writer = threading.Thread(target=_append_rows, args=(path, stop, args.rate), daemon=True)
+        writer.start()
+        try:
+            stream_id = start_stream(path, file_type="csv", sampling_rate=args.rate,
+                                     capacity=args.capacity, from_start=True, poll_interval=0.02)
+            # 等缓冲区写满，之后实时dataframe本身的占用固定
+            while len(io_tools.get_dataframe(stream_id)) < args.capacity:
+                time.sleep(0.05)
+            baseline = store_usage()
+            print(f"baseline: {baseline[0]} dataframes, {baseline[1]:.3f} MB")
+            for i in range(1, args.rounds + 1):
+                result_id, count = detect_anomalies_zscore(stream_id, "DE")
+                release_dataframe(result_id)
+                usage = store_usage()
+                print(f"round {i:3d}: {count:6d} anomalies  {usage[0]} dataframes, {usage[1]:.3f} MB")
+                if usage != baseline:
+                    ok = False
+            # 不释放派生结果，最后cascade释放实时dataframe
+            for _ in range(args.rounds):
+                detect_anomalies_zscore(stream_id, "DE")
+            stop_stream(stream_id)
+            release_dataframe(stream_id, cascade=True)
+            left = store_usage()
+            print(f"after cascade release: {left[0]} dataframes, {left[1]:.3f} MB")
+            if left[0]:
+                ok = False
+        finally:
+            stop.set()
+            writer.join()
+            io_tools._clear()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that repeated detections on a stream keep memory flat")
+    parser.add_argument("--rounds", type=int, default=20, help="Detections on the live dataframe")
+    parser.add_argument("--capacity", type=int, default=12000, help="Ring buffer samples")
+    parser.add_argument("--rate", type=float, default=48000.0, help="Samples appended per second")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero if store usage grows")
+    args = parser.parse_args()
+
+    ok = run(args)
+    if args.check and not ok:
+        print("FAIL: dataframe store grew across detections or was not emptied by cascade release")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+合成CWRU风格振动数据集（用于基准测试，无需真实数据）
+
+目录结构模仿CWRU:
+    <root>/Normal Baseline/normal_0.mat
+    <root>/12k Drive End Bearing Fault Data/<fault>/<size>/<fault>007_<load>.mat
+    ...
+每个文件包含驱动端/风扇端加速度通道与转速，信号为转频谐波 + 故障冲击 + 噪声。
+"""
+import argparse
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+FAULT_TYPES = ["IR", "OR", "B"]
+FAULT_SIZES = ["007", "014", "021"]
+# 各故障类型的特征频率（相对转频的倍数，近似6205轴承）
+_FAULT_ORDERS = {"IR": 5.415, "OR": 3.585, "B": 4.714}
+
+
+def synth_signal(n_samples: int, sampling_rate: float = 12000.0, fault: str = "",
+                 rpm: float = 1797.0, seed: int = 0) -> Dict[str, np.ndarray]:
+    """生成单个记录的通道数据"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_samples) / sampling_rate
+    shaft_hz = rpm / 60.0
+    base = 0.1 * np.sin(2 * np.pi * shaft_hz * t) + 0.05 * np.sin(2 * np.pi * 2 * shaft_hz * t)
+    de = base + 0.05 * rng.standard_normal(n_samples)
+    if fault:
+        # 周期性冲击经3kHz共振衰减振荡调制
+        period = int(sampling_rate / (_FAULT_ORDERS[fault] * shaft_hz))
+        ring = np.exp(-np.arange(64) / 8.0) * np.sin(2 * np.pi * 3000.0 * np.arange(64) / sampling_rate)
+        impulses = np.zeros(n_samples)
+        impulses[::max(period, 1)] = 1.0
+        de = de + np.convolve(impulses, ring, mode="same")
+    fe = 0.5 * base + 0.03 * rng.standard_normal(n_samples)
+    return {"DE_time": de, "FE_time": fe, "RPM": np.array([[rpm]])}
+
+
+def _leaf_dirs(root: str, depth: int) -> List[Dict]:
+    """按目录深度生成 (路径, 故障类型, 负载) 列表"""
+    leaves = [{"path": os.path.join(root, "Normal Baseline"), "fault": "", "size": ""}]
+    for fault in FAULT_TYPES:
+        for size in FAULT_SIZES:
+            parts = [root, "12k Drive End Bearing Fault Data", fault, size][: 1 + max(depth, 1)]
+            leaves.append({"path": os.path.join(*parts), "fault": fault, "size": size})
+    return leaves
+
+
+def generate_dataset(root: str, n_files: int = 8, n_samples: int = 120000, depth: int = 3,
+                     formats: Sequence[str] = ("mat", "csv", "parquet"),
+                     sampling_rate: float = 12000.0, seed: int = 0) -> Dict[str, List[str]]:
+    """
+    生成合成数据集
+
+    Args:
+        root: 输出根目录
+        n_files: 总文件数（每种格式）；第一个文件固定为 Normal Baseline/normal_0
+        n_samples: 每个文件的采样点数
+        depth: 故障目录深度（1-3）
+        formats: 要生成的格式，可选 mat/csv/parquet
+        sampling_rate: 采样率（Hz）
+        seed: 随机种子
+
+    Returns:
+        {format: [file_path, ...]}
+    """
+    from scipy.io import savemat
+
+    leaves = _leaf_dirs(root, depth)
+    written: Dict[str, List[str]] = {fmt: [] for fmt in formats}
+    for i in range(n_files):
+        leaf = leaves[i % len(leaves)]
+        load = (i // len(leaves)) % 4
+        os.makedirs(leaf["path"], exist_ok=True)
+        stem = f"normal_{load}" if not leaf["fault"] else f"{leaf['fault']}{leaf['size']}_{load}"
+        if i >= len(leaves) * 4:
+            stem = f"{stem}_{i}"
+        channels = synth_signal(n_samples, sampling_rate, leaf["fault"], rpm=1797.0 - 25 * load, seed=seed + i)
+        prefix = f"X{100 + i:03d}"
+        if "mat" in formats:
+            path = os.path.join(leaf["path"], stem + ".mat")
+            savemat(path, {
+                f"{prefix}_DE_time": channels["DE_time"][:, None],
+                f"{prefix}_FE_time": channels["FE_time"][:, None],
+                f"{prefix}RPM": channels["RPM"],
+            })
+            written["mat"].append(path)
+        if "csv" in formats or "parquet" in formats:
+            import pandas as pd
+
+            df = pd.DataFrame({
+                "index": np.arange(n_samples),
+                "DE_time": channels["DE_time"],
+                "FE_time": channels["FE_time"],
+            })
+            if "csv" in formats:
+                path = os.path.join(leaf["path"], stem + ".csv")
+                df.to_csv(path, index=False)
+                written["csv"].append(path)
+            if "parquet" in formats:
+                path = os.path.join(leaf["path"], stem + ".parquet")
+                df.to_parquet(path, index=False)
+                written["parquet"].append(path)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic CWRU-like dataset")
+    parser.add_argument("--out", required=True, help="Output root directory")
+    parser.add_argument("--files", type=int, default=8, help="Number of files per format")
+    parser.add_argument("--samples", type=int, default=120000, help="Samples per file")
+    parser.add_argument("--depth", type=int, default=3, help="Fault directory depth (1-3)")
+    parser.add_argument("--formats", default="mat,csv,parquet", help="Comma separated formats")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    written = generate_dataset(args.out, args.files, args.samples, args.depth,
+                               args.formats.split(","), seed=args.seed)
+    for fmt, paths in written.items():
+        print(f"{fmt}: {len(paths)} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,83 +3,217 @@
 """
 import argparse
 import os
-from agentkit.chat import run_chat
-from agentkit.preprocessing import summarize_directory
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Prompt-driven Time-Series Agent (Stage 1)"
-    )
-    sub = parser.add_subparsers(dest="command", required=True)
-    
-    # summarize 命令
-    p_sum = sub.add_parser("summarize", help="Summarize a data directory")
-    p_sum.add_argument("--data_dir", required=True, help="Data root directory")
-    p_sum.add_argument("--max_files", type=int, default=2, help="Max files per leaf folder")
-    
-    # chat 命令
-    p_chat = sub.add_parser("chat", help="Interactive chat demo")
-    p_chat.add_argument("--data_dir", required=True, help="Data root directory")
-    
-    # LLM配置选项
-    p_chat.add_argument(
+def _add_llm_args(parser):
+    """LLM配置选项（chat与batch共用）"""
+    parser.add_argument(
         "--llm",
         choices=["simulated", "local", "api"],
         default="simulated",
         help="LLM类型: simulated(模拟), local(本地推理), api(API调用)"
     )
-    p_chat.add_argument(
+    parser.add_argument(
         "--model",
         default="microsoft/Phi-3-mini-4k-instruct",
         help="本地模型路径或HF模型名（仅--llm=local时有效）"
     )
-    p_chat.add_argument(
+    parser.add_argument(
         "--device",
         choices=["cpu", "cuda", "auto"],
         default="auto",
         help="计算设备（仅--llm=local时有效）"
     )
-    p_chat.add_argument(
+    parser.add_argument(
+        "--unconstrained",
+        action="store_true",
+        help="关闭Action的语法约束解码（仅--llm=local时有效）"
+    )
+    parser.add_argument(
         "--api_url",
         help="API基础URL（仅--llm=api时有效，如 https://api.openai.com/v1）"
     )
-    p_chat.add_argument(
+    parser.add_argument(
         "--api_key",
         help="API密钥（仅--llm=api时有效，也可用OPENAI_API_KEY环境变量）"
     )
-    p_chat.add_argument(
+    parser.add_argument(
         "--api_model",
         default="gpt-3.5-turbo",
         help="API模型名称（仅--llm=api时有效）"
     )
+    parser.add_argument(
+        "--no_tool_calling",
+        action="store_true",
+        help="不使用API原生的tool calling，只从回复文本中解析Action（仅--llm=api时有效）"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="以SSE流式接收回复，追踪中记录首个token的延迟（仅--llm=api时有效）"
+    )
+
+
+def _build_llm_config(args) -> dict:
+    """由命令行参数构建传递给create_llm的配置"""
+    if args.llm == "local":
+        return {
+            "model_path": args.model,
+            "device": args.device,
+            "constrained": not args.unconstrained
+        }
+    if args.llm == "api":
+        return {
+            "base_url": args.api_url or os.getenv("OPENAI_API_URL", "https://api.openai.com/v1"),
+            "api_key": args.api_key or os.getenv("OPENAI_API_KEY", ""),
+            "model_name": args.api_model,
+            "tool_calling": not args.no_tool_calling,
+            "stream": args.stream
+        }
+    return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Prompt-driven Time-Series Agent (Stage 1)"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    # summarize 命令
+    p_sum = sub.add_parser("summarize", help="Summarize a data directory")
+    p_sum.add_argument("--data_dir", required=True, help="Data root directory")
+    p_sum.add_argument("--max_files", type=int, default=2, help="Max files per leaf folder")
+    
+    # chat 命令
+    p_chat = sub.add_parser("chat", help="Interactive chat demo")
+    p_chat.add_argument("--data_dir", required=True, help="Data root directory")
+    
+    _add_llm_args(p_chat)
+    
+    # 自主多步模式
+    p_chat.add_argument(
+        "--auto",
+        action="store_true",
+        help="自主模式：工具结果自动反馈给LLM，直到给出最终回答或预算耗尽"
+    )
+    p_chat.add_argument("--max_steps", type=int, default=10, help="自主模式最大步数")
+    p_chat.add_argument("--max_seconds", type=float, default=None, help="自主模式墙钟时间预算（秒）")
+    p_chat.add_argument("--max_tokens", type=int, default=None, help="自主模式累计token预算")
+    p_chat.add_argument("--trace", default=None, help="将每轮的计时追踪以JSONL写入该文件")
+    p_chat.add_argument("--tool_workers", type=int, default=0,
+                        help="工具工作进程数（>0时IQR检测、绘图等在预热的工作进程中执行）")
+    p_chat.add_argument("--tool_timeout", type=float, default=60.0, help="工作进程中单次工具调用超时（秒）")
+    p_chat.add_argument("--context_k", type=int, default=8,
+                        help="每条指令检索注入的数据文件摘要数（0: 把整个目录摘要放入系统消息）")
+    p_chat.add_argument("--compact", action="store_true",
+                        help="登记dataframe时压缩内存表示（float32传感器通道、分类标签、可推导的索引列）")
+    
+    # batch 命令
+    p_batch = sub.add_parser("batch", help="Run an instruction script over many data directories")
+    p_batch.add_argument("--instructions", required=True, help="指令文件（每行一条，#开头为注释）")
+    p_batch.add_argument("--data_dirs", nargs="+", default=[], help="数据目录列表（每个目录一个作业）")
+    p_batch.add_argument("--data_list", help="数据目录列表文件（每行一个目录）")
+    p_batch.add_argument("--output", default="outputs/batch_results.jsonl", help="结果JSONL文件")
+    p_batch.add_argument("--workers", type=int, default=None, help="并发数（默认CPU核数）")
+    p_batch.add_argument(
+        "--executor",
+        choices=["process", "thread"],
+        default="process",
+        help="process: 工具计算为主时按核数扩展; thread: LLM延迟为主时按并发扩展"
+    )
+    p_batch.add_argument("--timeout", type=float, default=None, help="单个作业超时（秒）")
+    p_batch.add_argument("--max_steps", type=int, default=10, help="每条指令的自主模式最大步数")
+    p_batch.add_argument("--context_k", type=int, default=8,
+                         help="每条指令检索注入的数据文件摘要数（0: 把整个目录摘要放入系统消息）")
+    p_batch.add_argument("--compact", action="store_true",
+                         help="登记dataframe时压缩内存表示（float32传感器通道、分类标签、可推导的索引列）")
+    _add_llm_args(p_batch)
+    
+    # convert 命令
+    p_conv = sub.add_parser("convert", help="Convert a .mat data tree to a partitioned Parquet/Arrow dataset")
+    p_conv.add_argument("--data_dir", required=True, help="Data root directory")
+    p_conv.add_argument("--output", required=True, help="数据集输出目录")
+    p_conv.add_argument("--format", choices=["parquet", "arrow"], default="parquet",
+                        help="parquet: 压缩率高; arrow: Arrow IPC，不压缩时可内存映射零拷贝读取")
+    p_conv.add_argument("--compression", default=None,
+                        help="压缩编码（默认parquet为zstd、arrow不压缩；none表示不压缩）")
+    p_conv.add_argument("--level", type=int, default=None, help="压缩级别")
+    p_conv.add_argument("--workers", type=int, default=None, help="并行进程数（默认CPU核数）")
+    p_conv.add_argument("--overwrite", action="store_true", help="输出目录已存在时覆盖")
     
     args = parser.parse_args()
     
+    # 子命令所需模块按需导入，避免无关子命令承担pandas/matplotlib等的导入开销
     if args.command == "summarize":
+        from agentkit.preprocessing import summarize_directory
         text = summarize_directory(args.data_dir, args.max_files)
         print(text)
     
     elif args.command == "chat":
-        # 构建LLM配置
-        llm_config = {}
-        if args.llm == "local":
-            llm_config = {
-                "model_path": args.model,
-                "device": args.device
-            }
-        elif args.llm == "api":
-            llm_config = {
-                "base_url": args.api_url or os.getenv("OPENAI_API_URL", "https://api.openai.com/v1"),
-                "api_key": args.api_key or os.getenv("OPENAI_API_KEY", ""),
-                "model_name": args.api_model
-            }
+        from agentkit.chat import run_chat
         
         run_chat(
             data_root=args.data_dir,
             llm_type=args.llm,
-            llm_config=llm_config
+            llm_config=_build_llm_config(args),
+            auto=args.auto,
+            trace_path=args.trace,
+            tool_workers=args.tool_workers,
+            tool_timeout=args.tool_timeout,
+            context_k=args.context_k,
+            compact=args.compact,
+            max_steps=args.max_steps,
+            max_seconds=args.max_seconds,
+            max_tokens=args.max_tokens
+        )
+    
+    elif args.command == "batch":
+        from agentkit.batch import load_instructions, run_batch
+        
+        data_roots = list(args.data_dirs)
+        if args.data_list:
+            data_roots += load_instructions(args.data_list)
+        if not data_roots:
+            parser.error("batch需要--data_dirs或--data_list")
+        if args.workers is not None and args.workers < 1:
+            parser.error("--workers必须 >= 1")
+        
+        summary = run_batch(
+            instructions=load_instructions(args.instructions),
+            data_roots=data_roots,
+            output_path=args.output,
+            llm_type=args.llm,
+            llm_config=_build_llm_config(args),
+            workers=args.workers,
+            executor=args.executor,
+            timeout=args.timeout,
+            max_steps=args.max_steps,
+            context_k=args.context_k,
+            compact=args.compact
+        )
+        print(f"完成 {summary['jobs']} 个作业（成功 {summary['ok']}，失败 {summary['error']}，"
+              f"超时 {summary['timeout']}），耗时 {summary['seconds']:.2f}s，"
+              f"吞吐 {summary['jobs_per_second']:.2f} 作业/s，"
+              f"每条完成的指令平均 {summary['wasted_per_task']:.2f} 次无效生成，结果: {args.output}")
+    
+    elif args.command == "convert":
+        from agentkit.convert import convert_mat_tree
+        
+        compression = args.compression or ("zstd" if args.format == "parquet" else None)
+        summary = convert_mat_tree(
+            data_root=args.data_dir,
+            output_dir=args.output,
+            file_format=args.format,
+            compression=None if compression == "none" else compression,
+            compression_level=args.level,
+            workers=args.workers,
+            overwrite=args.overwrite
         )
+        print(f"转换 {summary['files']} 个文件 -> {summary['parts']} 个分区文件（{summary['rows']} 行），"
+              f"{summary['input_bytes'] / 1e6:.1f} MB -> {summary['output_bytes'] / 1e6:.1f} MB，"
+              f"耗时 {summary['seconds']:.2f}s，输出: {args.output}")
+        for err in summary["errors"]:
+            print(f"  失败: {err['file']}: {err['error']}")
 
 
 if __name__ == "__main__":